@@ -206,6 +206,24 @@ class ModelService {
     });
   }
 
+  // Form fields shared by predict() and predictStream()
+  appendPredictOptions(formData, options) {
+    // Add model_type if specified
+    if (options.model_type) {
+      formData.append("model_type", options.model_type);
+    }
+    // Sensitivity overrides; the server defaults apply when unset
+    ["score_threshold", "iou_threshold"].forEach((name) => {
+      if (options[name] != null) {
+        formData.append(name, String(options[name]));
+      }
+    });
+    // Only these findings (e.g. ["Cardiomegaly"]); the server skips a model none of them need
+    if (options.classes && options.classes.length) {
+      formData.append("classes", options.classes.join(","));
+    }
+  }
+
   async predict(imageFile, options = {}, retryCount = 0) {
     try {
       console.log(`Starting prediction process for image`);
@@ -235,9 +253,8 @@ class ModelService {
         formData = new FormData();
         formData.append("image", resizedImage.file);
 
-        // Add model_type if specified
+        this.appendPredictOptions(formData, options);
         if (options.model_type) {
-          formData.append("model_type", options.model_type);
           console.log(`Using model type: ${options.model_type}`);
         }
       }
@@ -280,6 +297,11 @@ class ModelService {
           : `Bearer ${token}`;
       }
 
+      // Let the server drop the work once the result would no longer be used
+      if (!(options instanceof FormData) && options.timeoutMs) {
+        headers["X-Request-Timeout-Ms"] = String(options.timeoutMs);
+      }
+
       console.log(
         `Sending prediction request (try ${retryCount + 1}/${
           this.maxRetries + 1
@@ -351,13 +373,17 @@ class ModelService {
         score: pred.score,
       }));
 
-      // The server is already sending properly formatted data URLs with base64 encoding
-      // We just need to pass them through directly
+      // Images arrive as data URLs, or as signed /api/blobs/... links when the
+      // server uses URL delivery; those are relative to the API server
+      const resolveImage = (src) =>
+        src && src.startsWith("/api/") ? `${apiUrl}${src}` : src;
       return {
         predictions: processedPredictions,
-        cleanImage: data.clean_image,
-        annotatedImage: data.annotated_image,
+        cleanImage: resolveImage(data.clean_image),
+        annotatedImage: resolveImage(data.annotated_image),
         imageSize: data.image_size || { width: 512, height: 512 },
+        imageId: data.image_id,
+        thresholds: data.thresholds,
       };
     } catch (error) {
       if (error.name === "AbortError") {
@@ -379,6 +405,172 @@ class ModelService {
     }
   }
 
+  // Re-apply other score/IoU thresholds to an earlier prediction (by the
+  // imageId predict() returned) without uploading or running the models again
+  async requery(imageId, options = {}) {
+    this.cancelRequests("predict");
+    const controller = new AbortController();
+    this.controllers.set("predict", controller);
+
+    try {
+      const headers = {
+        Accept: "application/json",
+        "Content-Type": "application/json",
+      };
+      const token = localStorage.getItem("authToken");
+      if (token) {
+        headers.Authorization = token.startsWith("Bearer ")
+          ? token
+          : `Bearer ${token}`;
+      }
+
+      const response = await fetch(`${apiUrl}/api/predict/requery`, {
+        method: "POST",
+        body: JSON.stringify({ image_id: imageId, ...options }),
+        credentials: "include",
+        headers: headers,
+        mode: "cors",
+        signal: controller.signal,
+      });
+      const data = await response.json();
+      if (!response.ok) {
+        // 404: the server no longer holds this image; callers fall back to predict()
+        const error = new Error(
+          data.error || `Failed to re-query predictions: ${response.status}`
+        );
+        error.status = response.status;
+        throw error;
+      }
+
+      const resolveImage = (src) =>
+        src && src.startsWith("/api/") ? `${apiUrl}${src}` : src;
+      return {
+        predictions: data.predictions.map((pred) => ({
+          box: pred.boxes,
+          class: pred.label,
+          score: pred.score,
+        })),
+        cleanImage: resolveImage(data.clean_image),
+        annotatedImage: resolveImage(data.annotated_image),
+        imageSize: data.image_size || { width: 512, height: 512 },
+        imageId: data.image_id,
+        thresholds: data.thresholds,
+      };
+    } catch (error) {
+      if (error.name === "AbortError") {
+        return { cancelled: true };
+      }
+      throw error;
+    } finally {
+      this.controllers.delete("predict");
+    }
+  }
+
+  // Streaming variant of predict(): onEvent(type, data) is called for each
+  // server-sent event ("it3" and "it2" findings first, then "image" and
+  // "done"), so findings can be shown before the images are rendered
+  async predictStream(imageFile, options = {}, onEvent = () => {}) {
+    this.cancelRequests("predict");
+    const controller = new AbortController();
+    this.controllers.set("predict", controller);
+
+    try {
+      const resizedImage = await this.resizeImageForModel(imageFile);
+      const formData = new FormData();
+      formData.append("image", resizedImage.file);
+      this.appendPredictOptions(formData, options);
+
+      const headers = { Accept: "text/event-stream" };
+      const token = localStorage.getItem("authToken");
+      if (token) {
+        headers.Authorization = token.startsWith("Bearer ")
+          ? token
+          : `Bearer ${token}`;
+      }
+      if (options.timeoutMs) {
+        headers["X-Request-Timeout-Ms"] = String(options.timeoutMs);
+      }
+
+      const response = await fetch(`${apiUrl}/api/predict/stream`, {
+        method: "POST",
+        body: formData,
+        credentials: "include",
+        headers: headers,
+        mode: "cors",
+        signal: controller.signal,
+      });
+      if (!response.ok) {
+        let errorData;
+        try {
+          errorData = await response.json();
+        } catch (e) {
+          errorData = { error: `HTTP error: ${response.status}` };
+        }
+        throw new Error(
+          errorData.error || `Failed to get predictions: ${response.status}`
+        );
+      }
+
+      const resolveImage = (src) =>
+        src && src.startsWith("/api/") ? `${apiUrl}${src}` : src;
+      const toPredictions = (findings) =>
+        findings.map((pred) => ({
+          box: pred.boxes,
+          class: pred.label,
+          score: pred.score,
+        }));
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      const result = { predictions: [] };
+      let buffer = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line; comment lines are keep-alives
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const block = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          let type = "message";
+          let data = "";
+          block.split("\n").forEach((line) => {
+            if (line.startsWith("event:")) type = line.slice(6).trim();
+            else if (line.startsWith("data:")) data += line.slice(5).trim();
+          });
+          if (!data) continue;
+          const payload = JSON.parse(data);
+
+          if (type === "it3" || type === "it2") {
+            result.predictions = result.predictions.concat(
+              toPredictions(payload.findings)
+            );
+          } else if (type === "image") {
+            result.cleanImage = resolveImage(payload.clean_image);
+            result.annotatedImage = resolveImage(payload.annotated_image);
+          } else if (type === "done") {
+            result.imageSize = payload.image_size || { width: 512, height: 512 };
+          } else if (type === "error") {
+            throw new Error(payload.error);
+          }
+          onEvent(type, payload, result);
+        }
+      }
+      return result;
+    } catch (error) {
+      if (error.name === "AbortError") {
+        console.log("Streaming prediction request was cancelled");
+        return { cancelled: true };
+      }
+      console.error("Error making streaming prediction:", error);
+      throw error;
+    } finally {
+      this.controllers.delete("predict");
+    }
+  }
+
   // Generate mock predictions client-side when the server can't provide them
   async generateMockPredictions(imageFile) {
     console.log("Generating mock predictions client-side");
@@ -1,22 +1,39 @@
 import os
+import time
 import logging
 from datetime import datetime, timedelta
 from functools import wraps
 
-from flask import Flask, jsonify, request, g
+from flask import Flask, Request, jsonify, request, g, has_request_context
 from flask_cors import CORS
 from jose import jwt
 from dotenv import load_dotenv
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
 load_dotenv()
 
+try:
+    from logging_config import configure_logging, route_sampler, get_logging_stats
+    from auth import verify_token, require_token, token_cache
+    from image_ingest import MAX_UPLOAD_BYTES, spooled_upload
+    from scheduler import user_priority
+    from blob_store import blob_store
+except ImportError:
+    from server.logging_config import configure_logging, route_sampler, get_logging_stats
+    from server.auth import verify_token, require_token, token_cache
+    from server.image_ingest import MAX_UPLOAD_BYTES, spooled_upload
+    from server.scheduler import user_priority
+    from server.blob_store import blob_store
+
+def _request_sampled():
+    """Whether INFO logs for the current request survive per-route sampling"""
+    if not has_request_context():
+        return True
+    return g.get('log_sampled', True)
+
+# Configure structured, queue-backed logging
+configure_logging(is_sampled=_request_sampled)
+logger = logging.getLogger(__name__)
+
 # Detect environment and set model strategy
 def setup_environment():
     """Choose real local models when present, otherwise fall back to mock models."""
@@ -81,10 +98,23 @@ except ImportError:
             logger.error("Model loading function not available")
             return None, None
 
+class UploadRequest(Request):
+    """Request whose file parts spool to disk past UPLOAD_SPOOL_MB, as on the ASGI path"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Werkzeug's default keeps up to 500 KB in memory and ignores our setting
+        return spooled_upload()
+
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 
-# Register the model blueprint
+# Reject oversized request bodies before they are parsed (413)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Register the model blueprint behind the token middleware
 if model_bp:
+    require_token(model_bp)
     app.register_blueprint(model_bp, url_prefix='/api')
     logger.info("Registered model_bp blueprint with prefix /api")
 else:
@@ -118,8 +148,8 @@ CORS(
         r"/*": {
             "origins": app.config['CORS_ORIGINS'],
             "methods": ["GET", "POST", "OPTIONS", "PUT", "DELETE"],
-            "allow_headers": ["Content-Type", "Authorization", "Accept", "X-Requested-With"],
-            "expose_headers": ["Content-Type", "Authorization"],
+            "allow_headers": ["Content-Type", "Authorization", "Accept", "X-Requested-With", "X-Request-Timeout-Ms"],
+            "expose_headers": ["Content-Type", "Authorization", "Retry-After"],
             "supports_credentials": True
         }
     }
@@ -129,20 +159,15 @@ logger.info("Using local JWT auth. TODO: Database-backed users will be redesigne
 
 # JWT Configuration
 app.config['SECRET_KEY'] = SECRET_KEY
+# Blob URLs are signed with the app secret so they work without a bearer token
+blob_store.signing_key = SECRET_KEY.encode()
+# Let a fronting nginx/Apache send blob and tile files itself (X-Sendfile)
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', 'false').lower() == 'true'
 JWT_EXPIRATION = timedelta(hours=1)
 
 def _verify_token(token_value):
-    """Verify a local development JWT."""
-    if not token_value:
-        raise ValueError("Token missing")
-
-    # Strip Bearer prefix
-    if token_value.startswith('Bearer '):
-        token_value = token_value[7:]
-
-    decoded = jwt.decode(token_value, app.config["SECRET_KEY"], algorithms=["HS256"])
-    logger.info(f"Local token decoded for user: {decoded.get('username', 'unknown')}")
-    return decoded
+    """Verify a local development JWT (cached until the token expires)."""
+    return verify_token(token_value, app.config["SECRET_KEY"])
 
 
 # Local JWT token decorator
@@ -169,14 +194,14 @@ def _build_cors_preflight_response():
     response = jsonify({"message": "CORS preflight handled"})
     origin = request.headers.get('Origin', '')
     response.headers.add('Access-Control-Allow-Origin', origin or '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization, Accept')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization, Accept, X-Request-Timeout-Ms')
     response.headers.add('Access-Control-Allow-Methods', 'GET, POST, OPTIONS, PUT, DELETE')
     response.headers.add('Access-Control-Allow-Credentials', 'true')
     response.headers.add('Access-Control-Max-Age', '3600')
     return response, 200
 
 # Token creation helper
-def create_token(user_id, username=None, is_admin=False):
+def create_token(user_id, username=None, is_admin=False, priority=None):
     payload = {
         'sub': user_id,
         'exp': datetime.utcnow() + JWT_EXPIRATION,
@@ -188,6 +213,10 @@ def create_token(user_id, username=None, is_admin=False):
     
     if is_admin:
         payload['is_admin'] = True
+
+    # Highest scheduling class the user may request (see scheduler.USER_PRIORITIES)
+    if priority:
+        payload['priority'] = priority
         
     token = jwt.encode(payload, app.config['SECRET_KEY'], algorithm="HS256")
     logger.info(f"Created token for user ID: {user_id}")
@@ -213,6 +242,8 @@ def login():
         data = request.get_json() or {}
 
         username = data.get('username') or 'guest'
+        # The claim comes from server configuration, never from the login body
+        priority = user_priority(username)
 
         logger.info(f"Login attempt for user: {username}")
 
@@ -221,7 +252,7 @@ def login():
             logger.warning("Developer login used (no persistence, no database)")
             return jsonify({
                 "success": True,
-                "token": create_token(username or 'user', username=username or 'user', is_admin=username == 'admin'),
+                "token": create_token(username or 'user', username=username or 'user', is_admin=username == 'admin', priority=priority),
                 "user_id": username or 'user',
                 "username": username or 'user',
                 "message": "Developer login successful (in-memory only)"
@@ -274,7 +305,9 @@ def health_check():
         "status": "healthy",
         "environment": ENVIRONMENT,
         "auth_mode": "local-dev",
-        "cors_origins": app.config['CORS_ORIGINS']
+        "cors_origins": app.config['CORS_ORIGINS'],
+        "logging": get_logging_stats(),
+        "token_cache": token_cache.stats()
     }), 200
 
 @app.route('/admin/reset-password', methods=['POST', 'OPTIONS'])
@@ -321,11 +354,36 @@ def model_status_redirect():
         logger.error(f"Error redirecting to model-status endpoint: {str(e)}")
         return jsonify({"error": str(e), "status": "error"}), 500
 
+@app.before_request
+def before_request():
+    g.request_start = time.perf_counter()
+    g.log_sampled = route_sampler.sample(request.path)
+
+def _log_request_summary(response):
+    """Emit one compact record per request (errors are never sampled out)"""
+    if not g.get('log_sampled', True) and response.status_code < 400:
+        return
+    summary = {
+        "method": request.method,
+        "path": request.path,
+        "status": response.status_code,
+        "duration_ms": round((time.perf_counter() - g.get('request_start', time.perf_counter())) * 1000, 2),
+        "sample_rate": route_sampler.rate_for(request.path),
+    }
+    user = g.get('user')
+    if user:
+        summary["user"] = user.get('sub')
+    prediction = g.get('prediction_summary')
+    if prediction:
+        summary["prediction"] = prediction
+    level = logging.WARNING if response.status_code >= 400 else logging.INFO
+    logger.log(level, f"{request.method} {request.path} {response.status_code} {summary['duration_ms']}ms", extra=summary)
+
 # Add CORS headers to all responses
 @app.after_request
 def after_request(response):
     origin = request.headers.get('Origin', '')
-    logger.info(f"Request details - Method: {request.method}, Path: {request.path}, Origin: {origin}")
+    _log_request_summary(response)
     
     # Mirror allowed local/Vercel frontend origins for simple local development.
     if 'Access-Control-Allow-Origin' not in response.headers:
@@ -338,7 +396,7 @@ def after_request(response):
     
     # Only add headers if they don't exist yet
     if 'Access-Control-Allow-Headers' not in response.headers:
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization, Accept')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization, Accept, X-Request-Timeout-Ms')
     if 'Access-Control-Allow-Methods' not in response.headers:
         response.headers.add('Access-Control-Allow-Methods', 'GET, POST, OPTIONS, PUT, DELETE')
     if 'Access-Control-Allow-Credentials' not in response.headers:
@@ -346,7 +404,7 @@ def after_request(response):
     if 'Access-Control-Max-Age' not in response.headers:
         response.headers.add('Access-Control-Max-Age', '3600')
     if 'Access-Control-Expose-Headers' not in response.headers:
-        response.headers.add('Access-Control-Expose-Headers', 'Content-Type, Authorization')
+        response.headers.add('Access-Control-Expose-Headers', 'Content-Type, Authorization, Retry-After')
     
     return response
 
@@ -0,0 +1,351 @@
+"""
+ASGI serving mode for CXRaide.
+
+Prediction uploads are received asynchronously: the multipart body is parsed
+chunk by chunk as it arrives and only the image part is kept, so a slow client
+holds an idle coroutine instead of a worker thread. By-reference requests
+(image_path / image_uri) may also be JSON or urlencoded forms. Decoding and
+inference are dispatched to a bounded thread pool once the upload is complete.
+Every other route is served by the regular Flask app through asgiref's WSGI
+adapter.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import os
+import io
+import json
+import time
+import asyncio
+import logging
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, UnidentifiedImageError
+from werkzeug.http import parse_options_header
+from werkzeug.datastructures import MultiDict
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    WsgiToAsgi = None
+
+try:
+    from app import app as flask_app
+    from auth import verify_token, REQUIRE_API_AUTH
+    from model_service import (PredictionJob, PredictionError, ensure_models_ready, run_prediction_job,
+                               submit_prediction_job, check_rate_limit, as_prediction_error, parse_thresholds,
+                               parse_classes, attach_reference, cached_reference_result, store_reference_result,
+                               PIPELINE_ENABLED)
+    from scheduler import resolve_priority
+    from blob_store import IMAGE_DELIVERY, IMAGE_DELIVERY_MODES
+    from cancellation import CancelToken, RequestCancelled, parse_timeout_ms, DISCONNECT_POLL_SECONDS
+    from image_ingest import spooled_upload, MAX_UPLOAD_BYTES, MAX_UPLOAD_MB
+    from dicom_ingest import is_dicom
+    from memory_stats import memory_stats
+except ImportError:
+    from server.app import app as flask_app
+    from server.auth import verify_token, REQUIRE_API_AUTH
+    from server.model_service import (PredictionJob, PredictionError, ensure_models_ready, run_prediction_job,
+                                      submit_prediction_job, check_rate_limit, as_prediction_error,
+                                      parse_thresholds, parse_classes, attach_reference,
+                                      cached_reference_result, store_reference_result, PIPELINE_ENABLED)
+    from server.scheduler import resolve_priority
+    from server.blob_store import IMAGE_DELIVERY, IMAGE_DELIVERY_MODES
+    from server.cancellation import CancelToken, RequestCancelled, parse_timeout_ms, DISCONNECT_POLL_SECONDS
+    from server.image_ingest import spooled_upload, MAX_UPLOAD_BYTES, MAX_UPLOAD_MB
+    from server.dicom_ingest import is_dicom
+    from server.memory_stats import memory_stats
+
+logger = logging.getLogger(__name__)
+
+# Threads that decode and run inference; uploads in flight do not occupy one
+ASGI_INFERENCE_WORKERS = int(os.getenv('ASGI_INFERENCE_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Bytes of the image part to collect before checking that it looks like an image
+HEADER_SNIFF_BYTES = 64 * 1024
+# Largest JSON or urlencoded body accepted; those only carry options and an image reference
+MAX_FIELDS_BYTES = 64 * 1024
+
+PREDICT_PATHS = {'/api/predict', '/predict'}
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StreamingUpload:
+    """Incrementally parse a multipart body, keeping only form fields and the image part"""
+
+    def __init__(self, boundary):
+        self.decoder = MultipartDecoder(boundary)
+        self.fields = {}
+        self.image = spooled_upload()
+        self.filename = None
+        self.received = 0
+        self._part = None          # ('field', name) or ('file', name)
+        self._field_data = bytearray()
+        self._sniffed = False
+
+    def feed(self, chunk, more_body):
+        self.received += len(chunk)
+        if MAX_UPLOAD_BYTES and self.received > MAX_UPLOAD_BYTES:
+            raise UploadError(f"Upload exceeds the {MAX_UPLOAD_MB:g} MB limit", 413)
+        if chunk:
+            self.decoder.receive_data(chunk)
+        if not more_body:
+            self.decoder.receive_data(None)
+        self._drain()
+
+    def _drain(self):
+        while True:
+            event = self.decoder.next_event()
+            if isinstance(event, NeedData):
+                return
+            if isinstance(event, Epilogue):
+                return
+            if isinstance(event, File):
+                self._part = ('file', event.name)
+                if event.name == 'image':
+                    self.filename = event.filename
+            elif isinstance(event, Field):
+                self._part = ('field', event.name)
+                self._field_data = bytearray()
+            elif isinstance(event, Data):
+                self._on_data(event)
+
+    def _on_data(self, event):
+        kind, name = self._part or (None, None)
+        if kind == 'field':
+            self._field_data.extend(event.data)
+            if not event.more_data:
+                self.fields[name] = self._field_data.decode('utf-8', 'replace')
+        elif kind == 'file' and name == 'image':
+            self.image.write(event.data)
+            if not self._sniffed and (self.image.tell() >= HEADER_SNIFF_BYTES or not event.more_data):
+                self._sniff()
+
+    def _sniff(self):
+        """Reject non-image uploads as soon as the header has arrived"""
+        self._sniffed = True
+        end = self.image.tell()
+        self.image.seek(0)
+        header = self.image.read(HEADER_SNIFF_BYTES)
+        self.image.seek(end)
+        if is_dicom(header):
+            logger.debug("Streaming upload identified as DICOM")
+            return
+        try:
+            with Image.open(io.BytesIO(header)) as probe:
+                logger.debug(f"Streaming upload identified as {probe.format} {probe.size}")
+        except UnidentifiedImageError:
+            raise UploadError("Uploaded file is not a supported image", 400)
+        except Exception:
+            # Header larger than the sniff window; the full decode will decide
+            pass
+
+    def close(self):
+        self.image.close()
+
+
+class AsgiApp:
+    """Serve /api/predict natively over ASGI and everything else through Flask"""
+
+    def __init__(self, wsgi_app, workers=ASGI_INFERENCE_WORKERS):
+        if WsgiToAsgi is None:
+            raise RuntimeError("ASGI mode requires asgiref: pip install -r requirements.asgi.txt")
+        self.wsgi = WsgiToAsgi(wsgi_app)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+        self.workers = workers
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in PREDICT_PATHS:
+            await self._predict(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                logger.info(f"ASGI mode started with {self.workers} inference workers")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _predict(self, scope, receive, send):
+        start = time.perf_counter()
+        headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        origin = headers.get('origin', '')
+        loop = asyncio.get_running_loop()
+        upload = None
+        watcher = None
+        claims = {}
+
+        try:
+            if REQUIRE_API_AUTH:
+                token = headers.get('authorization')
+                if not token:
+                    return await self._json(send, 401, {"message": "Token is missing!", "valid": False}, origin)
+                try:
+                    claims = verify_token(token, flask_app.config['SECRET_KEY'])
+                except Exception as e:
+                    logger.warning(f"Token validation error: {str(e)}")
+                    return await self._json(send, 401, {"message": "Token is invalid!", "valid": False}, origin)
+
+            await loop.run_in_executor(self.executor, ensure_models_ready)
+            user = claims.get('sub') or (scope.get('client') or ('anonymous',))[0]
+            check_rate_limit(user)
+            token = CancelToken(parse_timeout_ms(headers.get('x-request-timeout-ms')))
+
+            if int(headers.get('content-length') or 0) > MAX_UPLOAD_BYTES:
+                raise UploadError(f"Upload exceeds the {MAX_UPLOAD_MB:g} MB limit", 413)
+
+            content_type, options = parse_options_header(headers.get('content-type', ''))
+            if content_type == 'multipart/form-data' and 'boundary' in options:
+                upload = StreamingUpload(options['boundary'].encode('latin-1'))
+                more_body = True
+                while more_body:
+                    message = await receive()
+                    if message['type'] == 'http.disconnect':
+                        logger.info("Client disconnected during upload")
+                        return
+                    chunk = message.get('body', b'')
+                    more_body = message.get('more_body', False)
+                    upload.feed(chunk, more_body)
+                fields = upload.fields
+            else:
+                # By-reference requests may be plain JSON or urlencoded forms
+                fields = await self._read_fields(receive, content_type)
+                if fields is None:
+                    logger.info("Client disconnected during upload")
+                    return
+
+            reference = fields.get('image_path') or fields.get('image_uri')
+            if not reference:
+                if upload is None or upload.filename is None:
+                    raise UploadError('No image file provided', 400)
+                if upload.filename == '':
+                    raise UploadError('No selected file', 400)
+                upload.image.seek(0)
+
+            model_type = str(fields.get('model_type', 'combined')).lower()
+            pyramid = str(fields.get('pyramid', 'false')).lower() == 'true'
+            priority = resolve_priority(claims, fields.get('priority'))
+            image_delivery = str(fields.get('image_delivery', IMAGE_DELIVERY)).lower()
+            if image_delivery not in IMAGE_DELIVERY_MODES:
+                image_delivery = IMAGE_DELIVERY
+            job = PredictionJob(None if reference else upload.image, model_type, pyramid=pyramid,
+                                priority=priority, user=user, image_delivery=image_delivery)
+            job.score_threshold, job.iou_threshold = parse_thresholds(fields)
+            job.classes = parse_classes(fields)
+            cache_status = None
+            payload = None
+            if reference:
+                attach_reference(job, reference)
+                payload = cached_reference_result(job)
+                cache_status = 'hit' if payload is not None else 'miss'
+            job.cancel_token = token
+            if payload is None:
+                # The body is complete, so the next message can only be http.disconnect
+                watcher = asyncio.ensure_future(self._watch_disconnect(receive, token))
+                if PIPELINE_ENABLED:
+                    # The pipeline has its own worker threads; just await its future on the event loop
+                    payload = (await self._await_job(job, submit_prediction_job(job))).result
+                else:
+                    payload = await loop.run_in_executor(self.executor, run_prediction_job, job)
+                if reference:
+                    store_reference_result(job, payload)
+
+            logger.info("POST /api/predict 200", extra={
+                "method": "POST",
+                "path": scope['path'],
+                "status": 200,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                "prediction": job.summary(),
+                "server": "asgi",
+            })
+            extra_headers = [(b'x-result-cache', cache_status.encode())] if cache_status else []
+            with memory_stats.stage('json'):
+                await self._json(send, 200, payload, origin, extra_headers)
+            memory_stats.record_request()
+
+        except UploadError as e:
+            logger.warning(f"Rejected upload: {str(e)}")
+            await self._json(send, e.status_code, {'error': str(e)}, origin)
+        except PredictionError as e:
+            extra_headers = []
+            if 'retry_after' in e.details:
+                extra_headers.append((b'retry-after', str(max(1, int(e.details['retry_after'] + 0.999))).encode()))
+            await self._json(send, e.status_code, e.to_dict(), origin, extra_headers)
+        except Exception as e:
+            logger.error(f"Prediction error: {str(e)}", exc_info=True)
+            await self._json(send, 500, {'error': f"Prediction error: {str(e)}"}, origin)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if upload is not None:
+                upload.close()
+
+    async def _read_fields(self, receive, content_type):
+        """Options of a JSON or urlencoded body, or None if the client disconnected while sending it"""
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body.extend(message.get('body', b''))
+            more_body = message.get('more_body', False)
+            if len(body) > MAX_FIELDS_BYTES:
+                raise UploadError('Request body too large for a by-reference request', 413)
+        if content_type == 'application/json':
+            try:
+                fields = json.loads(body or b'{}')
+            except ValueError:
+                raise UploadError('Request body is not valid JSON', 400)
+            return fields if isinstance(fields, dict) else {}
+        if content_type == 'application/x-www-form-urlencoded':
+            return MultiDict(parse_qsl(body.decode('utf-8', 'replace')))
+        return {}
+
+    async def _watch_disconnect(self, receive, token):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                token.cancel('disconnected')
+                return
+
+    async def _await_job(self, job, future):
+        """Await a pipeline job, abandoning it once its deadline passes or the client disconnects"""
+        wrapped = asyncio.wrap_future(future)
+        while True:
+            done, _ = await asyncio.wait({wrapped}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return wrapped.result()
+            if job.cancel_token.poll() is not None:
+                future.cancel()
+                raise as_prediction_error(RequestCancelled(job.cancel_token.reason, 'queued'))
+
+    async def _json(self, send, status, payload, origin='', extra_headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        allowed_origins = flask_app.config.get('CORS_ORIGINS', [])
+        headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', (origin if origin in allowed_origins else allowed_origins[0]).encode('latin-1')),
+            (b'access-control-allow-credentials', b'true'),
+            (b'access-control-expose-headers', b'Content-Type, Authorization, Retry-After'),
+            *extra_headers,
+        ]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+app = AsgiApp(flask_app)
@@ -0,0 +1,125 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import current_app, g, jsonify, request
+from jose import jwt
+
+logger = logging.getLogger(__name__)
+
+# Auth middleware configuration
+REQUIRE_API_AUTH = os.getenv('REQUIRE_API_AUTH', 'true').lower() == 'true'
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '4096'))
+# Endpoints on protected blueprints that stay public (status polling from the UI)
+API_AUTH_EXEMPT = {
+    name.strip() for name in
+    os.getenv('API_AUTH_EXEMPT', 'model.model_status,model.loading_status,model.ready,model.blob').split(',')
+    if name.strip()
+}
+
+
+class TokenCache:
+    """Bounded LRU of verified JWT claims; each entry is only served until the token's exp"""
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # token -> (claims, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, expires_at = entry
+            if expires_at <= now:
+                del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return dict(claims)
+
+    def put(self, token, claims, expires_at):
+        if self.max_size <= 0 or expires_at <= time.time():
+            return
+        with self._lock:
+            self._entries[token] = (dict(claims), expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+token_cache = TokenCache()
+
+
+def verify_token(token_value, secret_key, cache=token_cache):
+    """Verify a local JWT, reusing a cached verification while the token is unexpired"""
+    if not token_value:
+        raise ValueError("Token missing")
+
+    # Strip Bearer prefix
+    if token_value.startswith('Bearer '):
+        token_value = token_value[7:]
+
+    # Key on the secret too so rotating SECRET_KEY invalidates cached results
+    cache_key = (secret_key, token_value)
+    claims = cache.get(cache_key)
+    if claims is not None:
+        return claims
+
+    decoded = jwt.decode(token_value, secret_key, algorithms=["HS256"])
+    logger.debug(f"Token verified for user: {decoded.get('username', 'unknown')}")
+    if isinstance(decoded.get('exp'), (int, float)):
+        cache.put(cache_key, decoded, decoded['exp'])
+    return decoded
+
+
+def require_token(blueprint, exempt=None):
+    """Require a valid bearer token on every route of a blueprint (must run before registration)"""
+    exempt_endpoints = API_AUTH_EXEMPT if exempt is None else set(exempt)
+
+    @blueprint.before_request
+    def _authenticate():
+        if not REQUIRE_API_AUTH or request.method == 'OPTIONS':
+            return None
+        if request.endpoint in exempt_endpoints:
+            return None
+
+        token = request.headers.get("Authorization")
+        if not token:
+            logger.warning("Token missing in request")
+            return jsonify({"message": "Token is missing!", "valid": False}), 401
+
+        try:
+            g.user = verify_token(token, current_app.config["SECRET_KEY"])
+        except Exception as e:
+            logger.warning(f"Token validation error: {str(e)}")
+            return jsonify({"message": "Token is invalid!", "valid": False}), 401
+        return None
+
+    return blueprint
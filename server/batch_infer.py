@@ -0,0 +1,221 @@
+"""
+Offline batch inference over a directory of films (retrospective studies).
+
+Walks a directory, decodes and preprocesses images on a pool of prefetch
+threads, runs IT2+IT3 on stacked batches and appends one JSON record per
+image to the output. Records are flushed after every batch, and a rerun with
+the same output skips images already recorded, so an interrupted run resumes
+where it stopped. A `.parquet` output is written at the end from the JSONL log
+kept beside it (needs pyarrow).
+
+Examples:
+    python -m server.batch_infer /data/films --output results.jsonl --batch-size 16
+    python batch_infer.py /data/films --output results.parquet --workers 8 --models random
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXTENSIONS = '.png,.jpg,.jpeg,.dcm,.dicom'
+# Films decoded ahead of the model, in batches; bounds memory held by prefetched tensors
+DEFAULT_PREFETCH_BATCHES = 4
+PROGRESS_INTERVAL_SECONDS = 10
+
+
+def configure_models(mode):
+    """Select the model mode through the environment before model_service is imported"""
+    if mode == 'mock':
+        os.environ['USE_MOCK_MODELS'] = 'true'
+    elif mode == 'random':
+        os.environ['USE_MOCK_MODELS'] = 'false'
+        os.environ['USE_RANDOM_MODELS'] = 'true'
+    elif mode == 'real':
+        os.environ['USE_MOCK_MODELS'] = 'false'
+
+
+def find_images(root, extensions):
+    """Relative paths of matching files under root, in a stable order"""
+    found = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in extensions:
+                found.append(os.path.relpath(os.path.join(directory, name), root))
+    return found
+
+
+def load_completed(log_path):
+    """Paths already recorded in a JSONL log; a torn last line from an interrupted run is cut off"""
+    completed = set()
+    if not os.path.exists(log_path):
+        return completed
+    good_bytes = 0
+    with open(log_path, 'rb') as f:
+        for line in f:
+            try:
+                completed.add(json.loads(line)['path'])
+            except (ValueError, KeyError):
+                break
+            good_bytes += len(line)
+    if good_bytes < os.path.getsize(log_path):
+        logger.warning(f"Truncating incomplete record at the end of {log_path}")
+        with open(log_path, 'r+b') as f:
+            f.truncate(good_bytes)
+    return completed
+
+
+def prefetch(function, items, executor, depth):
+    """executor.map with at most `depth` items in flight, so decoded inputs do not pile up"""
+    pending = deque()
+    for item in items:
+        pending.append((item, executor.submit(function, item)))
+        if len(pending) >= depth:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+def write_parquet(log_path, output_path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit(f"Writing parquet needs pyarrow (pip install pyarrow); results are in {log_path}")
+    with open(log_path) as f:
+        records = [json.loads(line) for line in f]
+    columns = {
+        "path": [r["path"] for r in records],
+        "sha256": [r.get("sha256") for r in records],
+        "labels": [[p["label"] for p in r.get("predictions", [])] for r in records],
+        "scores": [[p["score"] for p in r.get("predictions", [])] for r in records],
+        "boxes": [[p["boxes"] for p in r.get("predictions", [])] for r in records],
+        "error": [r.get("error") for r in records],
+    }
+    pq.write_table(pa.table(columns), output_path)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input_dir', help='Directory to scan recursively')
+    parser.add_argument('--output', required=True, help='Results file (.jsonl, or .parquet)')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Decode/preprocess threads')
+    parser.add_argument('--prefetch', type=int, default=DEFAULT_PREFETCH_BATCHES,
+                        help='Batches decoded ahead of the model')
+    parser.add_argument('--extensions', default=DEFAULT_EXTENSIONS)
+    parser.add_argument('--models', choices=['auto', 'mock', 'random', 'real'], default='auto',
+                        help='auto uses the server environment (USE_MOCK_MODELS and the model files)')
+    parser.add_argument('--limit', type=int, default=0, help='Stop after this many new images')
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    args = build_arg_parser().parse_args(argv)
+    configure_models(args.models)
+
+    # Imported late so --models takes effect before the models load
+    try:
+        from model_service import transform, stack_batch, predict_batch, get_model, torch_available, PredictionError
+        from image_ingest import IngestError, open_image, digest_upload
+    except ImportError:
+        from server.model_service import (transform, stack_batch, predict_batch, get_model, torch_available,
+                                          PredictionError)
+        from server.image_ingest import IngestError, open_image, digest_upload
+
+    model_it2, _ = get_model()
+    model_kind = 'synthetic' if getattr(model_it2, 'is_mock', False) else 'real'
+    if torch_available:
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) - min(args.workers, 2)))
+
+    parquet = args.output.endswith('.parquet')
+    log_path = args.output + '.log.jsonl' if parquet else args.output
+    extensions = {e.strip().lower() if e.strip().startswith('.') else '.' + e.strip().lower()
+                  for e in args.extensions.split(',') if e.strip()}
+
+    paths = find_images(args.input_dir, extensions)
+    completed = load_completed(log_path)
+    todo = [p for p in paths if p not in completed]
+    if args.limit:
+        todo = todo[:args.limit]
+    print(f"{len(paths)} images found, {len(completed)} already done, {len(todo)} to process "
+          f"({model_kind} models, batch {args.batch_size}, {args.workers} workers)", file=sys.stderr)
+
+    def load(relative_path):
+        """Decode and transform one film; runs on a prefetch thread"""
+        with open(os.path.join(args.input_dir, relative_path), 'rb') as f:
+            data = f.read()
+        # Decoded like /api/predict does (display resolution, then transform's resize), so the
+        # records match what the server would return for the same film
+        image = open_image(data)
+        tensor = transform(image)
+        return digest_upload(data), tensor.unsqueeze(0) if torch_available else tensor
+
+    started = time.perf_counter()
+    last_report = started
+    processed = failed = 0
+    batch = []
+
+    def flush(out):
+        nonlocal processed
+        if not batch:
+            return
+        results = predict_batch(stack_batch([tensor for _, _, tensor in batch]))
+        for (path, digest, _), predictions in zip(batch, results):
+            # Boxes are in the 512x512 model input space, like /api/predict
+            out.write(json.dumps({"path": path, "sha256": digest, "predictions": predictions}) + '\n')
+        out.flush()
+        os.fsync(out.fileno())
+        processed += len(batch)
+        batch.clear()
+
+    with open(log_path, 'a') as out, ThreadPoolExecutor(args.workers, thread_name_prefix='prefetch') as executor:
+        try:
+            for path, future in prefetch(load, todo, executor, args.batch_size * args.prefetch):
+                try:
+                    digest, tensor = future.result()
+                except (IngestError, OSError) as e:
+                    # Recorded so a resumed run does not retry unreadable files
+                    out.write(json.dumps({"path": path, "error": str(e)}) + '\n')
+                    failed += 1
+                    continue
+                batch.append((path, digest, tensor))
+                if len(batch) >= args.batch_size:
+                    flush(out)
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_INTERVAL_SECONDS:
+                    rate = processed / (now - started)
+                    remaining = (len(todo) - processed - failed) / rate if rate else float('inf')
+                    print(f"{processed + failed}/{len(todo)} done, {rate:.1f} images/s, "
+                          f"~{remaining / 60:.1f} min left", file=sys.stderr)
+                    last_report = now
+            flush(out)
+        except KeyboardInterrupt:
+            print("Interrupted; rerun the same command to resume", file=sys.stderr)
+            executor.shutdown(wait=False, cancel_futures=True)
+            return 130
+        except PredictionError as e:
+            print(f"Inference failed: {str(e)}", file=sys.stderr)
+            return 1
+
+    elapsed = time.perf_counter() - started
+    print(f"Processed {processed} images ({failed} unreadable) in {elapsed:.1f}s: "
+          f"{processed / elapsed if elapsed else 0:.1f} images/s", file=sys.stderr)
+
+    if parquet:
+        # The JSONL log stays next to the parquet file so later runs can resume from it
+        write_parquet(log_path, args.output)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import os
+import re
+import hmac
+import time
+import hashlib
+import logging
+import tempfile
+
+try:
+    from disk_cache import MB, PeriodicSweep, select_evictions
+except ImportError:
+    from server.disk_cache import MB, PeriodicSweep, select_evictions
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed store for rendered images (environment driven)
+BLOB_DIR = os.getenv('BLOB_DIR', os.path.join(os.path.dirname(__file__), '.blob_cache'))
+# inline: base64 data URLs in the JSON (default); url: links to /api/blobs/<digest>.<ext>;
+# none: findings only, nothing is drawn or encoded
+IMAGE_DELIVERY = os.getenv('IMAGE_DELIVERY', 'inline').lower()
+IMAGE_DELIVERY_MODES = ('inline', 'url', 'none')
+# Size bound of the store (0 disables); least recently used blobs are removed past it
+BLOB_CACHE_MB = float(os.getenv('BLOB_CACHE_MB', '1024'))
+# Blobs unused for this long are removed (0 keeps them until the size bound needs room)
+BLOB_MAX_AGE_HOURS = float(os.getenv('BLOB_MAX_AGE_HOURS', '168'))
+# Lifetime of signed blob links
+BLOB_URL_TTL_SECONDS = int(os.getenv('BLOB_URL_TTL_SECONDS', '86400'))
+# Expiry is rounded up to this step, so links to a blob stay identical (and browser-cacheable) for a while
+BLOB_URL_EXPIRY_STEP = 3600
+# Bounds are enforced by a background sweep started from put(), at most this often
+BLOB_SWEEP_SECONDS = 300
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+REF_NAME_RE = re.compile(r'^[A-Za-z0-9_.-]+$')
+MIMETYPES = {'png': 'image/png', 'jpeg': 'image/jpeg'}
+SIGNATURE_LENGTH = 32
+BLOB_URL_RE = re.compile(r'^/api/blobs/([0-9a-f]{64})\.([a-z]+)\?')
+
+
+class BlobStore:
+    """Immutable blobs named by their SHA-256, plus per-upload refs to rendered variants.
+
+    Blobs live at <root>/<first two hex digits>/<digest>.<ext> and are written
+    to a temp file and renamed, so readers never see partial content. Refs map
+    (upload digest, variant) to a blob digest, so the same upload is not
+    encoded again. Blob URLs carry an expiry and an HMAC of the digest and
+    expiry: they can be used in <img> tags without a bearer token, but cannot
+    be enumerated and stop working once they expire.
+
+    Reads and repeat writes touch a blob's mtime, and a periodic sweep removes
+    blobs unused for max_age_hours, then the least recently used ones past
+    max_mb, then refs whose blob is gone.
+    """
+
+    def __init__(self, root=BLOB_DIR, signing_key=b'', max_mb=BLOB_CACHE_MB, max_age_hours=BLOB_MAX_AGE_HOURS,
+                 url_ttl=BLOB_URL_TTL_SECONDS):
+        self.root = root
+        self.signing_key = signing_key
+        self.max_mb = max_mb
+        self.max_age_hours = max_age_hours
+        self.url_ttl = url_ttl
+        self._sweeper = PeriodicSweep(self.sweep, BLOB_SWEEP_SECONDS, 'blob-sweep')
+
+    def _blob_path(self, digest, ext):
+        return os.path.join(self.root, digest[:2], f"{digest}.{ext}")
+
+    def _ref_path(self, upload_digest, name):
+        return os.path.join(self.root, 'refs', upload_digest[:2], upload_digest, name)
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, staging = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(staging, path)
+        except Exception:
+            try:
+                os.unlink(staging)
+            except OSError:
+                pass
+            raise
+
+    def _touch(self, path):
+        """Mark a blob as used; False if it is gone"""
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def put(self, data, ext):
+        """Store bytes (once) and return their digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest, ext)
+        if not self._touch(path):
+            self._write_atomic(path, data)
+        if self.max_mb or self.max_age_hours:
+            self._sweeper.request()
+        return digest
+
+    def path(self, digest, ext):
+        """Path of a stored blob, or None for unknown/invalid names"""
+        if not DIGEST_RE.match(digest) or ext not in MIMETYPES:
+            return None
+        path = self._blob_path(digest, ext)
+        return path if self._touch(path) else None
+
+    def set_ref(self, upload_digest, name, digest, ext):
+        if DIGEST_RE.match(upload_digest or '') and REF_NAME_RE.match(name):
+            self._write_atomic(self._ref_path(upload_digest, name), f"{digest}.{ext}".encode())
+
+    def get_ref(self, upload_digest, name):
+        """(digest, ext) previously stored for an upload variant, if the blob still exists"""
+        if not DIGEST_RE.match(upload_digest or '') or not REF_NAME_RE.match(name):
+            return None
+        try:
+            with open(self._ref_path(upload_digest, name)) as f:
+                digest, _, ext = f.read().strip().partition('.')
+        except OSError:
+            return None
+        return (digest, ext) if self.path(digest, ext) else None
+
+    def sign(self, digest, expires):
+        message = f"{digest}:{expires}".encode()
+        return hmac.new(self.signing_key, message, hashlib.sha256).hexdigest()[:SIGNATURE_LENGTH]
+
+    def verify(self, digest, expires, signature, now=None):
+        """Whether a link's signature matches and its expiry (unix seconds) has not passed"""
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return False
+        if expires < (time.time() if now is None else now):
+            return False
+        return hmac.compare_digest(self.sign(digest, expires), signature or '')
+
+    def url(self, digest, ext, now=None):
+        now = time.time() if now is None else now
+        expires = -(-int(now + self.url_ttl) // BLOB_URL_EXPIRY_STEP) * BLOB_URL_EXPIRY_STEP
+        return f"/api/blobs/{digest}.{ext}?exp={expires}&sig={self.sign(digest, expires)}"
+
+    def relink(self, url):
+        """Freshly signed link to the blob behind an earlier link, or None once that blob is evicted"""
+        match = BLOB_URL_RE.match(url or '')
+        if not match or not self.path(*match.groups()):
+            return None
+        return self.url(*match.groups())
+
+    def sweep(self, now=None):
+        """Apply the age and size bounds, then drop refs to removed blobs; returns the blobs removed"""
+        now = time.time() if now is None else now
+        entries = []
+        for directory, subdirectories, files in os.walk(self.root):
+            if directory == self.root and 'refs' in subdirectories:
+                subdirectories.remove('refs')
+            for name in files:
+                if name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_mtime, stat.st_size))
+
+        removed = 0
+        for path in select_evictions(entries, int(self.max_mb * MB), self.max_age_hours * 3600, now):
+            try:
+                os.unlink(path)
+                removed += 1
+            except OSError:
+                pass
+
+        refs_root = os.path.join(self.root, 'refs')
+        for directory, _, files in os.walk(refs_root, topdown=False):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    with open(path) as f:
+                        digest, _, ext = f.read().strip().partition('.')
+                    if not os.path.exists(self._blob_path(digest, ext)):
+                        os.unlink(path)
+                except OSError:
+                    pass
+            if directory != refs_root:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+        if removed:
+            logger.info(f"Blob sweep removed {removed} of {len(entries)} blobs from {self.root}")
+        return removed
+
+
+blob_store = BlobStore()
@@ -0,0 +1,94 @@
+import os
+import socket
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Clients send their own budget in this header; it is clamped to MAX_REQUEST_TIMEOUT_MS
+REQUEST_TIMEOUT_HEADER = 'X-Request-Timeout-Ms'
+# Deadline applied when the header is absent (0 means none)
+DEFAULT_REQUEST_TIMEOUT_MS = int(os.getenv('DEFAULT_REQUEST_TIMEOUT_MS', '0'))
+MAX_REQUEST_TIMEOUT_MS = int(os.getenv('MAX_REQUEST_TIMEOUT_MS', '120000'))
+# How often a waiting request handler checks for a closed client connection
+DISCONNECT_POLL_SECONDS = float(os.getenv('DISCONNECT_POLL_SECONDS', '0.25'))
+
+# Status codes reported for abandoned work (499 is nginx's "client closed request")
+STATUS_DISCONNECTED = 499
+STATUS_DEADLINE = 504
+
+
+class RequestCancelled(Exception):
+    """Work abandoned because the client went away or the request deadline passed"""
+
+    def __init__(self, reason, stage=None):
+        self.reason = reason
+        self.stage = stage
+        self.status_code = STATUS_DEADLINE if reason == 'deadline' else STATUS_DISCONNECTED
+        message = 'Request deadline exceeded' if reason == 'deadline' else 'Client disconnected'
+        super().__init__(f"{message} (before {stage})" if stage else message)
+
+
+def parse_timeout_ms(value, default=DEFAULT_REQUEST_TIMEOUT_MS):
+    """Timeout from a header value, clamped to the server maximum; invalid values use the default"""
+    try:
+        timeout = int(float(value)) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        timeout = default
+    if timeout <= 0:
+        return 0
+    return min(timeout, MAX_REQUEST_TIMEOUT_MS) if MAX_REQUEST_TIMEOUT_MS else timeout
+
+
+class CancelToken:
+    """Shared between a request handler and the stages doing its work.
+
+    Stages call check() at their boundaries; it raises RequestCancelled once the
+    deadline has passed, the client disconnected, or cancel() was called.
+    """
+
+    def __init__(self, timeout_ms=0, disconnected=None):
+        self.deadline = time.monotonic() + timeout_ms / 1000 if timeout_ms else None
+        self._disconnected = disconnected
+        self.reason = None
+
+    def cancel(self, reason):
+        if self.reason is None:
+            self.reason = reason
+
+    def remaining(self):
+        """Seconds until the deadline, or None without one"""
+        return None if self.deadline is None else max(self.deadline - time.monotonic(), 0.0)
+
+    def poll(self):
+        """Update and return the cancellation reason, if any"""
+        if self.reason is None:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                self.cancel('deadline')
+            elif self._disconnected is not None and self._disconnected():
+                self.cancel('disconnected')
+        return self.reason
+
+    def check(self, stage=None):
+        if self.poll() is not None:
+            raise RequestCancelled(self.reason, stage)
+
+
+def socket_disconnect_probe(sock):
+    """Callable reporting whether the peer closed a connection, peeking without consuming data"""
+    def disconnected():
+        try:
+            return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+        except (BlockingIOError, InterruptedError):
+            return False
+        except OSError:
+            return True
+    return disconnected
+
+
+def wsgi_disconnect_probe(environ):
+    """Disconnect probe for the raw socket exposed by werkzeug's dev server or gunicorn, if any"""
+    sock = environ.get('gunicorn.socket') or environ.get('werkzeug.socket')
+    if sock is None or not hasattr(socket, 'MSG_DONTWAIT'):
+        return None
+    return socket_disconnect_probe(sock)
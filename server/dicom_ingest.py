@@ -0,0 +1,108 @@
+import logging
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# pydicom is optional: without it DICOM uploads are rejected with 415
+pydicom_available = False
+try:
+    import pydicom
+    try:
+        # pydicom >= 3
+        from pydicom.pixels import apply_modality_lut, apply_voi_lut, convert_color_space
+    except ImportError:
+        from pydicom.pixel_data_handlers.util import apply_modality_lut, apply_voi_lut, convert_color_space
+    pydicom_available = True
+except ImportError:
+    pydicom = None
+
+# Elements larger than this stay on disk until accessed, so PixelData is read only when needed
+DEFER_SIZE = '256 KB'
+# Percentiles used to window images that carry no VOI LUT or window settings
+FALLBACK_WINDOW_PERCENTILES = (0.5, 99.5)
+
+
+class DicomError(Exception):
+    """A DICOM file that cannot be turned into a display image"""
+
+    def __init__(self, message, status_code=415):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_dicom(header):
+    """DICOM Part 10 files carry 'DICM' after a 128-byte preamble"""
+    return len(header) >= 132 and header[128:132] == b'DICM'
+
+
+def _first_frame(ds):
+    """Decode only the first frame of multi-frame objects when pydicom supports it"""
+    frames = int(getattr(ds, 'NumberOfFrames', 1) or 1)
+    if frames > 1:
+        try:
+            from pydicom.pixels import pixel_array
+            return pixel_array(ds, index=0)
+        except ImportError:
+            return ds.pixel_array[0]
+    return ds.pixel_array
+
+
+def to_display_array(ds, pixels, max_side=0):
+    """Apply modality/VOI LUTs and map to 8-bit grayscale with vectorized numpy ops"""
+    # Subsample before the float math when the film is far larger than needed for display
+    if max_side and max(pixels.shape[:2]) >= 2 * max_side:
+        step = max(pixels.shape[:2]) // max_side
+        pixels = pixels[::step, ::step]
+
+    if pixels.ndim == 3:
+        # Color DICOM (secondary captures); already 8-bit per channel in practice
+        if str(getattr(ds, 'PhotometricInterpretation', '')).startswith('YBR'):
+            pixels = convert_color_space(pixels, ds.PhotometricInterpretation, 'RGB')
+        return np.ascontiguousarray(pixels, dtype=np.uint8)
+
+    values = apply_modality_lut(pixels, ds)
+    has_voi = 'WindowCenter' in ds or 'VOILUTSequence' in ds
+    if has_voi:
+        values = apply_voi_lut(values, ds, index=0)
+        low, high = float(values.min()), float(values.max())
+    else:
+        low, high = np.percentile(values, FALLBACK_WINDOW_PERCENTILES)
+
+    values = values.astype(np.float32, copy=False)
+    scale = 255.0 / max(float(high) - float(low), 1e-6)
+    display = np.clip((values - low) * scale, 0, 255).astype(np.uint8)
+
+    # MONOCHROME1 stores bone as dark; invert so the film reads like every other upload
+    if getattr(ds, 'PhotometricInterpretation', '') == 'MONOCHROME1':
+        np.subtract(255, display, out=display)
+    return display
+
+
+def read_dicom(source, max_side=0, check_size=None):
+    """Read a DICOM upload into a PIL image, reading pixel data only after the header is validated"""
+    if not pydicom_available:
+        raise DicomError("DICOM uploads require pydicom on the server (pip install pydicom)", 415)
+
+    try:
+        ds = pydicom.dcmread(source, defer_size=DEFER_SIZE)
+    except Exception as e:
+        raise DicomError(f"Could not parse DICOM file: {str(e)}", 400)
+
+    if 'PixelData' not in ds:
+        raise DicomError("DICOM file contains no image pixel data", 400)
+
+    rows, columns = int(ds.Rows), int(ds.Columns)
+    if check_size is not None:
+        check_size((columns, rows))
+
+    try:
+        pixels = _first_frame(ds)
+    except Exception as e:
+        syntax = getattr(getattr(ds, 'file_meta', None), 'TransferSyntaxUID', 'unknown')
+        raise DicomError(f"Cannot decode DICOM pixel data (transfer syntax {syntax}): {str(e)}", 415)
+
+    display = to_display_array(ds, pixels, max_side=max_side)
+    logger.debug(f"Decoded DICOM {columns}x{rows} ({ds.get('Modality', '?')}) to {display.shape[1]}x{display.shape[0]}")
+    return Image.fromarray(display)
@@ -0,0 +1,62 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def select_evictions(entries, max_bytes, max_age_seconds, now):
+    """Paths to delete from (path, last_used, size) entries.
+
+    Entries unused for longer than max_age_seconds go first. The rest are kept
+    most recently used first until max_bytes is reached, and everything older
+    goes. A bound of 0 disables it.
+    """
+    victims = []
+    kept_bytes = 0
+    full = False
+    for path, last_used, size in sorted(entries, key=lambda entry: entry[1], reverse=True):
+        if max_age_seconds and now - last_used > max_age_seconds:
+            victims.append(path)
+            continue
+        if max_bytes and kept_bytes + size > max_bytes:
+            full = True
+        if full:
+            victims.append(path)
+        else:
+            kept_bytes += size
+    return victims
+
+
+class PeriodicSweep:
+    """Runs a cache sweep on a daemon thread, at most once per interval and never twice at once"""
+
+    def __init__(self, sweep, interval_seconds, name):
+        self.sweep = sweep
+        self.interval_seconds = interval_seconds
+        self.name = name
+        self._lock = threading.Lock()
+        self._running = False
+        self._last = None
+
+    def request(self):
+        """Start a sweep if one is due; returns whether one was started"""
+        now = time.monotonic()
+        with self._lock:
+            if self._running or (self._last is not None and now - self._last < self.interval_seconds):
+                return False
+            self._running = True
+            self._last = now
+        threading.Thread(target=self._run, name=self.name, daemon=True).start()
+        return True
+
+    def _run(self):
+        try:
+            self.sweep()
+        except Exception as e:
+            logger.error(f"{self.name} failed: {str(e)}", exc_info=True)
+        finally:
+            with self._lock:
+                self._running = False
@@ -0,0 +1,419 @@
+"""
+Consistent-hash dispatcher in front of several CXRaide inference backends.
+
+Predictions are routed by the SHA-256 of the uploaded image, so repeat
+uploads of a film land on the node that already holds its rendered blobs and
+tile pyramid. Tiles and re-queries follow their image id the same way; for
+by-reference predictions, which are routed by path, they fall back to asking
+each node in ring order until one knows the image. Backends are
+health-checked through /api/ready; a backend that fails is taken off the ring,
+and only the keys it owned move to other nodes. Everything else (login,
+status, blobs) is proxied unchanged.
+
+Examples:
+    # Three local mock-model backends behind a dispatcher on port 8000
+    python dispatcher.py --spawn 3 --models mock --port 8000
+
+    # Existing backends (they must share SECRET_KEY so tokens work on each)
+    python dispatcher.py --backend http://10.0.0.5:5000 --backend http://10.0.0.6:5000
+"""
+import os
+import sys
+import time
+import bisect
+import hashlib
+import logging
+import argparse
+import threading
+import http.client
+from urllib.parse import urlparse
+
+from flask import Flask, Response, jsonify, request
+
+try:
+    from image_ingest import MAX_UPLOAD_BYTES, digest_upload
+except ImportError:
+    from server.image_ingest import MAX_UPLOAD_BYTES, digest_upload
+
+logger = logging.getLogger(__name__)
+
+# Dispatcher configuration (environment driven, overridable on the command line)
+DISPATCH_BACKENDS = [url.strip() for url in os.getenv('DISPATCH_BACKENDS', '').split(',') if url.strip()]
+# Points per backend on the hash ring; more points spread keys more evenly
+DISPATCH_VNODES = int(os.getenv('DISPATCH_VNODES', '64'))
+DISPATCH_HEALTH_INTERVAL = float(os.getenv('DISPATCH_HEALTH_INTERVAL', '2'))
+# Consecutive failed probes before a backend leaves the ring
+DISPATCH_FAIL_THRESHOLD = int(os.getenv('DISPATCH_FAIL_THRESHOLD', '2'))
+DISPATCH_TIMEOUT = float(os.getenv('DISPATCH_TIMEOUT', '120'))
+DISPATCH_PROBE_TIMEOUT = float(os.getenv('DISPATCH_PROBE_TIMEOUT', '2'))
+# Read size when relaying streamed (text/event-stream) responses; shorter reads return as soon as data arrives
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Headers that describe a single connection and must not be forwarded
+HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te',
+              'trailers', 'transfer-encoding', 'upgrade', 'host', 'content-length'}
+
+
+def ring_point(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, nodes=(), vnodes=DISPATCH_VNODES):
+        self.vnodes = vnodes
+        self._points = []
+        self._owners = []
+        self.nodes = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for i in range(self.vnodes):
+            point = ring_point(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        kept = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def preference(self, key):
+        """Distinct nodes in ring order from the key's position: owner first, then failover targets"""
+        if not self._points:
+            return []
+        start = bisect.bisect(self._points, ring_point(key))
+        ordered = []
+        for i in range(len(self._points)):
+            owner = self._owners[(start + i) % len(self._points)]
+            if owner not in ordered:
+                ordered.append(owner)
+                if len(ordered) == len(self.nodes):
+                    break
+        return ordered
+
+    def shares(self):
+        """Fraction of the key space each node owns"""
+        if not self._points:
+            return {}
+        span = 1 << 64
+        shares = {node: 0 for node in self.nodes}
+        previous = self._points[-1] - span
+        for point, owner in zip(self._points, self._owners):
+            shares[owner] += point - previous
+            previous = point
+        return {node: round(share / span, 4) for node, share in shares.items()}
+
+
+class Backend:
+    """One inference server, with keep-alive connections per dispatcher thread"""
+
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.url = url.rstrip('/')
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.https = parsed.scheme == 'https'
+        self._local = threading.local()
+        self.healthy = False
+        self.consecutive_failures = 0
+        self.last_probe = None
+        self.last_error = None
+        self.requests = 0
+        self.errors = 0
+
+    def _connection(self, timeout):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn_cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = conn_cls(self.host, self.port, timeout=timeout)
+            self._local.conn = conn
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def request(self, method, path, body=None, headers=None, timeout=DISPATCH_TIMEOUT, stream=False):
+        """Return (status, headers, body), reconnecting once when a kept-alive socket went stale.
+
+        With `stream`, an event-stream body is returned as an iterator of chunks
+        read as the backend sends them.
+        """
+        for attempt in range(2):
+            conn = self._connection(timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                if stream and response.getheader('Content-Type', '').startswith('text/event-stream'):
+                    # The stream owns the connection until it ends; the next request opens a new one
+                    self._local.conn = None
+                    return response.status, response.getheaders(), self._relay(conn, response)
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self._reset()
+                return response.status, response.getheaders(), data
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self._reset()
+                if attempt == 1:
+                    raise
+            except Exception:
+                self._reset()
+                raise
+
+    @staticmethod
+    def _relay(conn, response):
+        try:
+            while True:
+                chunk = response.read1(STREAM_CHUNK_BYTES)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            # Also runs when the client goes away, so the backend sees the disconnect
+            conn.close()
+
+    def stats(self):
+        return {
+            "healthy": self.healthy,
+            "consecutive_failures": self.consecutive_failures,
+            "last_probe": self.last_probe,
+            "last_error": self.last_error,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+class Dispatcher:
+    """Keeps the ring in sync with backend health and picks the backend for each key"""
+
+    def __init__(self, urls, vnodes=DISPATCH_VNODES, interval=DISPATCH_HEALTH_INTERVAL,
+                 fail_threshold=DISPATCH_FAIL_THRESHOLD):
+        self.backends = {url.rstrip('/'): Backend(url) for url in urls}
+        self.ring = HashRing(vnodes=vnodes)
+        self.interval = interval
+        self.fail_threshold = fail_threshold
+        self._lock = threading.Lock()
+        self._thread = None
+        self.failovers = 0
+        self.rebalances = 0
+
+    def start(self):
+        self.check_all()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._health_loop, name='dispatch-health', daemon=True)
+            self._thread.start()
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.interval)
+            self.check_all()
+
+    def check_all(self):
+        for backend in list(self.backends.values()):
+            try:
+                status, _, _ = backend.request('GET', '/api/ready', timeout=DISPATCH_PROBE_TIMEOUT)
+                error = None if status == 200 else f"HTTP {status}"
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            backend.last_probe = time.time()
+            if error is None:
+                self.mark_up(backend)
+            else:
+                backend.last_error = error
+                self.mark_failed(backend, force=False)
+
+    def mark_up(self, backend):
+        with self._lock:
+            backend.consecutive_failures = 0
+            if not backend.healthy:
+                backend.healthy = True
+                self.ring.add(backend.url)
+                self.rebalances += 1
+                logger.info(f"Backend {backend.url} joined the ring ({len(self.ring.nodes)} healthy)")
+
+    def mark_failed(self, backend, force=True):
+        """Count a failure; the backend leaves the ring at the threshold, or at once when forced"""
+        with self._lock:
+            backend.consecutive_failures += 1
+            if backend.healthy and (force or backend.consecutive_failures >= self.fail_threshold):
+                backend.healthy = False
+                self.ring.remove(backend.url)
+                self.rebalances += 1
+                logger.warning(f"Backend {backend.url} left the ring: {backend.last_error} "
+                               f"({len(self.ring.nodes)} healthy)")
+
+    def candidates(self, key):
+        with self._lock:
+            return [self.backends[url] for url in self.ring.preference(key)]
+
+    def forward(self, key, method, path, body, headers, retry_on=(503,), stream=False):
+        """Send to the key's owner, failing over along the ring; returns (backend, status, headers, body)"""
+        candidates = self.candidates(key)
+        if not candidates:
+            return None, 503, [('Content-Type', 'application/json')], b'{"error": "No healthy inference backends"}'
+        last = None
+        for attempt, backend in enumerate(candidates):
+            if attempt:
+                self.failovers += 1
+            backend.requests += 1
+            try:
+                status, response_headers, data = backend.request(method, path, body, headers, stream=stream)
+            except (ConnectionError, OSError, http.client.HTTPException) as e:
+                backend.errors += 1
+                backend.last_error = str(e) or type(e).__name__
+                self.mark_failed(backend)
+                continue
+            if last is not None and not isinstance(last[3], bytes):
+                last[3].close()
+            last = (backend, status, response_headers, data)
+            if status not in retry_on:
+                break
+        if last is None:
+            return None, 502, [('Content-Type', 'application/json')], b'{"error": "All inference backends failed"}'
+        return last
+
+    def stats(self):
+        with self._lock:
+            return {
+                "healthy": list(self.ring.nodes),
+                "vnodes": self.ring.vnodes,
+                "key_share": self.ring.shares(),
+                "failovers": self.failovers,
+                "rebalances": self.rebalances,
+                "backends": {url: backend.stats() for url, backend in self.backends.items()},
+            }
+
+
+def retry_statuses(path):
+    """Statuses that send a request on to the next node in ring order"""
+    # Blobs live on the node that rendered them, which the key cannot tell. A by-reference prediction
+    # was routed by its path, but its image id (and tile pyramid) is the content SHA-256, so the node
+    # holding them need not own that key.
+    if path.startswith(('api/blobs/', 'api/tiles/')) or path.rstrip('/') == 'api/predict/requery':
+        return (503, 404)
+    return (503,)
+
+
+def routing_key(path):
+    """Ring key for a request: the upload's SHA-256 (or image path) for predictions, the image id for re-queries and tiles"""
+    if request.method == 'POST' and path.rstrip('/') in ('api/predict', 'predict', 'api/predict/stream'):
+        # By-reference requests are routed by path, so the node holding their cached result gets them
+        fields = (request.get_json(silent=True) or {}) if request.is_json else request.form
+        reference = fields.get('image_path') or fields.get('image_uri')
+        if reference:
+            return str(reference)
+        upload = request.files.get('image')
+        if upload is not None:
+            return digest_upload(upload.stream)
+    if request.method == 'POST' and path.rstrip('/') == 'api/predict/requery':
+        # Same key as the original upload, so the node holding its raw outputs answers
+        image_id = (request.get_json(silent=True) or {}).get('image_id')
+        if image_id:
+            return str(image_id)
+    if path.startswith('api/tiles/'):
+        return path[len('api/tiles/'):].split('_files/')[0].split('.dzi')[0]
+    return path
+
+
+def create_app(dispatcher):
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+    @app.route('/dispatcher/stats', methods=['GET'])
+    def dispatcher_stats():
+        return jsonify(dispatcher.stats())
+
+    @app.route('/dispatcher/ready', methods=['GET'])
+    def dispatcher_ready():
+        healthy = len(dispatcher.ring.nodes)
+        return jsonify({"ready": healthy > 0, "healthy_backends": healthy}), 200 if healthy else 503
+
+    @app.route('/', defaults={'path': ''}, methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+    @app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+    def proxy(path):
+        # Keep the raw body so it can be forwarded after the form is parsed for the key
+        body = request.get_data(cache=True)
+        key = routing_key(path)
+        headers = {name: value for name, value in request.headers.items() if name.lower() not in HOP_BY_HOP}
+        headers['X-Forwarded-For'] = ', '.join(filter(None, [request.headers.get('X-Forwarded-For'), request.remote_addr]))
+        target = request.full_path if request.query_string else request.path
+
+        # Event streams (/api/predict/stream) are relayed as they arrive rather than once the job is done
+        backend, status, response_headers, data = dispatcher.forward(key, request.method, target, body or None,
+                                                                     headers, retry_statuses(path), stream=True)
+        # Passing the headers up front keeps the backend's Content-Type instead of adding Flask's default
+        response = Response(data, status=status,
+                            headers=[(name, value) for name, value in response_headers
+                                     if name.lower() not in HOP_BY_HOP])
+        if backend is not None:
+            response.headers['X-Backend'] = backend.url
+        return response
+
+    return app
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', action='append', default=[], help='Backend base URL (repeatable)')
+    parser.add_argument('--spawn', type=int, default=0, help='Start this many local backends on free ports')
+    parser.add_argument('--models', choices=['mock', 'random', 'real'], default='mock',
+                        help='Model mode for spawned backends')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('DISPATCH_PORT', '8000')))
+    parser.add_argument('--vnodes', type=int, default=DISPATCH_VNODES)
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    args = build_arg_parser().parse_args(argv)
+
+    children = []
+    urls = list(args.backend) or list(DISPATCH_BACKENDS)
+    if args.spawn:
+        # Only --spawn needs the load-test harness
+        try:
+            from load_test import find_free_port, spawn_server
+        except ImportError:
+            from server.load_test import find_free_port, spawn_server
+    for _ in range(args.spawn):
+        port = find_free_port()
+        children.append(spawn_server(port, args.models))
+        urls.append(f"http://127.0.0.1:{port}")
+    if not urls:
+        print("No backends: pass --backend URL, --spawn N or set DISPATCH_BACKENDS", file=sys.stderr)
+        return 2
+
+    dispatcher = Dispatcher(urls, vnodes=args.vnodes)
+    dispatcher.start()
+    logger.info(f"Dispatching to {len(urls)} backends on http://{args.host}:{args.port}")
+    try:
+        create_app(dispatcher).run(host=args.host, port=args.port, threaded=True)
+    finally:
+        for child in children:
+            child.terminate()
+        for child in children:
+            try:
+                child.wait(timeout=10)
+            except Exception:
+                child.kill()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
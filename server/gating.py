@@ -0,0 +1,211 @@
+import os
+import time
+import logging
+import importlib
+import threading
+
+import numpy as np
+from PIL import Image
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+logger = logging.getLogger(__name__)
+
+# Gating configuration: comma-separated gate names run in order (off disables gating).
+# Built-in gates are "stats" and "model"; "package.module:factory" plugs in a custom gate.
+GATE_MODE = os.getenv('GATE_MODE', 'off').lower()
+# Default threshold shared by the built-in gates (each can be overridden below)
+GATE_THRESHOLD = float(os.getenv('GATE_THRESHOLD', '0.5'))
+GATE_STATS_THRESHOLD = float(os.getenv('GATE_STATS_THRESHOLD', str(GATE_THRESHOLD)))
+GATE_MODEL_THRESHOLD = float(os.getenv('GATE_MODEL_THRESHOLD', str(GATE_THRESHOLD)))
+# TorchScript classifier returning one abnormality logit (or [normal, abnormal] logits) per image
+GATE_MODEL_PATH = os.getenv('GATE_MODEL_PATH', os.path.join(os.path.dirname(__file__), 'models', 'gate.pt'))
+GATE_MODEL_INPUT_SIZE = int(os.getenv('GATE_MODEL_INPUT_SIZE', '224'))
+
+# Side of the thumbnail the statistics heuristic looks at
+STATS_SAMPLE_SIZE = 128
+
+PASS = 'pass'
+NOT_CXR = 'not_cxr'
+NORMAL = 'normal'
+
+MESSAGES = {
+    NOT_CXR: "Image does not appear to be a chest X-ray",
+    NORMAL: "No abnormalities detected by the screening gate",
+}
+
+
+class GateDecision:
+    def __init__(self, gate, action, score, threshold, elapsed_ms=0.0):
+        self.gate = gate
+        self.action = action
+        self.score = score
+        self.threshold = threshold
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def short_circuit(self):
+        return self.action != PASS
+
+    def to_dict(self):
+        return {
+            "gate": self.gate,
+            "decision": self.action,
+            "score": round(float(self.score), 4),
+            "threshold": self.threshold,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+        }
+
+
+class StatsGate:
+    """Rejects uploads that do not look like a chest film, from cheap image statistics.
+
+    The score multiplies four cues from a 128x128 thumbnail: colour saturation
+    (films are grayscale), contrast (blank or flat images), aspect ratio and
+    left-right symmetry of the column brightness profile (mediastinum between
+    two lung fields). Scores below the threshold short-circuit as not_cxr.
+    """
+
+    name = 'stats'
+
+    def __init__(self, threshold=GATE_STATS_THRESHOLD):
+        self.threshold = threshold
+
+    def score(self, image):
+        width, height = image.size
+        aspect = width / max(height, 1)
+        small = np.asarray(image.resize((STATS_SAMPLE_SIZE, STATS_SAMPLE_SIZE), Image.BILINEAR), dtype=np.float32) / 255.0
+
+        saturation = float((small.max(axis=2) - small.min(axis=2)).mean())
+        gray = small.mean(axis=2)
+        contrast = float(gray.std())
+
+        profile = gray.mean(axis=0)
+        profile = profile - profile.mean()
+        norm = float(np.sqrt((profile * profile).sum()))
+        symmetry = float((profile * profile[::-1]).sum() / (norm * norm)) if norm > 1e-6 else 0.0
+
+        grayscale_cue = np.clip(1.0 - saturation / 0.08, 0.0, 1.0)
+        contrast_cue = np.clip((contrast - 0.03) / 0.07, 0.0, 1.0)
+        aspect_cue = 1.0 if 0.5 <= aspect <= 2.0 else 0.0
+        symmetry_cue = 0.5 + 0.5 * max(symmetry, 0.0)
+        return float(grayscale_cue * contrast_cue * aspect_cue * symmetry_cue)
+
+    def __call__(self, job):
+        score = self.score(job.image)
+        return NOT_CXR if score < self.threshold else PASS, score
+
+
+class ModelGate:
+    """Small TorchScript classifier that skips the detectors for confidently normal films"""
+
+    name = 'model'
+
+    def __init__(self, path=GATE_MODEL_PATH, threshold=GATE_MODEL_THRESHOLD, input_size=GATE_MODEL_INPUT_SIZE):
+        if torch is None:
+            raise RuntimeError("GATE_MODE=model requires PyTorch")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Gate model not found at {path}")
+        self.model = torch.jit.load(path, map_location='cpu').eval()
+        self.threshold = threshold
+        self.input_size = input_size
+        logger.info(f"Loaded gate model from {path}")
+
+    def __call__(self, job):
+        tensor = job.image_tensor
+        if not isinstance(tensor, torch.Tensor):
+            tensor = torch.from_numpy(np.asarray(tensor))
+        with torch.no_grad():
+            # Reuse the detector input, only shrinking it for the classifier
+            small = torch.nn.functional.interpolate(tensor, size=(self.input_size, self.input_size),
+                                                    mode='bilinear', align_corners=False)
+            logits = self.model(small).reshape(-1)
+        abnormal = float(torch.softmax(logits, 0)[-1]) if logits.numel() > 1 else float(torch.sigmoid(logits[0]))
+        return NORMAL if abnormal < self.threshold else PASS, abnormal
+
+
+BUILTIN_GATES = {'stats': StatsGate, 'model': ModelGate}
+
+
+def load_gate(spec):
+    """Instantiate a gate by built-in name or "package.module:factory" path"""
+    if spec in BUILTIN_GATES:
+        return BUILTIN_GATES[spec]()
+    module_name, _, attribute = spec.partition(':')
+    if not attribute:
+        raise ValueError(f"Unknown gate '{spec}'")
+    factory = getattr(importlib.import_module(module_name), attribute)
+    gate = factory()
+    if not getattr(gate, 'name', None):
+        gate.name = spec
+    return gate
+
+
+class Gating:
+    """Runs the configured gates in order and keeps counters of how often each one fires"""
+
+    def __init__(self, mode=GATE_MODE):
+        self.gates = []
+        for spec in [part.strip() for part in mode.split(',') if part.strip() and part.strip() != 'off']:
+            try:
+                self.gates.append(load_gate(spec))
+            except Exception as e:
+                logger.error(f"Gate '{spec}' disabled: {str(e)}")
+        self._lock = threading.Lock()
+        self.evaluated = 0
+        self.passed = 0
+        self.fired = {}
+        self.seconds = 0.0
+
+    @property
+    def enabled(self):
+        return bool(self.gates)
+
+    def evaluate(self, job):
+        """Return the first short-circuiting GateDecision, or the last passing one"""
+        decision = None
+        started = time.perf_counter()
+        for gate in self.gates:
+            gate_started = time.perf_counter()
+            action, score = gate(job)
+            decision = GateDecision(gate.name, action, score, getattr(gate, 'threshold', None),
+                                    (time.perf_counter() - gate_started) * 1000)
+            if decision.short_circuit:
+                break
+
+        with self._lock:
+            self.evaluated += 1
+            self.seconds += time.perf_counter() - started
+            if decision is not None and decision.short_circuit:
+                key = f"{decision.gate}:{decision.action}"
+                self.fired[key] = self.fired.get(key, 0) + 1
+            else:
+                self.passed += 1
+        return decision
+
+    def stats(self):
+        with self._lock:
+            skipped = sum(self.fired.values())
+            return {
+                "enabled": self.enabled,
+                "gates": [gate.name for gate in self.gates],
+                "evaluated": self.evaluated,
+                "passed": self.passed,
+                "short_circuited": skipped,
+                "skip_rate": round(skipped / self.evaluated, 4) if self.evaluated else 0.0,
+                "fired": dict(self.fired),
+                "mean_ms": round(self.seconds / self.evaluated * 1000, 3) if self.evaluated else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.evaluated = 0
+            self.passed = 0
+            self.fired = {}
+            self.seconds = 0.0
+
+
+gating = Gating()
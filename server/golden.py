@@ -0,0 +1,331 @@
+"""
+Golden-output regression harness for alternative inference paths.
+
+Runs a fixed image corpus through the reference path (decode -> transform ->
+predict(), which merges IT3 and IT2) and through one or more candidate
+engines. It compares each finding's label, score and box IoU within
+tolerances, and reports the drift next to the speedup. Reference outputs can
+be recorded once (--record) and reused as the golden file (--golden), in the
+same JSONL format batch_infer writes.
+
+Built-in engines: batched (predict_batch over stacked inputs), channels_last
+and bf16 (CPU autocast), the latter two on copies of the real models. Custom
+engines are "package.module:factory", where the factory returns an object with
+a `name` and a `__call__(list of encoded images) -> list of findings lists`.
+
+Examples:
+    # Record golden outputs for a corpus, then check a candidate against them
+    python golden.py --corpus /data/golden --record golden.jsonl
+    python golden.py --corpus /data/golden --golden golden.jsonl --engine batched --engine bf16
+
+    # No corpus at hand: synthetic films and the random-weight SSD300 models
+    python golden.py --synthetic 16 --models random --engine batched --engine channels_last
+"""
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import importlib
+import logging
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+# Default tolerances: a finding may move this much and still count as unchanged
+DEFAULT_SCORE_TOLERANCE = 0.02
+DEFAULT_IOU_THRESHOLD = 0.9
+# Findings scoring below this in both outputs are ignored (the merge keeps anything >= 0.01)
+DEFAULT_MIN_SCORE = 0.1
+
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(x2 - x1, 0.0) * max(y2 - y1, 0.0)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 1.0
+
+
+def compare_findings(reference, candidate, min_score=DEFAULT_MIN_SCORE, score_tolerance=DEFAULT_SCORE_TOLERANCE,
+                     iou_threshold=DEFAULT_IOU_THRESHOLD):
+    """Compare one image's findings (one box per label, as merged by predict())"""
+    reference = {p['label']: p for p in reference}
+    candidate = {p['label']: p for p in candidate}
+    report = {"missing": [], "extra": [], "score_deltas": [], "ious": [], "ok": True}
+    for label in sorted(set(reference) | set(candidate)):
+        ref, cand = reference.get(label), candidate.get(label)
+        ref_score = ref['score'] if ref else 0.0
+        cand_score = cand['score'] if cand else 0.0
+        if max(ref_score, cand_score) < min_score:
+            continue
+        if ref is None or cand is None:
+            # Appearing or vanishing only counts when clear of the cut-off by more than the tolerance
+            if max(ref_score, cand_score) >= min_score + score_tolerance:
+                report["extra" if ref is None else "missing"].append(label)
+            continue
+        delta = abs(ref_score - cand_score)
+        iou = box_iou(ref['boxes'], cand['boxes'])
+        report["score_deltas"].append(delta)
+        report["ious"].append(iou)
+        if delta > score_tolerance or iou < iou_threshold:
+            report["ok"] = False
+    if report["missing"] or report["extra"]:
+        report["ok"] = False
+    return report
+
+
+class ReferenceEngine:
+    """The serving path: decode, transform and predict() one image at a time"""
+
+    name = 'reference'
+
+    def __init__(self, service):
+        self.service = service
+
+    def prepare(self, data):
+        tensor = self.service.transform(self.service.open_image(data))
+        return tensor.unsqueeze(0) if self.service.torch_available else tensor
+
+    def __call__(self, images):
+        return [self.service.predict(self.prepare(data)) for data in images]
+
+
+class BatchedEngine(ReferenceEngine):
+    """Same preprocessing (also used by batch_infer), one forward per model for each stacked batch"""
+
+    name = 'batched'
+
+    def __init__(self, service, batch_size=8):
+        super().__init__(service)
+        self.batch_size = batch_size
+
+    def __call__(self, images):
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            batch = [self.prepare(data) for data in images[start:start + self.batch_size]]
+            results.extend(self.service.predict_batch(self.service.stack_batch(batch)))
+        return results
+
+
+class ConvertedModelEngine(ReferenceEngine):
+    """Runs converted copies of IT2/IT3 (the served models are left untouched)"""
+
+    def __init__(self, service, convert_model=None, convert_input=None, context=contextlib.nullcontext):
+        super().__init__(service)
+        model_it2, model_it3 = service.get_model()
+        if getattr(model_it2, 'is_mock', False) or not service.torch_available:
+            raise RuntimeError(f"The {self.name} engine needs the real (or random) PyTorch models")
+        convert_model = convert_model or (lambda model: model)
+        self.model_it2 = convert_model(copy.deepcopy(model_it2))
+        self.model_it3 = convert_model(copy.deepcopy(model_it3))
+        self.convert_input = convert_input or (lambda tensor: tensor)
+        self.context = context
+
+    def __call__(self, images):
+        results = []
+        for data in images:
+            tensor = self.convert_input(self.prepare(data))
+            with self.service.torch_no_grad(), self.context():
+                raw_it3 = self.model_it3(tensor)
+                raw_it2 = self.model_it2(tensor)
+            # Reduced-precision outputs are widened again; integer labels stay as they are
+            raw_it3 = [{k: v.float() if v.is_floating_point() else v for k, v in out.items()} for out in raw_it3]
+            raw_it2 = [{k: v.float() if v.is_floating_point() else v for k, v in out.items()} for out in raw_it2]
+            results.append(self.service.format_predictions(raw_it2, raw_it3))
+        return results
+
+
+class ChannelsLastEngine(ConvertedModelEngine):
+    """NHWC memory layout for the convolutions"""
+
+    name = 'channels_last'
+
+    def __init__(self, service):
+        import torch
+        super().__init__(service, convert_model=lambda model: model.to(memory_format=torch.channels_last),
+                         convert_input=lambda tensor: tensor.contiguous(memory_format=torch.channels_last))
+
+
+class Bf16Engine(ConvertedModelEngine):
+    """bfloat16 autocast on CPU"""
+
+    name = 'bf16'
+
+    def __init__(self, service):
+        import torch
+        super().__init__(service, context=lambda: torch.autocast('cpu', dtype=torch.bfloat16))
+
+
+BUILTIN_ENGINES = {
+    'reference': ReferenceEngine,
+    'batched': BatchedEngine,
+    'channels_last': ChannelsLastEngine,
+    'bf16': Bf16Engine,
+}
+
+
+def load_engine(spec, service):
+    """Instantiate an engine by built-in name or "package.module:factory" path"""
+    if spec in BUILTIN_ENGINES:
+        return BUILTIN_ENGINES[spec](service)
+    module_name, _, attribute = spec.partition(':')
+    if not attribute:
+        raise ValueError(f"Unknown engine '{spec}'")
+    engine = getattr(importlib.import_module(module_name), attribute)()
+    if not getattr(engine, 'name', None):
+        engine.name = spec
+    return engine
+
+
+def timed_run(engine, images, repeat):
+    """Findings of the first run and the best wall time over `repeat` runs (after one warm-up image)"""
+    engine(images[:1])
+    best = None
+    findings = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        findings = engine(images)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return findings, best
+
+
+def summarize(names, reference, candidate, args):
+    reports = [compare_findings(reference[name], candidate[name], args.min_score, args.score_tolerance,
+                                args.iou_threshold) for name in names]
+    deltas = [d for r in reports for d in r["score_deltas"]]
+    ious = [i for r in reports for i in r["ious"]]
+    return {
+        "images": len(reports),
+        "images_changed": sum(1 for r in reports if not r["ok"]),
+        "missing": sum(len(r["missing"]) for r in reports),
+        "extra": sum(len(r["extra"]) for r in reports),
+        "max_score_delta": round(max(deltas), 5) if deltas else 0.0,
+        "mean_score_delta": round(sum(deltas) / len(deltas), 5) if deltas else 0.0,
+        "min_iou": round(min(ious), 4) if ious else 1.0,
+        "mean_iou": round(sum(ious) / len(ious), 4) if ious else 1.0,
+        "changed": {name: {"missing": r["missing"], "extra": r["extra"]}
+                    for name, r in zip(names, reports) if not r["ok"]},
+    }
+
+
+def load_corpus(args):
+    """(name, encoded bytes) pairs from --corpus or synthetic films"""
+    try:
+        from batch_infer import find_images, DEFAULT_EXTENSIONS
+        from load_test import make_synthetic_film
+    except ImportError:
+        from server.batch_infer import find_images, DEFAULT_EXTENSIONS
+        from server.load_test import make_synthetic_film
+    if args.corpus:
+        extensions = {e.strip().lower() for e in DEFAULT_EXTENSIONS.split(',')}
+        corpus = []
+        for path in find_images(args.corpus, extensions):
+            with open(os.path.join(args.corpus, path), 'rb') as f:
+                corpus.append((path, f.read()))
+        return corpus
+    return [(f"synthetic-{i:03d}.png", make_synthetic_film(args.synthetic_size, seed=i)) for i in range(args.synthetic)]
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--corpus', help='Directory of golden images')
+    source.add_argument('--synthetic', type=int, help='Use this many generated films instead of a corpus')
+    parser.add_argument('--synthetic-size', type=int, default=1024)
+    parser.add_argument('--golden', help='Compare against recorded reference outputs instead of re-running them')
+    parser.add_argument('--record', help='Write the reference outputs to this JSONL file')
+    parser.add_argument('--engine', action='append', default=[], help='Candidate engine (repeatable)')
+    parser.add_argument('--models', choices=['auto', 'mock', 'random', 'real'], default='auto')
+    parser.add_argument('--score-tolerance', type=float, default=DEFAULT_SCORE_TOLERANCE)
+    parser.add_argument('--iou-threshold', type=float, default=DEFAULT_IOU_THRESHOLD)
+    parser.add_argument('--min-score', type=float, default=DEFAULT_MIN_SCORE)
+    parser.add_argument('--max-changed', type=int, default=0, help='Changed images allowed before failing')
+    parser.add_argument('--repeat', type=int, default=1, help='Timed runs per engine (best is reported)')
+    parser.add_argument('--json-out', help='Write the full report as JSON to this path')
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    args = build_arg_parser().parse_args(argv)
+
+    try:
+        from batch_infer import configure_models
+    except ImportError:
+        from server.batch_infer import configure_models
+    configure_models(args.models)
+    try:
+        import model_service as service
+    except ImportError:
+        from server import model_service as service
+    service.get_model()
+
+    corpus = load_corpus(args)
+    if not corpus:
+        print("The corpus is empty", file=sys.stderr)
+        return 2
+    names = [name for name, _ in corpus]
+    images = [data for _, data in corpus]
+
+    reference_engine = ReferenceEngine(service)
+    reference_findings, reference_seconds = timed_run(reference_engine, images, args.repeat)
+    reference = dict(zip(names, reference_findings))
+    if args.record:
+        with open(args.record, 'w') as f:
+            for name, data in corpus:
+                f.write(json.dumps({"path": name, "sha256": service.digest_upload(data),
+                                    "predictions": reference[name]}) + '\n')
+        print(f"Recorded {len(corpus)} reference outputs to {args.record}", file=sys.stderr)
+
+    report = {"images": len(corpus), "reference_seconds": round(reference_seconds, 3), "engines": {}}
+    if args.golden:
+        with open(args.golden) as f:
+            golden = {record['path']: record['predictions'] for record in map(json.loads, f)}
+        unknown = [name for name in names if name not in golden]
+        if unknown:
+            print(f"{len(unknown)} corpus images have no golden output (e.g. {unknown[0]})", file=sys.stderr)
+            return 2
+        # The current reference path is itself checked against the recorded outputs
+        report["engines"]["reference"] = {**summarize(names, golden, reference, args),
+                                          "seconds": round(reference_seconds, 3), "speedup": 1.0}
+        reference = golden
+
+    for spec in args.engine:
+        try:
+            engine = load_engine(spec, service)
+        except Exception as e:
+            print(f"Engine '{spec}' skipped: {str(e)}", file=sys.stderr)
+            report["engines"][spec] = {"skipped": str(e)}
+            continue
+        findings, seconds = timed_run(engine, images, args.repeat)
+        report["engines"][engine.name] = {
+            **summarize(names, reference, dict(zip(names, findings)), args),
+            "seconds": round(seconds, 3),
+            "speedup": round(reference_seconds / seconds, 3) if seconds else None,
+        }
+
+    print(f"{len(corpus)} images, reference path {reference_seconds:.2f}s "
+          f"({len(corpus) / reference_seconds:.1f} images/s)")
+    header = f"{'engine':<16}{'changed':>9}{'missing':>9}{'extra':>7}{'max dS':>9}{'min IoU':>9}{'speedup':>9}"
+    print(header)
+    print('-' * len(header))
+    failed = False
+    for name, row in report["engines"].items():
+        if "skipped" in row:
+            print(f"{name:<16}  skipped: {row['skipped']}")
+            continue
+        failed = failed or row["images_changed"] > args.max_changed
+        print(f"{name:<16}{row['images_changed']:>9}{row['missing']:>9}{row['extra']:>7}"
+              f"{row['max_score_delta']:>9.4f}{row['min_iou']:>9.3f}{row['speedup']:>8.2f}x")
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
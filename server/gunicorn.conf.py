@@ -0,0 +1,104 @@
+# Production entrypoint: gunicorn -c gunicorn.conf.py app:app  (run from the server directory)
+#
+# The app is imported once in the master (preload_app), which loads IT2/IT3
+# before any worker exists. Workers are forked from that master, so the model
+# weights are shared copy-on-write instead of each worker holding its own copy.
+import gc
+import os
+import sys
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '60'))
+keepalive = 5
+
+# Load the models in the master and fork workers from it
+preload_app = True
+
+# Optional request-count recycling (0 disables); memory-based recycling is below
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+
+# Heartbeat files on tmpfs so a slow disk cannot make workers look hung
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = None  # the app logs one structured record per request
+errorlog = '-'
+
+# Recycle a worker once its private memory crosses this many MB (0 disables)
+WORKER_MAX_MEMORY_MB = float(os.getenv('WORKER_MAX_MEMORY_MB', '0'))
+# uss = memory unique to the worker (excludes pages still shared with the master); rss = resident total
+WORKER_MEMORY_METRIC = os.getenv('WORKER_MEMORY_METRIC', 'uss').lower()
+# Reading USS walks /proc/<pid>/smaps, so only sample every N requests
+WORKER_MEMORY_CHECK_EVERY = int(os.getenv('WORKER_MEMORY_CHECK_EVERY', '10'))
+# Intra-op threads per worker; defaults to an even split of the cores
+TORCH_THREADS_PER_WORKER = int(os.getenv('TORCH_THREADS_PER_WORKER', str(max(1, (os.cpu_count() or 1) // max(workers, 1)))))
+
+# Keep the cyclic GC from writing to the headers of every object created while
+# the models load; re-enabled in each worker after gc.freeze() (see pre_fork).
+gc.disable()
+
+
+def _model_service():
+    return sys.modules.get('model_service') or sys.modules.get('server.model_service')
+
+
+def when_ready(server):
+    service = _model_service()
+    if service is not None:
+        model_it2, model_it3 = service.get_model()
+        server.log.info(f"Models preloaded in master (IT2: {type(model_it2).__name__}, IT3: {type(model_it3).__name__})")
+    if psutil is not None:
+        server.log.info(f"Master RSS after preload: {psutil.Process().memory_info().rss / 1024 / 1024:.1f} MB")
+
+
+def pre_fork(server, worker):
+    # Move every object allocated so far into the permanent generation: the GC
+    # in the children never traverses them, so their pages stay shared.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    worker.requests_since_check = 0
+
+    service = _model_service()
+    if service is not None and service.torch_available:
+        import torch
+        # One large intra-op pool per worker would oversubscribe the cores
+        torch.set_num_threads(TORCH_THREADS_PER_WORKER)
+    server.log.info(f"Worker {worker.pid} forked (torch threads: {TORCH_THREADS_PER_WORKER})")
+
+
+def _worker_memory_mb():
+    process = psutil.Process()
+    if WORKER_MEMORY_METRIC == 'uss':
+        return process.memory_full_info().uss / 1024 / 1024
+    return process.memory_info().rss / 1024 / 1024
+
+
+def post_request(worker, req, environ, resp):
+    if not WORKER_MAX_MEMORY_MB or psutil is None:
+        return
+    worker.requests_since_check = getattr(worker, 'requests_since_check', 0) + 1
+    if worker.requests_since_check < WORKER_MEMORY_CHECK_EVERY:
+        return
+    worker.requests_since_check = 0
+
+    used_mb = _worker_memory_mb()
+    if used_mb > WORKER_MAX_MEMORY_MB:
+        worker.log.warning(
+            f"Worker {worker.pid} {WORKER_MEMORY_METRIC.upper()} {used_mb:.1f} MB exceeds "
+            f"{WORKER_MAX_MEMORY_MB:.0f} MB; recycling after in-flight requests finish"
+        )
+        # Graceful: the worker stops accepting, drains, exits, and the master forks a fresh one
+        worker.alive = False
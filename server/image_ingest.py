@@ -0,0 +1,105 @@
+import os
+import io
+import hashlib
+import logging
+import tempfile
+
+from PIL import Image, UnidentifiedImageError
+
+try:
+    from dicom_ingest import DicomError, is_dicom, read_dicom
+except ImportError:
+    from server.dicom_ingest import DicomError, is_dicom, read_dicom
+
+logger = logging.getLogger(__name__)
+
+# Ingestion limits (environment driven)
+MAX_UPLOAD_MB = float(os.getenv('MAX_UPLOAD_MB', '64'))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+# Uploads larger than this are spooled to a temporary file instead of memory
+UPLOAD_SPOOL_BYTES = int(float(os.getenv('UPLOAD_SPOOL_MB', '4')) * 1024 * 1024)
+# Largest decoded image accepted (width * height); a 4k x 5k film is 20M pixels
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', str(60_000_000)))
+# Longest side of the image kept for display/annotation; 0 keeps full resolution
+DISPLAY_MAX_SIDE = int(os.getenv('DISPLAY_MAX_SIDE', '2048'))
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# Make PIL's own decompression-bomb guard agree with our limit
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class IngestError(Exception):
+    """An upload that was rejected before or during decoding"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def spooled_upload():
+    """Buffer that keeps small uploads in memory and moves large ones to disk"""
+    return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+
+
+def digest_upload(source):
+    """SHA-256 of an encoded upload (bytes or seekable file), leaving file objects rewound"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    position = source.tell()
+    for chunk in iter(lambda: source.read(COPY_CHUNK_BYTES), b''):
+        digest.update(chunk)
+    source.seek(position)
+    return digest.hexdigest()
+
+
+def check_pixel_limit(size):
+    width, height = size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise IngestError(
+            f"Image is {width}x{height} ({width * height} pixels); the limit is {MAX_IMAGE_PIXELS} pixels", 413
+        )
+
+
+def open_image(source, max_side=DISPLAY_MAX_SIDE):
+    """Decode an upload into an RGB image no larger than max_side, refusing oversized pixel counts"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    header = source.read(132)
+    source.seek(0)
+    if is_dicom(header):
+        try:
+            image = read_dicom(source, max_side=max_side, check_size=check_pixel_limit)
+        except DicomError as e:
+            raise IngestError(str(e), e.status_code)
+    else:
+        try:
+            image = Image.open(source)
+        except Image.DecompressionBombError as e:
+            raise IngestError(str(e), 413)
+        except UnidentifiedImageError:
+            raise IngestError("Uploaded file is not a supported image", 400)
+
+        # Only the header has been read so far; refuse before allocating pixels
+        check_pixel_limit(image.size)
+
+    try:
+        if max_side and max(image.size) > max_side:
+            # thumbnail() uses draft() so JPEGs decode directly at reduced scale, then resizes in place
+            original_size = image.size
+            image.thumbnail((max_side, max_side), Image.BICUBIC, reducing_gap=2.0)
+            logger.debug(f"Downscaled upload from {original_size} to {image.size} on decode")
+
+        # Convert to RGB if needed (after downscaling, so the copy is small)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        else:
+            image.load()
+    except Image.DecompressionBombError as e:
+        raise IngestError(str(e), 413)
+    except OSError as e:
+        raise IngestError(f"Could not decode image: {str(e)}", 400)
+
+    return image
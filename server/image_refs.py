@@ -0,0 +1,131 @@
+import os
+import json
+import mmap
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, unquote
+
+try:
+    from image_ingest import IngestError, MAX_UPLOAD_BYTES
+except ImportError:
+    from server.image_ingest import IngestError, MAX_UPLOAD_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Directories whose images may be submitted by path instead of uploaded (os.pathsep or comma separated).
+# Empty disables by-reference requests.
+ALLOWED_IMAGE_ROOTS = [
+    os.path.realpath(root.strip()) for root in
+    os.getenv('ALLOWED_IMAGE_ROOTS', '').replace(',', os.pathsep).split(os.pathsep) if root.strip()
+]
+# Responses kept per process for unchanged files (0 disables the cache)
+REFERENCE_CACHE_ENTRIES = int(os.getenv('REFERENCE_CACHE_ENTRIES', '128'))
+# Memory for those responses; inline delivery puts two base64 PNGs of a few MB each in every one
+REFERENCE_CACHE_MB = float(os.getenv('REFERENCE_CACHE_MB', '64'))
+
+
+def resolve_image_path(reference, roots=None):
+    """Real path and stat of a by-reference image: a path or file:// URI inside an allowed root"""
+    roots = ALLOWED_IMAGE_ROOTS if roots is None else roots
+    if not roots:
+        raise IngestError("By-reference images are not enabled on this server (set ALLOWED_IMAGE_ROOTS)", 400)
+    if reference.startswith('file:'):
+        parsed = urlparse(reference)
+        if parsed.netloc not in ('', 'localhost'):
+            raise IngestError("Only local file:// URIs are supported", 400)
+        reference = unquote(parsed.path)
+    elif '://' in reference:
+        raise IngestError("Only paths and file:// URIs are supported", 400)
+
+    # Relative paths are taken from the first root; symlinks may not lead outside the roots
+    path = os.path.realpath(os.path.join(roots[0], reference))
+    if not any(os.path.commonpath([path, root]) == root for root in roots):
+        logger.warning(f"Refused image reference outside the allowed roots: {reference}")
+        raise IngestError("Image path is outside the allowed roots", 403)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise IngestError("Image not found", 404)
+    if not os.path.isfile(path):
+        raise IngestError("Image path is not a file", 400)
+    if stat.st_size == 0:
+        raise IngestError("Image file is empty", 400)
+    if stat.st_size > MAX_UPLOAD_BYTES:
+        raise IngestError(f"Image file exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit", 413)
+    return path, stat
+
+
+def map_image(path):
+    """Read-only memory map of an image file; it behaves like a binary file for the decoders"""
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def result_nbytes(result):
+    """Approximate size of a response: its strings (data URLs, links) plus the serialized predictions"""
+    size = 0
+    for value in result.values():
+        size += len(value) if isinstance(value, str) else len(json.dumps(value, default=str))
+    return size
+
+
+def file_identity(path, stat):
+    """Cache identity of a file: any rewrite changes its mtime or size"""
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+class ReferenceCache:
+    """LRU of prediction responses keyed by file identity and request options, bounded by count and bytes"""
+
+    def __init__(self, max_entries=REFERENCE_CACHE_ENTRIES, max_mb=REFERENCE_CACHE_MB):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries = OrderedDict()  # key -> (result, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result):
+        if self.max_entries <= 0 or self.max_bytes <= 0:
+            return
+        size = result_nbytes(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "roots": ALLOWED_IMAGE_ROOTS,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+reference_cache = ReferenceCache()
@@ -0,0 +1,422 @@
+"""
+Concurrent load generator for the CXRaide prediction API.
+
+Drives /api/predict (logging in through /login first to obtain tokens) with a
+configurable number of concurrent clients, an optional open-loop arrival rate
+and a weighted mix of image sizes, then reports throughput, latency
+percentiles, error rate and 503 rate.
+
+Examples:
+    # Start a local mock-model server and hammer it with 8 clients for 30s
+    python load_test.py --spawn --models mock --concurrency 8 --duration 30
+
+    # Open-loop: 5 requests/second against an already running server
+    python load_test.py --url http://localhost:5000 --rate 5 --requests 200 \
+        --sizes 512:3,1024:2,2048:1
+"""
+import argparse
+import http.client
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from PIL import Image
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_size_mix(spec):
+    """Parse '512:3,1024:1' into [(512, 3.0), (1024, 1.0)]"""
+    mix = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        size, _, weight = part.partition(':')
+        mix.append((int(size), float(weight or 1)))
+    if not mix:
+        raise ValueError("Image size mix is empty")
+    return mix
+
+
+def make_synthetic_film(size, seed=0):
+    """Render a grayscale PNG that loosely resembles a chest film"""
+    rng = random.Random(seed)
+    width = size
+    height = int(size * rng.uniform(1.0, 1.25))
+
+    # Radial falloff for the thorax plus film grain
+    body = Image.radial_gradient('L').resize((width, height))
+    body = Image.eval(body, lambda v: 255 - v)
+    grain = Image.effect_noise((width, height), 24)
+    film = Image.blend(body, grain, 0.25)
+
+    buffered = io.BytesIO()
+    film.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def load_image_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def encode_multipart(fields, files):
+    """Encode form fields and files as multipart/form-data"""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f"--{boundary}\r\n".encode())
+        body.write(f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode())
+        body.write(str(value).encode() + b"\r\n")
+    for name, (filename, data, content_type) in files.items():
+        body.write(f"--{boundary}\r\n".encode())
+        body.write(
+            f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode()
+        )
+        body.write(data + b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(math.ceil(pct / 100.0 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+class ApiClient:
+    """Keep-alive HTTP client with one connection per worker thread"""
+
+    def __init__(self, base_url, timeout):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.https = parsed.scheme == 'https'
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn_cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = conn_cls(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request and return (status, body_bytes), reconnecting once on a stale socket"""
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self._reset()
+                return response.status, data
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self._reset()
+                if attempt == 1:
+                    raise
+            except Exception:
+                self._reset()
+                raise
+
+    def get_json(self, path):
+        status, data = self.request('GET', path)
+        return status, json.loads(data or b'{}')
+
+    def login(self, username):
+        body = json.dumps({'username': username}).encode()
+        status, data = self.request('POST', '/login', body=body, headers={'Content-Type': 'application/json'})
+        if status != 200:
+            raise RuntimeError(f"Login failed for {username}: HTTP {status}")
+        return json.loads(data)['token']
+
+
+def spawn_server(port, models):
+    """Start a local Flask server configured for the requested model mode"""
+    env = dict(os.environ)
+    env['PORT'] = str(port)
+    env['ALLOW_DEV_LOGIN'] = 'true'
+    env['USE_MOCK_MODELS'] = 'true' if models == 'mock' else 'false'
+    env['USE_RANDOM_MODELS'] = 'true' if models == 'random' else 'false'
+    command = [
+        sys.executable, '-m', 'flask', '--app', 'app', 'run',
+        '--host', '127.0.0.1', '--port', str(port),
+        '--with-threads', '--no-reload', '--no-debugger',
+    ]
+    print(f"Starting server ({models} models): {' '.join(command)}")
+    return subprocess.Popen(command, cwd=SERVER_DIR, env=env)
+
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(client, timeout):
+    """Poll /api/model-status until both models report ready (or were unloaded while idle)"""
+    deadline = time.time() + timeout
+    last_error = None
+    while time.time() < deadline:
+        try:
+            status, body = client.get_json('/api/model-status')
+            # Idle-unloaded models reload on the first prediction, as /api/ready reflects
+            if status == 200 and body.get('status') in ('ready', 'unloaded'):
+                return body
+            last_error = f"status={body.get('status')}"
+        except Exception as e:
+            last_error = str(e)
+        time.sleep(0.5)
+    raise RuntimeError(f"Server did not become ready within {timeout}s ({last_error})")
+
+
+class LoadTest:
+    """Run one load test and collect per-request samples"""
+
+    def __init__(self, client, images, tokens, args):
+        self.client = client
+        self.images = images  # list of (label, bytes, weight)
+        self.tokens = tokens
+        self.args = args
+        self.samples = []
+        self.samples_lock = threading.Lock()
+        self.rng = random.Random(args.seed)
+        self.rng_lock = threading.Lock()
+        self.counter = 0
+
+    def _pick(self):
+        with self.rng_lock:
+            label, data, _ = self.rng.choices(self.images, weights=[w for _, _, w in self.images])[0]
+            token = self.tokens[self.counter % len(self.tokens)]
+            self.counter += 1
+        return label, data, token
+
+    def _send(self, scheduled_at):
+        """Send one prediction request; latency is measured from its scheduled start"""
+        label, data, token = self._pick()
+        fields = {'model_type': self.args.model_type}
+        body, content_type = encode_multipart(fields, {'image': (f"{label}.png", data, 'image/png')})
+        headers = {'Content-Type': content_type, 'Authorization': f"Bearer {token}"}
+
+        status, error = None, None
+        try:
+            status, _ = self.client.request('POST', self.args.endpoint, body=body, headers=headers)
+        except Exception as e:
+            error = type(e).__name__
+        finished = time.perf_counter()
+
+        with self.samples_lock:
+            self.samples.append({
+                'size': label,
+                'status': status,
+                'error': error,
+                'latency': finished - scheduled_at,
+                'finished': finished,
+            })
+
+    def run_closed_loop(self):
+        """Each worker sends its next request as soon as the previous one completes"""
+        stop_at = time.perf_counter() + self.args.duration if self.args.duration else None
+        remaining = [self.args.requests]
+        remaining_lock = threading.Lock()
+
+        def worker():
+            while True:
+                if stop_at is not None and time.perf_counter() >= stop_at:
+                    return
+                if self.args.requests:
+                    with remaining_lock:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                self._send(time.perf_counter())
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.args.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def run_open_loop(self):
+        """Poisson arrivals at a fixed rate, capped at `concurrency` requests in flight"""
+        start = time.perf_counter()
+        stop_at = start + self.args.duration if self.args.duration else None
+        next_arrival = start
+        sent = 0
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as executor:
+            while True:
+                if self.args.requests and sent >= self.args.requests:
+                    break
+                if stop_at is not None and next_arrival >= stop_at:
+                    break
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._send, next_arrival)
+                sent += 1
+                next_arrival += self.rng.expovariate(self.args.rate)
+
+    def run(self):
+        started = time.perf_counter()
+        if self.args.rate:
+            self.run_open_loop()
+        else:
+            self.run_closed_loop()
+        return time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    """Aggregate samples into throughput, latency percentiles and error rates"""
+    def block(rows):
+        latencies = sorted(r['latency'] for r in rows)
+        total = len(rows)
+        ok = sum(1 for r in rows if r['status'] == 200)
+        unavailable = sum(1 for r in rows if r['status'] == 503)
+        errors = total - ok
+        return {
+            'requests': total,
+            'ok': ok,
+            'throughput_rps': ok / elapsed if elapsed else 0.0,
+            'error_rate': errors / total if total else 0.0,
+            'rate_503': unavailable / total if total else 0.0,
+            'p50_ms': _ms(percentile(latencies, 50)),
+            'p95_ms': _ms(percentile(latencies, 95)),
+            'p99_ms': _ms(percentile(latencies, 99)),
+            'max_ms': _ms(latencies[-1] if latencies else None),
+        }
+
+    by_size = {}
+    for row in samples:
+        by_size.setdefault(row['size'], []).append(row)
+
+    status_counts = {}
+    for row in samples:
+        key = str(row['status']) if row['status'] is not None else (row['error'] or 'error')
+        status_counts[key] = status_counts.get(key, 0) + 1
+
+    return {
+        'elapsed_s': elapsed,
+        'overall': block(samples),
+        'by_size': {size: block(rows) for size, rows in sorted(by_size.items())},
+        'status_counts': status_counts,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000.0
+
+
+def print_report(report, args):
+    def fmt(value):
+        return '-' if value is None else f"{value:.1f}"
+
+    print()
+    print(f"Load test: concurrency={args.concurrency} "
+          f"{'rate=%.2f/s' % args.rate if args.rate else 'closed-loop'} "
+          f"elapsed={report['elapsed_s']:.1f}s")
+    header = f"{'size':>10} {'reqs':>7} {'ok':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err %':>7} {'503 %':>7}"
+    print(header)
+    print('-' * len(header))
+    rows = list(report['by_size'].items()) + [('overall', report['overall'])]
+    for name, stats in rows:
+        print(f"{name:>10} {stats['requests']:>7} {stats['ok']:>7} {stats['throughput_rps']:>8.2f} "
+              f"{fmt(stats['p50_ms']):>9} {fmt(stats['p95_ms']):>9} {fmt(stats['p99_ms']):>9} "
+              f"{stats['error_rate'] * 100:>7.1f} {stats['rate_503'] * 100:>7.1f}")
+    print(f"Status counts: {report['status_counts']}")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the CXRaide prediction API")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Base URL of a running server')
+    parser.add_argument('--spawn', action='store_true', help='Start a local server for the duration of the test')
+    parser.add_argument('--models', choices=['mock', 'real', 'random'], default='mock',
+                        help='Model mode for a spawned server (random = untrained SSD300 weights)')
+    parser.add_argument('--port', type=int, default=0, help='Port for a spawned server (default: any free port)')
+    parser.add_argument('--endpoint', default='/api/predict')
+    parser.add_argument('--model-type', default='combined')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum requests in flight')
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help='Open-loop arrival rate in requests/second (default: closed loop)')
+    parser.add_argument('--duration', type=float, default=0.0, help='Test duration in seconds')
+    parser.add_argument('--requests', type=int, default=0, help='Total number of requests to send')
+    parser.add_argument('--sizes', default='512:1,1024:1,2048:1',
+                        help='Weighted image size mix as size:weight pairs')
+    parser.add_argument('--images', nargs='*', default=[], help='Use these image files instead of synthetic films')
+    parser.add_argument('--users', type=int, default=0, help='Distinct logins to spread requests over (default: concurrency)')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Per-request timeout in seconds')
+    parser.add_argument('--ready-timeout', type=float, default=300.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json-out', help='Write the full report as JSON to this path')
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if not args.duration and not args.requests:
+        args.duration = 30.0
+
+    server = None
+    base_url = args.url
+    if args.spawn:
+        port = args.port or find_free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = spawn_server(port, args.models)
+
+    try:
+        client = ApiClient(base_url, args.timeout)
+        status = wait_until_ready(client, args.ready_timeout)
+        print(f"Server ready at {base_url} (mock models: {status.get('using_mock_models')})")
+
+        if args.images:
+            images = [(os.path.basename(p), load_image_file(p), 1.0) for p in args.images]
+        else:
+            images = [(str(size), make_synthetic_film(size, seed=size), weight)
+                      for size, weight in parse_size_mix(args.sizes)]
+
+        users = args.users or args.concurrency
+        tokens = [client.login(f"loadtest-{i}") for i in range(users)]
+
+        test = LoadTest(client, images, tokens, args)
+        elapsed = test.run()
+        report = summarize(test.samples, elapsed)
+        print_report(report, args)
+
+        if args.json_out:
+            with open(args.json_out, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Report written to {args.json_out}")
+        return 0
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
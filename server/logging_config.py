@@ -0,0 +1,179 @@
+import os
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+# Logging configuration (environment driven, like the rest of the server)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()  # json | text
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_SAMPLE_DEFAULT = float(os.getenv('LOG_SAMPLE_DEFAULT', '1.0'))
+# Comma-separated "path=rate" pairs, e.g. "/check-session=0.05,/api/model-status=0.01"
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '/check-session=0.1,/api/model-status=0.05,/api/loading-status=0.05')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None)).keys()) | {'message', 'asctime'}
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as one JSON object per line, including `extra=` fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # The base class bakes the traceback into msg; keep msg plain and the traceback in exc_text
+        # instead, so the listener-side formatter renders it exactly once
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # Tracebacks hold frames that cannot cross the queue safely
+        record.exc_info = None
+        return record
+
+
+class RouteSampler:
+    """Per-route sampling decisions for request logging"""
+
+    def __init__(self, rates=None, default_rate=1.0):
+        self.rates = rates or {}
+        self.default_rate = default_rate
+
+    @classmethod
+    def from_spec(cls, spec, default_rate=1.0):
+        rates = {}
+        for part in (spec or '').split(','):
+            path, sep, rate = part.strip().partition('=')
+            if sep and path:
+                rates[path] = float(rate)
+        return cls(rates, default_rate)
+
+    def rate_for(self, path):
+        return self.rates.get(path, self.default_rate)
+
+    def sample(self, path):
+        rate = self.rate_for(path)
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+class SampledRequestFilter(logging.Filter):
+    """Drop INFO/DEBUG records emitted while handling a request that was not sampled"""
+
+    def __init__(self, is_sampled):
+        super().__init__()
+        self.is_sampled = is_sampled
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        try:
+            return self.is_sampled()
+        except Exception:
+            return True
+
+
+def configure_logging(is_sampled=None):
+    """Route all logging through a bounded queue drained by a background listener thread"""
+    global _listener, _queue_handler
+
+    if _listener is not None:
+        return _queue_handler
+
+    stream_handler = logging.StreamHandler()
+    if LOG_FORMAT == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    if is_sampled is not None:
+        _queue_handler.addFilter(SampledRequestFilter(is_sampled))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_after_fork)
+    return _queue_handler
+
+
+def _restart_after_fork():
+    """Give a forked worker its own queue and listener; the parent's thread does not survive fork()"""
+    global _listener
+    if _listener is None:
+        return
+    handlers = _listener.handlers
+    # The inherited queue's lock may have been held by another thread at fork time
+    _queue_handler.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler.dropped = 0
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logging_stats():
+    if _queue_handler is None:
+        return {"mode": "synchronous"}
+    return {
+        "mode": "queue",
+        "format": LOG_FORMAT,
+        "queue_depth": _queue_handler.queue.qsize(),
+        "queue_capacity": LOG_QUEUE_SIZE,
+        "dropped": _queue_handler.dropped,
+    }
+
+
+route_sampler = RouteSampler.from_spec(LOG_SAMPLE_RATES, LOG_SAMPLE_DEFAULT)
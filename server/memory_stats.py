@@ -0,0 +1,207 @@
+import os
+import time
+import logging
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Memory instrumentation configuration (off by default: tracemalloc slows allocation-heavy code)
+MEMORY_PROFILING = os.getenv('MEMORY_PROFILING', 'false').lower() == 'true'
+MEMORY_TRACE_FRAMES = int(os.getenv('MEMORY_TRACE_FRAMES', '1'))
+# Number of recent requests whose post-request RSS is kept for leak detection
+MEMORY_LEAK_WINDOW = int(os.getenv('MEMORY_LEAK_WINDOW', '60'))
+# Minimum sustained RSS growth across the window before a leak is flagged
+MEMORY_LEAK_MIN_GROWTH_MB = float(os.getenv('MEMORY_LEAK_MIN_GROWTH_MB', '20'))
+# Requests ignored by leak detection while caches, allocator pools and lazy imports warm up
+MEMORY_LEAK_WARMUP = int(os.getenv('MEMORY_LEAK_WARMUP', '10'))
+
+MB = 1024 * 1024
+
+
+class MemoryStats:
+    """Per-stage allocation peaks, RSS deltas and request-to-request RSS growth.
+
+    tracemalloc only sees Python-level allocations (PIL buffers, numpy arrays,
+    response strings); PyTorch's allocator is covered by the RSS deltas. Both
+    counters are process-wide, so with concurrent requests a stage's figures
+    include whatever other threads allocated meanwhile and are upper bounds.
+    The tracemalloc peak is only reset while no other stage is being measured,
+    so one stage never erases the high-water mark of another that is running.
+    """
+
+    def __init__(self, enabled=MEMORY_PROFILING, frames=MEMORY_TRACE_FRAMES, window=MEMORY_LEAK_WINDOW):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._active_stages = 0
+        self._rss_history = deque(maxlen=window)
+        self._requests = 0
+        self._baseline = None
+        self._process = psutil.Process(os.getpid()) if psutil else None
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.info(f"Memory profiling enabled (tracemalloc, {frames} frame(s))")
+
+    def _rss(self):
+        if self._process is None:
+            return 0
+        if self._process.pid != os.getpid():
+            # Forked worker (preloaded app): measure this process, not the master
+            self._process = psutil.Process(os.getpid())
+        return self._process.memory_info().rss
+
+    @contextmanager
+    def stage(self, name):
+        """Measure allocation peak, net allocation and RSS delta of a block"""
+        if not self.enabled:
+            yield
+            return
+
+        with self._lock:
+            # A reset while another stage runs would lose that stage's peak; without one, the peak
+            # since the last reset is still at least this stage's own
+            if not self._active_stages:
+                tracemalloc.reset_peak()
+            self._active_stages += 1
+            start_current, _ = tracemalloc.get_traced_memory()
+        rss_before = self._rss()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            with self._lock:
+                self._active_stages -= 1
+            self._record_stage(
+                name,
+                peak=max(peak - start_current, 0),
+                net=current - start_current,
+                rss_delta=self._rss() - rss_before,
+                seconds=time.perf_counter() - started,
+            )
+
+    def _record_stage(self, name, peak, net, rss_delta, seconds):
+        with self._lock:
+            entry = self._stages.setdefault(name, {
+                "count": 0, "peak_total": 0, "peak_max": 0, "net_total": 0,
+                "rss_delta_total": 0, "rss_delta_max": 0, "seconds_total": 0.0,
+            })
+            entry["count"] += 1
+            entry["peak_total"] += peak
+            entry["peak_max"] = max(entry["peak_max"], peak)
+            entry["net_total"] += net
+            entry["rss_delta_total"] += rss_delta
+            entry["rss_delta_max"] = max(entry["rss_delta_max"], rss_delta)
+            entry["seconds_total"] += seconds
+
+    def record_request(self):
+        """Sample RSS after a request; the first post-warm-up request takes the tracemalloc baseline"""
+        if not self.enabled:
+            return
+        rss = self._rss()
+        with self._lock:
+            self._requests += 1
+            warmed_up = self._requests > MEMORY_LEAK_WARMUP
+            if warmed_up:
+                self._rss_history.append(rss)
+            take_baseline = warmed_up and self._baseline is None
+        if take_baseline:
+            # Taken after warm-up so lazily-initialised state is not reported as growth
+            self._baseline = tracemalloc.take_snapshot()
+
+    def leak_report(self):
+        """Flag RSS that keeps rising across the window, ignoring transient peaks.
+
+        The window is split into thirds and each third is reduced to its minimum;
+        a leak is suspected when the minima rise monotonically by more than
+        MEMORY_LEAK_MIN_GROWTH_MB in total.
+        """
+        with self._lock:
+            history = list(self._rss_history)
+        if len(history) < 9:
+            return {"suspected": False, "reason": "not enough samples", "samples": len(history)}
+
+        third = len(history) // 3
+        floors = [min(history[:third]), min(history[third:2 * third]), min(history[2 * third:])]
+        growth_mb = (floors[2] - floors[0]) / MB
+        monotonic = floors[0] < floors[1] < floors[2]
+        return {
+            "suspected": monotonic and growth_mb >= MEMORY_LEAK_MIN_GROWTH_MB,
+            "monotonic": monotonic,
+            "growth_mb": round(growth_mb, 2),
+            "growth_per_request_kb": round((floors[2] - floors[0]) / 1024 / max(len(history) - third, 1), 2),
+            "threshold_mb": MEMORY_LEAK_MIN_GROWTH_MB,
+            "samples": len(history),
+            "window_floors_mb": [round(f / MB, 2) for f in floors],
+        }
+
+    def top_growth(self, limit=10):
+        """Source lines whose traced allocations grew the most since the baseline snapshot"""
+        if not self.enabled or self._baseline is None:
+            return []
+        snapshot = tracemalloc.take_snapshot()
+        diffs = snapshot.compare_to(self._baseline, 'lineno')
+        return [{
+            "location": str(diff.traceback),
+            "size_diff_kb": round(diff.size_diff / 1024, 1),
+            "count_diff": diff.count_diff,
+        } for diff in diffs[:limit] if diff.size_diff > 0]
+
+    def report(self, top=0):
+        response = {"enabled": self.enabled}
+        if not self.enabled:
+            response["hint"] = "Set MEMORY_PROFILING=true to record per-stage memory usage"
+            return response
+
+        with self._lock:
+            stages = {
+                name: {
+                    "count": e["count"],
+                    "mean_peak_mb": round(e["peak_total"] / e["count"] / MB, 3),
+                    "max_peak_mb": round(e["peak_max"] / MB, 3),
+                    "mean_net_mb": round(e["net_total"] / e["count"] / MB, 3),
+                    "mean_rss_delta_mb": round(e["rss_delta_total"] / e["count"] / MB, 3),
+                    "max_rss_delta_mb": round(e["rss_delta_max"] / MB, 3),
+                    "mean_ms": round(e["seconds_total"] / e["count"] * 1000, 2),
+                }
+                for name, e in self._stages.items()
+            }
+            requests = self._requests
+
+        current, peak = tracemalloc.get_traced_memory()
+        response.update({
+            "requests": requests,
+            "rss_mb": round(self._rss() / MB, 2),
+            "traced_current_mb": round(current / MB, 2),
+            "stages": stages,
+            "leak": self.leak_report(),
+        })
+        if resource is not None:
+            # ru_maxrss is reported in KB on Linux
+            response["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+        if top:
+            response["top_growth"] = self.top_growth(top)
+        return response
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._rss_history.clear()
+            self._requests = 0
+            self._baseline = None
+
+
+memory_stats = MemoryStats()
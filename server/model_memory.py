@@ -0,0 +1,218 @@
+import os
+import gc
+import json
+import time
+import ctypes
+import shutil
+import logging
+import warnings
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# Unload both detectors after this many seconds without a prediction (0 keeps them resident)
+MODEL_IDLE_UNLOAD_SECONDS = float(os.getenv('MODEL_IDLE_UNLOAD_SECONDS', '0'))
+# Unload them sooner once system memory use reaches this percentage (0 disables)
+MODEL_MEMORY_PRESSURE_PERCENT = float(os.getenv('MODEL_MEMORY_PRESSURE_PERCENT', '0'))
+# Under memory pressure, models still have to be unused for this long before they go
+MODEL_PRESSURE_MIN_IDLE_SECONDS = float(os.getenv('MODEL_PRESSURE_MIN_IDLE_SECONDS', '30'))
+MODEL_MEMORY_CHECK_SECONDS = float(os.getenv('MODEL_MEMORY_CHECK_SECONDS', '10'))
+# Checkpoints are re-saved here as one .npy file per tensor, so reloads map them instead of unpickling
+# (empty disables the mapped copies)
+MODEL_WEIGHT_CACHE_DIR = os.getenv('MODEL_WEIGHT_CACHE_DIR', os.path.join(os.path.dirname(__file__), '.model_cache'))
+
+# Transitions kept for /api/model-status
+TRANSITION_HISTORY = 20
+
+
+def mapped_weights_dir(model_path):
+    """Mapped-copy directory of a checkpoint; a changed checkpoint gets a new one"""
+    if not MODEL_WEIGHT_CACHE_DIR:
+        return None
+    stat = os.stat(model_path)
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(MODEL_WEIGHT_CACHE_DIR, f"{name}-{stat.st_mtime_ns}-{stat.st_size}")
+
+
+def save_mapped_weights(state_dict, directory):
+    """Write a state dict as .npy files plus an index; the directory appears atomically once complete"""
+    if directory is None or os.path.isdir(directory):
+        return
+    partial = f"{directory}.tmp-{os.getpid()}"
+    try:
+        os.makedirs(partial, exist_ok=True)
+        index = {}
+        for i, (key, tensor) in enumerate(state_dict.items()):
+            filename = f"{i:04d}.npy"
+            np.save(os.path.join(partial, filename), tensor.detach().cpu().numpy())
+            index[key] = filename
+        with open(os.path.join(partial, 'index.json'), 'w') as f:
+            json.dump(index, f)
+        os.rename(partial, directory)
+        logger.info(f"Saved memory-mappable weights to {directory}")
+    except Exception as e:
+        # Another worker may have won the rename; either way the checkpoint still loads
+        logger.warning(f"Could not save mapped weights to {directory}: {str(e)}")
+        shutil.rmtree(partial, ignore_errors=True)
+
+
+def load_mapped_weights(directory):
+    """State dict backed by read-only memory maps of a mapped copy, or None when there is none"""
+    if directory is None or torch is None:
+        return None
+    index_path = os.path.join(directory, 'index.json')
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as f:
+        index = json.load(f)
+    with warnings.catch_warnings():
+        # torch warns that the maps are not writable; load_state_dict only copies out of them
+        warnings.simplefilter('ignore', UserWarning)
+        return {key: torch.from_numpy(np.load(os.path.join(directory, filename), mmap_mode='r'))
+                for key, filename in index.items()}
+
+
+def release_freed_memory():
+    """Collect garbage and hand freed heap pages back to the OS (glibc keeps them otherwise)"""
+    gc.collect()
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _rss_mb():
+    return psutil.Process().memory_info().rss / 1024 / 1024 if psutil else None
+
+
+class ModelMemoryManager:
+    """Unloads idle detectors, sooner under system memory pressure, and records load/unload transitions.
+
+    `unload()` drops the models and returns False if none were loaded;
+    `is_loaded()` tells whether they are resident. Reloading is left to
+    get_model(), which loads them again on the next prediction.
+    """
+
+    def __init__(self, unload, is_loaded, idle_seconds=MODEL_IDLE_UNLOAD_SECONDS,
+                 pressure_percent=MODEL_MEMORY_PRESSURE_PERCENT, pressure_min_idle=MODEL_PRESSURE_MIN_IDLE_SECONDS,
+                 check_seconds=MODEL_MEMORY_CHECK_SECONDS):
+        self.unload = unload
+        self.is_loaded = is_loaded
+        self.idle_seconds = idle_seconds
+        self.pressure_percent = pressure_percent if psutil is not None else 0
+        self.pressure_min_idle = pressure_min_idle
+        self.check_seconds = check_seconds
+        self.last_used = time.monotonic()
+        self.unloaded_reason = None  # why the models are out of memory, while they are
+        self.loads = 0
+        self.unloads = 0
+        self.transitions = deque(maxlen=TRANSITION_HISTORY)
+        self._lock = threading.Lock()
+        self._monitor_pid = None
+
+    @property
+    def enabled(self):
+        return bool(self.idle_seconds or self.pressure_percent)
+
+    def touch(self):
+        """Mark the models as in use; starts the monitor in this process on first use"""
+        self.last_used = time.monotonic()
+        if self.enabled and self._monitor_pid != os.getpid():
+            self._start()
+
+    def _start(self):
+        # Threads do not survive fork, so each gunicorn worker starts its own
+        with self._lock:
+            if self._monitor_pid == os.getpid():
+                return
+            self._monitor_pid = os.getpid()
+        threading.Thread(target=self._run, name='model-memory', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.check_seconds)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Model memory check failed: {str(e)}", exc_info=True)
+
+    def check(self):
+        """Unload the models if they have been idle long enough; returns the reason, if any"""
+        if not self.is_loaded():
+            return None
+        idle = time.monotonic() - self.last_used
+        reason = None
+        if self.idle_seconds and idle >= self.idle_seconds:
+            reason = 'idle'
+        elif self.pressure_percent and idle >= self.pressure_min_idle:
+            if psutil.virtual_memory().percent >= self.pressure_percent:
+                reason = 'memory_pressure'
+        if reason is not None and self.unload_now(reason):
+            return reason
+        return None
+
+    def unload_now(self, reason):
+        before = _rss_mb()
+        if not self.unload():
+            return False
+        release_freed_memory()
+        after = _rss_mb()
+        with self._lock:
+            self.unloads += 1
+            self.unloaded_reason = reason
+        freed = round(before - after, 1) if before is not None else None
+        self._record('unloaded', reason, freed_mb=freed)
+        logger.info(f"Unloaded models ({reason}); RSS {before:.0f} -> {after:.0f} MB" if before is not None
+                    else f"Unloaded models ({reason})")
+        return True
+
+    def record_load(self, seconds, sources):
+        """Note a completed load: the first one at startup, later ones after an unload"""
+        with self._lock:
+            reason = 'reload' if self.unloaded_reason is not None else 'startup'
+            self.loads += 1
+            self.unloaded_reason = None
+        self._record('loaded', reason, load_ms=round(seconds * 1000, 1), weights=sources)
+        if reason == 'reload':
+            logger.info(f"Reloaded models in {seconds * 1000:.0f} ms ({sources})")
+
+    def _record(self, event, reason, **details):
+        self.transitions.append({
+            "at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "event": event,
+            "reason": reason,
+            **details,
+        })
+
+    def stats(self):
+        stats = {
+            "enabled": self.enabled,
+            "state": "loaded" if self.is_loaded() else ("unloaded" if self.unloaded_reason else "not_loaded"),
+            "unloaded_reason": self.unloaded_reason,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+            "idle_unload_seconds": self.idle_seconds,
+            "memory_pressure_percent": self.pressure_percent,
+            "loads": self.loads,
+            "unloads": self.unloads,
+            "transitions": list(self.transitions),
+        }
+        if psutil is not None:
+            stats["system_memory_percent"] = psutil.virtual_memory().percent
+            stats["process_rss_mb"] = round(_rss_mb(), 1)
+        return stats
@@ -1,17 +1,68 @@
 import os
 import time
 import threading
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, g, send_file, stream_with_context
 import logging
 import base64
 import io
 from PIL import Image, ImageDraw, ImageFont, ImageOps
+from werkzeug.exceptions import RequestEntityTooLarge
 import gc
 import sys
+import json
+import queue
+import shutil
+import hashlib
+import numpy as np
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
+try:
+    from image_ingest import IngestError, open_image, digest_upload, spooled_upload, MAX_UPLOAD_MB
+    from memory_stats import memory_stats
+    from tile_pyramid import prepare_pyramid, to_pyramid_box, dzi_file, tile_file
+    from synthetic_model import SyntheticModel, CostProfile
+    from pipeline import (Pipeline, PipelineFull, Stage, PIPELINE_ENABLED, PIPELINE_PREPROCESS_WORKERS,
+                          PIPELINE_INFERENCE_WORKERS, PIPELINE_POSTPROCESS_WORKERS, PIPELINE_QUEUE_SIZE)
+    from scheduler import FairShareQueue, PRIORITY_RANK, DEFAULT_PRIORITY, resolve_priority, rate_limiter
+    from gating import gating, MESSAGES as GATE_MESSAGES
+    from blob_store import blob_store, IMAGE_DELIVERY, IMAGE_DELIVERY_MODES, MIMETYPES
+    from cancellation import (CancelToken, RequestCancelled, REQUEST_TIMEOUT_HEADER, DISCONNECT_POLL_SECONDS,
+                              parse_timeout_ms, wsgi_disconnect_probe)
+    from image_refs import resolve_image_path, map_image, file_identity, reference_cache
+    from raw_outputs import raw_output_cache
+    from qos import qos, FULL as FULL_QOS_PROFILE
+    from model_memory import ModelMemoryManager, mapped_weights_dir, save_mapped_weights, load_mapped_weights
+except ImportError:
+    from server.image_ingest import IngestError, open_image, digest_upload, spooled_upload, MAX_UPLOAD_MB
+    from server.memory_stats import memory_stats
+    from server.tile_pyramid import prepare_pyramid, to_pyramid_box, dzi_file, tile_file
+    from server.synthetic_model import SyntheticModel, CostProfile
+    from server.pipeline import (Pipeline, PipelineFull, Stage, PIPELINE_ENABLED, PIPELINE_PREPROCESS_WORKERS,
+                                 PIPELINE_INFERENCE_WORKERS, PIPELINE_POSTPROCESS_WORKERS, PIPELINE_QUEUE_SIZE)
+    from server.scheduler import FairShareQueue, PRIORITY_RANK, DEFAULT_PRIORITY, resolve_priority, rate_limiter
+    from server.gating import gating, MESSAGES as GATE_MESSAGES
+    from server.blob_store import blob_store, IMAGE_DELIVERY, IMAGE_DELIVERY_MODES, MIMETYPES
+    from server.cancellation import (CancelToken, RequestCancelled, REQUEST_TIMEOUT_HEADER, DISCONNECT_POLL_SECONDS,
+                                     parse_timeout_ms, wsgi_disconnect_probe)
+    from server.image_refs import resolve_image_path, map_image, file_identity, reference_cache
+    from server.raw_outputs import raw_output_cache
+    from server.qos import qos, FULL as FULL_QOS_PROFILE
+    from server.model_memory import ModelMemoryManager, mapped_weights_dir, save_mapped_weights, load_mapped_weights
+
+# Tiles are content-addressed, so browsers may keep them for a year
+TILE_CACHE_MAX_AGE = 365 * 24 * 3600
+# Comment lines sent on idle event streams so proxies do not time them out
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+# Postprocessing defaults; requests may override them with score_threshold and iou_threshold.
+# Combined predictions keep the best box per class above DEFAULT_SCORE_THRESHOLD, IT2-only
+# predictions keep every box above IT2_ONLY_SCORE_THRESHOLD.
+DEFAULT_SCORE_THRESHOLD = 0.01
+IT2_ONLY_SCORE_THRESHOLD = 0.3
+DEFAULT_IOU_THRESHOLD = 0.5
+
 model_bp = Blueprint('model', __name__)
 
 MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
@@ -81,6 +132,9 @@ classes_it3 = {
 # Define sets for easy filtering
 common_classes = set(classes_it3.keys())
 it2_only_classes = set(classes_it2.keys()) - common_classes
+IT2_EXTRA_CLASS_IDS = {classes_it2[name] for name in it2_only_classes}
+# Detector that reports each class in combined predictions: IT3 for the common classes, IT2 for the rest
+CLASS_ROUTES = {**{name: 'it3' for name in common_classes}, **{name: 'it2' for name in it2_only_classes}}
 
 # Reverse mapping
 classes_it2_reverse = {v: k for k, v in classes_it2.items()}
@@ -94,14 +148,14 @@ if torch_available:
         transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
     ])
 else:
-    # Fallback transform function that doesn't require torchvision
-    # This should never be used in production!
+    # Fallback transform that doesn't require torchvision (only the synthetic models can consume it)
+    _mean = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+    _std = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+
     def transform(image):
-        """Simple transform function that resizes the image"""
-        logger.critical("Using fallback transform function - THIS WILL NOT WORK PROPERLY!")
-        # Resize image to 512x512
-        resized_image = image.resize((512, 512))
-        return resized_image
+        """Resize to 512x512 and normalize into a (1, 3, 512, 512) float32 array"""
+        array = np.asarray(image.resize((512, 512), Image.BILINEAR), dtype=np.float32).transpose(2, 0, 1) / 255.0
+        return ((array - _mean) / _std)[None]
 
 # Load model
 model_it2 = None  # IT2 model with 9 classes
@@ -123,190 +177,15 @@ class_colors = {
     'default': (59, 130, 246)               # Default Blue #3b82f6
 }
 
-# Fallback lightweight model that doesn't rely on PyTorch
-class LightweightModel:
-    """A lightweight model implementation that doesn't need PyTorch"""
-    
-    def __init__(self, model_type="IT3"):
-        self.model_type = model_type
-        self.is_mock = True
-        
-        # Define typical findings for CXR abnormalities with realistic positions
-        # Format: [x1, y1, x2, y2] coordinates in 512x512 image space
-        self.common_findings = {
-            'Cardiomegaly': {
-                'boxes': [[180, 150, 340, 300]],  # Heart region
-                'score_range': [0.75, 0.95]
-            },
-            'Pleural thickening': {
-                'boxes': [[100, 150, 170, 350], [350, 150, 420, 350]],  # Left and right pleural regions
-                'score_range': [0.65, 0.85]
-            },
-            'Pulmonary fibrosis': {
-                'boxes': [[150, 100, 250, 200], [270, 100, 370, 200]],  # Lung fields
-                'score_range': [0.70, 0.90]
-            },
-            'Pleural effusion': {
-                'boxes': [[80, 250, 150, 400], [370, 250, 440, 400]],  # Lower pleural spaces
-                'score_range': [0.72, 0.92]
-            },
-            'Nodule/Mass': {
-                'boxes': [[150, 120, 190, 160], [300, 140, 340, 180], [220, 200, 260, 240]],  # Various lung regions
-                'score_range': [0.60, 0.80]
-            },
-            'Infiltration': {
-                'boxes': [[120, 120, 220, 220], [300, 120, 400, 220]],  # Upper lung fields
-                'score_range': [0.68, 0.88]
-            },
-            'Consolidation': {
-                'boxes': [[120, 220, 220, 320], [300, 220, 400, 320]],  # Lower lung fields
-                'score_range': [0.63, 0.83]
-            },
-            'Atelectasis': {
-                'boxes': [[100, 150, 200, 350], [320, 150, 420, 350]],  # Lung bases
-                'score_range': [0.67, 0.87]
-            },
-            'Pneumothorax': {
-                'boxes': [[50, 100, 120, 300], [400, 100, 470, 300]],  # Peripheral lung regions
-                'score_range': [0.73, 0.93]
-            }
-        }
-        
-        logger.info(f"Initializing lightweight {model_type} model for mock predictions")
-        
-    def __call__(self, image_tensor):
-        """Generate realistic mock detections based on image characteristics"""
-        logger.info(f"Generating mock detections using lightweight {self.model_type} model")
-        
-        # Select which classes to use based on model type
-        if self.model_type == "IT2":
-            class_mapping = classes_it2
-            reverse_mapping = classes_it2_reverse
-            # IT2 has all 9 classes
-            available_classes = list(self.common_findings.keys())
-        else:  # IT3
-            class_mapping = classes_it3
-            reverse_mapping = classes_it3_reverse
-            # IT3 has only 6 classes
-            available_classes = list(classes_it3.keys())
-        
-        # Try to extract image characteristics for more realistic variations
-        try:
-            # Determine image factor based on tensor or PIL image
-            if hasattr(image_tensor, 'mean') and callable(getattr(image_tensor, 'mean')):
-                # For PyTorch tensors
-                image_factor = min(max(image_tensor.mean().item(), 0.1), 0.9)
-            elif hasattr(image_tensor, 'size'):
-                # For PIL images
-                image = image_tensor
-                # Get average brightness as a factor
-                if hasattr(image, 'convert'):
-                    gray_image = image.convert('L')
-                    avg_brightness = sum(gray_image.getdata()) / (gray_image.width * gray_image.height) / 255
-                    image_factor = min(max(avg_brightness, 0.1), 0.9)
-                else:
-                    image_factor = 0.5
-            else:
-                image_factor = 0.5
-                
-            logger.info(f"Image characteristics factor: {image_factor:.4f}")
-            
-            # Generate random number of findings based on image factor
-            # More abnormal images (lower factor) tend to have more findings
-            import random
-            random.seed(int(image_factor * 1000))  # Seed for reproducibility but varies by image
-            
-            # Decide how many findings to show (1-4)
-            num_findings = random.randint(1, min(4, len(available_classes)))
-            
-            # Select which classes to show
-            selected_classes = random.sample(available_classes, num_findings)
-            
-            # Create boxes, scores and labels for the selected findings
-            boxes = []
-            scores = []
-            labels = []
-            
-            for class_name in selected_classes:
-                # Skip if class not in model's capability
-                if class_name not in class_mapping:
-                    continue
-                    
-                # Get class details
-                class_id = class_mapping[class_name]
-                class_info = self.common_findings[class_name]
-                
-                # Select a random box for this finding
-                box_idx = random.randint(0, len(class_info['boxes']) - 1)
-                box = class_info['boxes'][box_idx]
-                
-                # Add random variation to box coordinates (±10%)
-                variation = 0.1
-                box = [
-                    max(0, box[0] * (1 - variation * random.random())),
-                    max(0, box[1] * (1 - variation * random.random())),
-                    min(512, box[2] * (1 + variation * random.random())),
-                    min(512, box[3] * (1 + variation * random.random()))
-                ]
-                
-                # Generate score within the specified range
-                min_score, max_score = class_info['score_range']
-                score = min_score + random.random() * (max_score - min_score)
-                
-                # Add to results
-                boxes.append(box)
-                scores.append(score)
-                labels.append(class_id)
-            
-            # Create mock tensor or regular list based on torch availability
-            if torch_available:
-                return [{
-                    'boxes': torch.tensor(boxes),
-                    'scores': torch.tensor(scores),
-                    'labels': torch.tensor(labels)
-                }]
-            else:
-                return [{
-                    'boxes': [MockTensor(box) for box in boxes],
-                    'scores': [MockTensor(score) for score in scores],
-                    'labels': [MockTensor(label) for label in labels]
-                }]
-                
-        except Exception as e:
-            logger.error(f"Error generating dynamic predictions: {str(e)}")
-            # Fall back to fixed predictions
-            if torch_available:
-                return [{
-                    'boxes': torch.tensor([
-                        [100.0, 150.0, 300.0, 350.0],  # Nodule
-                        [200.0, 100.0, 450.0, 350.0],  # Cardiomegaly 
-                        [50.0, 300.0, 150.0, 400.0]    # Effusion
-                    ]),
-                    'scores': torch.tensor([0.87, 0.92, 0.78]),
-                    'labels': torch.tensor([5, 1, 4])  # Corresponding to classes
-                }]
-            else:
-                return [{
-                    'boxes': [
-                        MockTensor([100.0, 150.0, 300.0, 350.0]),  # Nodule
-                        MockTensor([200.0, 100.0, 450.0, 350.0]),  # Cardiomegaly 
-                        MockTensor([50.0, 300.0, 150.0, 400.0])    # Effusion
-                    ],
-                    'scores': [
-                        MockTensor(0.87), 
-                        MockTensor(0.92), 
-                        MockTensor(0.78)
-                    ],
-                    'labels': [
-                        MockTensor(5), 
-                        MockTensor(1), 
-                        MockTensor(4)
-                    ]  # Corresponding to classes
-                }]
-    
-    def eval(self):
-        """Set model to evaluation mode"""
-        return self
+# Synthetic models share one cost profile (calibration runs at most once)
+synthetic_cost = None
+
+def create_synthetic_models():
+    """Build the IT2/IT3 synthetic stand-ins used when real models are unavailable or mocked"""
+    global synthetic_cost
+    if synthetic_cost is None:
+        synthetic_cost = CostProfile.from_env()
+    return SyntheticModel("IT2", classes_it2, synthetic_cost), SyntheticModel("IT3", classes_it3, synthetic_cost)
 
 def load_model_in_background():
     """Load both IT2 and IT3 models in a background thread"""
@@ -329,11 +208,10 @@ def load_model_in_background():
             logger.info("Falling back to mock models since PyTorch is not available")
             use_mock = True
         
-        # If USE_MOCK_MODELS is True, use lightweight mock models regardless of file existence
+        # If USE_MOCK_MODELS is True, use synthetic models regardless of file existence
         if use_mock:
             logger.info("Using mock models as specified by environment configuration")
-            model_it2 = LightweightModel("IT2")
-            model_it3 = LightweightModel("IT3")
+            model_it2, model_it3 = create_synthetic_models()
             model_loading = False
             logger.info("Mock models loaded successfully")
             return
@@ -376,14 +254,13 @@ def load_model_in_background():
         # Check if either model failed to load
         if model_it2 is None and model_it3 is None:
             logger.critical("Both models failed to load - falling back to mock models!")
-            model_it2 = LightweightModel("IT2")
-            model_it3 = LightweightModel("IT3")
+            model_it2, model_it3 = create_synthetic_models()
         elif model_it2 is None:
             logger.warning("IT2 model failed to load - using mock model for IT2")
-            model_it2 = LightweightModel("IT2")
+            model_it2 = create_synthetic_models()[0]
         elif model_it3 is None:
             logger.warning("IT3 model failed to load - using mock model for IT3")
-            model_it3 = LightweightModel("IT3")
+            model_it3 = create_synthetic_models()[1]
         else:
             logger.info("Both models loaded successfully")
             
@@ -399,11 +276,18 @@ def load_model_in_background():
     except Exception as e:
         logger.critical(f"Failed to load models in background: {str(e)}", exc_info=True)
         logger.critical("Model loading failed - falling back to mock models!")
-        model_it2 = LightweightModel("IT2")
-        model_it3 = LightweightModel("IT3")
+        model_it2, model_it3 = create_synthetic_models()
     finally:
         model_loading = False
 
+def create_random_model(model_identifier):
+    """Build an untrained SSD300-VGG16 with the same architecture as the real models (for load testing)"""
+    logger.warning(f"Creating randomly-initialized {model_identifier} model - PREDICTIONS WILL NOT BE REAL!")
+    temp_model = models.detection.ssd300_vgg16(weights=None, weights_backbone=None)
+    temp_model.eval()
+    temp_model.weight_source = 'random'
+    return temp_model
+
 def load_specific_model(model_filename, model_identifier):
     """Load a specific model file with error handling"""
     logger.info(f"Loading {model_identifier} model...")
@@ -419,7 +303,11 @@ def load_specific_model(model_filename, model_identifier):
 
         # Initialize architecture without downloading pretrained weights
         logger.info(f"Creating {model_identifier} model architecture without external weight downloads...")
-        temp_model = models.detection.ssd300_vgg16(weights=None)
+        # Allocate the layers without running their random initialisation: the checkpoint
+        # overwrites every parameter, and initialising takes longer than loading it
+        with torch.device('meta'):
+            temp_model = models.detection.ssd300_vgg16(weights=None, weights_backbone=None)
+        temp_model = temp_model.to_empty(device='cpu')
 
         possible_paths = [
             os.path.join(MODEL_DIR, model_filename),
@@ -440,7 +328,14 @@ def load_specific_model(model_filename, model_identifier):
         logger.info(f"Loading {model_identifier} model weights from {model_path} (Size: {file_size_mb:.2f} MB)...")
 
         device = torch.device('cpu')
-        state_dict = torch.load(model_path, map_location=device)
+        # A memory-mapped copy of the checkpoint reloads without unpickling (see model_memory.py)
+        mapped_dir = mapped_weights_dir(model_path)
+        state_dict = load_mapped_weights(mapped_dir)
+        weight_source = 'mapped'
+        if state_dict is None:
+            state_dict = torch.load(model_path, map_location=device)
+            save_mapped_weights(state_dict, mapped_dir)
+            weight_source = 'checkpoint'
 
         if hasattr(torch, 'cuda') and torch.cuda.is_available():
             torch.cuda.empty_cache()
@@ -451,8 +346,9 @@ def load_specific_model(model_filename, model_identifier):
         gc.collect()
 
         temp_model.eval()
+        temp_model.weight_source = weight_source
 
-        logger.info(f"{model_identifier} model loaded successfully")
+        logger.info(f"{model_identifier} model loaded successfully ({weight_source} weights)")
         return temp_model
 
     except Exception as e:
@@ -506,10 +402,31 @@ class MockModel:
         """Mock eval method"""
         return self
 
+def unload_models():
+    """Drop both detectors to free their memory; get_model() loads them again on the next prediction"""
+    global model_it2, model_it3
+    with model_load_lock:
+        if model_it2 is None and model_it3 is None:
+            return False
+        model_it2 = model_it3 = None
+    return True
+
+def models_loaded():
+    return model_it2 is not None and model_it3 is not None
+
+def weight_sources():
+    """Where each loaded detector's weights came from: mapped, checkpoint, random or synthetic"""
+    return {name: 'synthetic' if getattr(model, 'is_mock', False) else getattr(model, 'weight_source', 'checkpoint')
+            for name, model in (('IT2', model_it2), ('IT3', model_it3)) if model is not None}
+
+# Idle and memory-pressure unloading (off unless MODEL_IDLE_UNLOAD_SECONDS or MODEL_MEMORY_PRESSURE_PERCENT is set)
+model_memory = ModelMemoryManager(unload_models, models_loaded)
+
 def get_model():
     """Get or load the model as needed"""
     global model_it2, model_it3, model_loading
-    
+
+    model_memory.touch()
     # Return immediately if models are already loaded
     if model_it2 is not None and model_it3 is not None:
         return model_it2, model_it3
@@ -530,10 +447,15 @@ def get_model():
         
         # Set model loading flag
         model_loading = True
+        load_started = time.perf_counter()
         
         try:
+            # Randomly-initialized models have the real compute cost without needing the weight files
+            if torch_available and os.environ.get('USE_RANDOM_MODELS', 'False').lower() == 'true':
+                model_it2 = create_random_model('IT2')
+                model_it3 = create_random_model('IT3')
             # Try to load the real PyTorch models if available
-            if torch_available:
+            elif torch_available:
                 it2_path = os.path.join(MODEL_DIR, 'IT2_model_epoch_300.pth')
                 it3_path = os.path.join(MODEL_DIR, 'IT3_model_epoch_260.pth')
 
@@ -544,10 +466,10 @@ def get_model():
                     missing.append(it3_path)
 
                 if missing:
-                    logger.warning("Model files missing; using lightweight mock models")
+                    logger.warning("Model files missing; using synthetic models")
                     for path in missing:
                         logger.warning(f"Missing model file: {path}")
-                    model_it2 = model_it3 = LightweightModel()
+                    model_it2, model_it3 = create_synthetic_models()
                 else:
                     # Load IT2 model (9 classes)
                     model_it2 = load_specific_model('IT2_model_epoch_300.pth', 'IT2')
@@ -557,26 +479,47 @@ def get_model():
 
                     # Check if any model failed to load
                     if model_it2 is None or model_it3 is None:
-                        logger.warning("One or both models failed to load, falling back to lightweight model")
-                        model_it2 = model_it3 = LightweightModel()
+                        logger.warning("One or both models failed to load, falling back to synthetic models")
+                        model_it2, model_it3 = create_synthetic_models()
             else:
-                logger.warning("PyTorch not available, falling back to lightweight model")
-                model_it2 = model_it3 = LightweightModel()
+                logger.warning("PyTorch not available, falling back to synthetic models")
+                model_it2, model_it3 = create_synthetic_models()
         except Exception as e:
             logger.error(f"Error in model loading process: {str(e)}")
-            # Fall back to lightweight model in case of error
+            # Fall back to synthetic models in case of error
             try:
-                logger.info("Falling back to lightweight model due to error")
-                model_it2 = model_it3 = LightweightModel()
+                logger.info("Falling back to synthetic models due to error")
+                model_it2, model_it3 = create_synthetic_models()
             except Exception as fallback_err:
                 logger.error(f"Error loading fallback model: {str(fallback_err)}")
                 model_it2 = model_it3 = None
         finally:
             model_loading = False
-            
+
+        if models_loaded():
+            model_memory.record_load(time.perf_counter() - load_started, weight_sources())
         return model_it2, model_it3 
 
-def apply_nms(predictions, iou_threshold=0.5):
+def nms_numpy(boxes, scores, iou_threshold):
+    """Greedy NMS over numpy arrays, matching torchvision.ops.nms"""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    order = np.argsort(-np.asarray(scores), kind='stable')
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        x1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+def apply_nms(predictions, iou_threshold=DEFAULT_IOU_THRESHOLD):
     """
     Applies Non-Maximum Suppression (NMS) to the predictions.
     Returns filtered predictions.
@@ -585,8 +528,8 @@ def apply_nms(predictions, iou_threshold=0.5):
     scores = predictions[0]['scores']
     labels = predictions[0]['labels']
 
-    # Apply NMS
-    keep = nms(boxes, scores, iou_threshold)
+    # Apply NMS (numpy outputs come from the synthetic models when torch is unavailable)
+    keep = nms(boxes, scores, iou_threshold) if torch_available else nms_numpy(boxes, scores, iou_threshold)
 
     # Filter results based on NMS
     filtered_boxes = boxes[keep]
@@ -599,8 +542,18 @@ def apply_nms(predictions, iou_threshold=0.5):
         'labels': filtered_labels
     }
 
-def predict(input_tensor):
-    """Process model predictions and format the results to match the original implementation"""
+def predict(input_tensor, checkpoint=None, on_findings=None, score_threshold=DEFAULT_SCORE_THRESHOLD,
+            iou_threshold=DEFAULT_IOU_THRESHOLD, forward=None, models=('it3', 'it2'), classes=None):
+    """Process model predictions and format the results to match the original implementation.
+
+    `checkpoint` is called between the IT3 and IT2 forward passes and may raise
+    RequestCancelled to skip the second model. `on_findings(model, findings)`
+    receives the IT3 findings as soon as that forward pass is done, then the
+    IT2-only findings. `forward(name, model)` supplies a model's raw output in
+    place of running it on input_tensor (see detector_output). Models left out
+    of `models` are not run and contribute no findings; `classes` limits the
+    findings to those class names (route_models() says which models they need).
+    """
     try:
         model_it2, model_it3 = get_model()  # Ensure models are loaded
         
@@ -608,120 +561,159 @@ def predict(input_tensor):
             logger.error("Models not available for prediction")
             return []
             
-        # Log whether using lightweight model or real model
-        is_lightweight = (hasattr(model_it2, 'model_type') and model_it2.model_type == "lightweight")
-        if is_lightweight:
-            logger.warning("Using lightweight model for prediction - results will be mocked")
+        # Log whether using synthetic models or real models
+        if getattr(model_it2, 'is_mock', False):
+            logger.debug("Using synthetic models for prediction - results are mocked")
         else:
-            logger.info("Using real PyTorch models for prediction")
+            logger.debug("Using real PyTorch models for prediction")
             
-        # Get raw predictions from both models
-        with torch_no_grad():
-            # Get IT3 predictions (more accurate for 6 classes)
-            raw_predictions_it3 = model_it3(input_tensor)
-            
-            # Get IT2 predictions (for the 3 additional classes)
-            raw_predictions_it2 = model_it2(input_tensor)
-            
-        # Apply NMS with iou_threshold=0.5
-        filtered_predictions_it3 = apply_nms(raw_predictions_it3, iou_threshold=0.5)
-        filtered_predictions_it2 = apply_nms(raw_predictions_it2, iou_threshold=0.5)
-        
-        # Extract and merge predictions
-        formatted_predictions = merge_model_predictions(filtered_predictions_it2, filtered_predictions_it3)
-        
-        return formatted_predictions
+        if forward is None:
+            def forward(name, model):
+                with torch_no_grad():
+                    return model(input_tensor)
+
+        # Get IT3 predictions (more accurate for 6 classes)
+        findings_it3 = []
+        if 'it3' in models:
+            raw_predictions_it3 = forward('it3', model_it3)
+            findings_it3 = select_classes(it3_findings(apply_nms(raw_predictions_it3, iou_threshold), score_threshold),
+                                          classes)
+            if on_findings is not None:
+                on_findings('it3', findings_it3)
+
+        if checkpoint is not None:
+            checkpoint()
+
+        # Get IT2 predictions (for the 3 additional classes)
+        findings_it2 = []
+        if 'it2' in models:
+            raw_predictions_it2 = forward('it2', model_it2)
+            findings_it2 = select_classes(it2_extra_findings(apply_nms(raw_predictions_it2, iou_threshold), score_threshold),
+                                          classes)
+            if on_findings is not None:
+                on_findings('it2', findings_it2)
+
+        return findings_it3 + findings_it2
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error during prediction: {str(e)}", exc_info=True)
         return []
 
+def route_models(classes):
+    """Detectors a combined prediction has to run for the requested classes (None means all), IT3 first"""
+    if classes is None:
+        return ('it3', 'it2')
+    needed = {CLASS_ROUTES[name] for name in classes}
+    return tuple(name for name in ('it3', 'it2') if name in needed)
+
+def select_classes(findings, classes):
+    """Findings whose label is one of the requested classes (all of them when classes is None)"""
+    if classes is None:
+        return findings
+    return [finding for finding in findings if finding['label'] in classes]
+
+def format_predictions(raw_predictions_it2, raw_predictions_it3):
+    """NMS each model's raw output for one image and merge them into the response format"""
+    filtered_predictions_it3 = apply_nms(raw_predictions_it3)
+    filtered_predictions_it2 = apply_nms(raw_predictions_it2)
+    return merge_model_predictions(filtered_predictions_it2, filtered_predictions_it3)
+
+def stack_batch(tensors):
+    """Stack (1, 3, H, W) model inputs into one (N, 3, H, W) batch"""
+    return torch.cat(tensors) if torch_available else np.concatenate(tensors)
+
+def predict_batch(batch):
+    """Combined IT2+IT3 predictions for a stacked batch: one forward per model, one list per image"""
+    model_it2, model_it3 = get_model()
+    if model_it2 is None or model_it3 is None:
+        raise PredictionError('Models are not available', 503)
+    with torch_no_grad():
+        raw_it3 = model_it3(batch)
+        raw_it2 = model_it2(batch)
+    return [format_predictions([it2], [it3]) for it2, it3 in zip(raw_it2, raw_it3)]
+
 def merge_model_predictions(predictions_it2, predictions_it3):
     """
     Merge predictions from both models:
     - Use IT3 predictions for the 6 common classes
     - Use IT2 predictions for the 3 additional classes
     """
-    combined_results = []
-    
-    # Process IT3 predictions (higher priority for the 6 classes)
-    it3_class_boxes = {}
-    for i, box in enumerate(predictions_it3['boxes']):
-        class_id = predictions_it3['labels'][i].item() if hasattr(predictions_it3['labels'][i], 'item') else predictions_it3['labels'][i]
-        score = predictions_it3['scores'][i].item() if hasattr(predictions_it3['scores'][i], 'item') else predictions_it3['scores'][i]
+    return it3_findings(predictions_it3) + it2_extra_findings(predictions_it2)
+
+def best_box_per_class(predictions, class_ids=None, score_threshold=DEFAULT_SCORE_THRESHOLD):
+    """Highest-scoring box of each class in NMS-filtered output (optionally only some classes)"""
+    class_boxes = {}
+    for i, box in enumerate(predictions['boxes']):
+        class_id = predictions['labels'][i].item() if hasattr(predictions['labels'][i], 'item') else predictions['labels'][i]
+        score = predictions['scores'][i].item() if hasattr(predictions['scores'][i], 'item') else predictions['scores'][i]
         box_coords = box.tolist() if hasattr(box, 'tolist') else box
-        
+
+        if class_ids is not None and class_id not in class_ids:
+            continue
         # Use a confidence threshold
-        if score < 0.01:
+        if score < score_threshold:
             continue
-        
+
         # If the class is not in the dictionary or the current score is higher, update
-        if class_id not in it3_class_boxes or it3_class_boxes[class_id]['score'] < score:
-            it3_class_boxes[class_id] = {
+        if class_id not in class_boxes or class_boxes[class_id]['score'] < score:
+            class_boxes[class_id] = {
                 'box': box_coords,
                 'score': score
             }
-    
-    # Process IT2 predictions (only for the 3 additional classes)
-    it2_class_boxes = {}
-    for i, box in enumerate(predictions_it2['boxes']):
-        class_id = predictions_it2['labels'][i].item() if hasattr(predictions_it2['labels'][i], 'item') else predictions_it2['labels'][i]
-        score = predictions_it2['scores'][i].item() if hasattr(predictions_it2['scores'][i], 'item') else predictions_it2['scores'][i]
-        box_coords = box.tolist() if hasattr(box, 'tolist') else box
-        
-        # Only include predictions for classes 7, 8, 9 (the 3 additional classes)
-        if class_id in [7, 8, 9]:
-            # Use a confidence threshold
-            if score < 0.01:
-                continue
-            
-            # If the class is not in the dictionary or the current score is higher, update
-            if class_id not in it2_class_boxes or it2_class_boxes[class_id]['score'] < score:
-                it2_class_boxes[class_id] = {
-                    'box': box_coords,
-                    'score': score
-                }
-    
-    # First, add the IT3 predictions for the 6 common classes
-    for class_id, data in it3_class_boxes.items():
-        try:
-            x1, y1, x2, y2 = data['box']
-            class_name = classes_it3_reverse.get(class_id, f"Unknown-{class_id}")  # Get class name
-            
-            # Skip background class (class_id=0)
-            if class_id == 0:
-                continue
-                
-            # Add prediction
-            combined_results.append({
-                'boxes': [x1, y1, x2, y2],
-                'label': class_name,
-                'score': data['score']
-            })
-            logger.info(f"IT3 Class: {class_name}, Confidence: {data['score']:.4f}, Bounding Box: ({x1:.2f}, {y1:.2f}, {x2:.2f}, {y2:.2f})")
-        except Exception as e:
-            logger.error(f"Error processing IT3 prediction for class {class_id}: {str(e)}")
-    
-    # Then, add the IT2 predictions for the 3 additional classes
-    for class_id, data in it2_class_boxes.items():
+    return class_boxes
+
+def format_findings(class_boxes, class_names, model_name):
+    results = []
+    for class_id, data in class_boxes.items():
         try:
             x1, y1, x2, y2 = data['box']
-            class_name = classes_it2_reverse.get(class_id, f"Unknown-{class_id}")  # Get class name
-            
+            class_name = class_names.get(class_id, f"Unknown-{class_id}")  # Get class name
+
             # Skip background class (class_id=0)
             if class_id == 0:
                 continue
-                
+
             # Add prediction
-            combined_results.append({
+            results.append({
                 'boxes': [x1, y1, x2, y2],
                 'label': class_name,
                 'score': data['score']
             })
-            logger.info(f"IT2 Class: {class_name}, Confidence: {data['score']:.4f}, Bounding Box: ({x1:.2f}, {y1:.2f}, {x2:.2f}, {y2:.2f})")
         except Exception as e:
-            logger.error(f"Error processing IT2 prediction for class {class_id}: {str(e)}")
-    
-    return combined_results
+            logger.error(f"Error processing {model_name} prediction for class {class_id}: {str(e)}")
+    return results
+
+def it3_findings(predictions_it3, score_threshold=DEFAULT_SCORE_THRESHOLD):
+    """IT3 findings for the 6 common classes (IT3 is the more accurate model for them)"""
+    return format_findings(best_box_per_class(predictions_it3, score_threshold=score_threshold),
+                           classes_it3_reverse, 'IT3')
+
+def it2_extra_findings(predictions_it2, score_threshold=DEFAULT_SCORE_THRESHOLD):
+    """IT2 findings for the 3 classes IT3 does not detect (classes 7, 8 and 9)"""
+    return format_findings(best_box_per_class(predictions_it2, IT2_EXTRA_CLASS_IDS, score_threshold),
+                           classes_it2_reverse, 'IT2')
+
+def it2_only_findings(predictions_it2, score_threshold=IT2_ONLY_SCORE_THRESHOLD):
+    """Every NMS-filtered IT2 box above the threshold, for model_type=it2 requests"""
+    predictions = []
+    for i in range(len(predictions_it2['boxes'])):
+        box = predictions_it2['boxes'][i].tolist()
+        score = predictions_it2['scores'][i].item()
+        label_idx = predictions_it2['labels'][i].item()
+
+        # Skip low confidence predictions
+        if score < score_threshold:
+            continue
+
+        label = classes_it2_reverse.get(label_idx, f"Unknown({label_idx})")
+
+        predictions.append({
+            'boxes': box,
+            'score': score,
+            'label': label
+        })
+    return predictions
 
 def torch_no_grad():
     """Context manager to disable gradient calculation - with torch fallback"""
@@ -780,150 +772,581 @@ def draw_predictions_on_image(image, predictions):
     
     return image
 
+class PredictionError(Exception):
+    """A prediction failure that maps onto an HTTP status and JSON error body"""
+
+    def __init__(self, message, status_code=500, **details):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+    def to_dict(self):
+        return {'error': str(self), **self.details}
+
+class PredictionJob:
+    """State of one prediction request as it moves through decode, inference and rendering"""
+
+    def __init__(self, image_data=None, model_type='combined', image=None, pyramid=False,
+                 priority=DEFAULT_PRIORITY, user='anonymous', image_delivery=IMAGE_DELIVERY):
+        self.image_data = image_data      # encoded upload: bytes or a binary file object
+        self.image = image                # decoded RGB PIL image at display resolution
+        self.model_type = model_type
+        self.pyramid = pyramid            # build a Deep Zoom tile pyramid instead of inlining images
+        self.image_delivery = image_delivery  # 'inline' data URLs, 'url' blob links or 'none'
+        self.priority = priority          # scheduling class (see scheduler.PRIORITY_CLASSES)
+        self.user = user                  # fair-share key: token subject or client address
+        self.cancel_token = None          # CancelToken checked at stage boundaries
+        self.gate = None                  # GateDecision when gating is enabled
+        self.events = None                # queue of (event, data) for streaming responses
+        self.upload_digest = None         # SHA-256 of the encoded upload
+        self.source_path = None           # server-local file for by-reference requests
+        self.source_key = None            # result cache key: file identity plus request options
+        self.score_threshold = None       # minimum finding score; None uses the model type's default
+        self.classes = None               # requested class names; None reports every class
+        self.detectors = ()               # models that ran (or came from the raw output cache)
+        self.iou_threshold = DEFAULT_IOU_THRESHOLD  # NMS overlap above which weaker boxes are dropped
+        self.raw_outputs = {}             # detector outputs already known for this image, by model name
+        self.qos = FULL_QOS_PROFILE       # QosProfile picked at admission (see qos.py)
+        self.pyramid_info = None
+        self.image_tensor = None
+        self.predictions = None
+        self.result = None
+        self.start_time = time.time()
+
+    @property
+    def gated(self):
+        """True when a gate short-circuited the detectors"""
+        return self.gate is not None and self.gate.short_circuit
+
+    @property
+    def effective_score_threshold(self):
+        if self.score_threshold is not None:
+            return self.score_threshold
+        return IT2_ONLY_SCORE_THRESHOLD if self.model_type == 'it2' else DEFAULT_SCORE_THRESHOLD
+
+    def emit(self, event, findings):
+        """Publish partial findings to a streaming response, if one is attached"""
+        if self.events is not None:
+            self.events.put((event, findings))
+
+    def ensure_active(self, stage):
+        """Raise RequestCancelled if the client is gone or the deadline passed before `stage`"""
+        if self.cancel_token is not None:
+            self.cancel_token.check(stage)
+
+    def summary(self):
+        """Compact description used for the per-request log record"""
+        predictions = self.predictions or []
+        return {
+            "model_used": self.model_type,
+            "priority": self.priority,
+            "gate": self.gate.action if self.gate is not None else None,
+            "qos": self.qos.name,
+            "detectors": list(self.detectors),
+            "findings": len(predictions),
+            "labels": sorted({p['label'] for p in predictions}),
+            "processing_ms": round((time.time() - self.start_time) * 1000, 2),
+        }
+
+def ensure_models_ready():
+    """Raise a PredictionError unless both models are loaded and usable"""
+    # Ensure models are ready or loading (this reloads models unloaded while idle)
+    current_models = get_model()
+
+    # Without PyTorch only the synthetic models can serve predictions
+    if not torch_available and not getattr(current_models[0], 'is_mock', False):
+        logger.critical("PyTorch is not available - cannot process predictions!")
+        raise PredictionError(
+            'PyTorch is not installed on the server. Please install PyTorch by uncommenting it in requirements.txt.',
+            500,
+            fix='The server administrator needs to uncomment torch and torchvision in requirements.txt and run pip install -r requirements.txt'
+        )
+
+    if current_models[0] is None and model_loading:
+        logger.warning("Models are still loading, returning 503 Service Unavailable")
+        raise PredictionError('Models are still loading. Please try again later.', 503)
+    elif current_models[0] is None:
+        logger.error("Failed to load models")
+        raise PredictionError(
+            'Failed to load models. Check server logs for details.',
+            500,
+            details='The model files may be missing or corrupted. Ensure IT2_model_epoch_300.pth and IT3_model_epoch_260.pth exist in server/models.'
+        )
+
+def encode_png(image, compress_level=6):
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG", compress_level=compress_level)
+    return buffered.getvalue()
+
+def encode_data_url(image, compress_level=6):
+    """Encode a PIL image as a PNG data URL"""
+    return f"data:image/png;base64,{base64.b64encode(encode_png(image, compress_level)).decode('utf-8')}"
+
+def stored_image_url(job, variant):
+    """Blob URL of a rendering already stored for this upload, if any (url delivery only)"""
+    if job.image_delivery != 'url' or not job.upload_digest:
+        return None
+    ref = blob_store.get_ref(job.upload_digest, variant)
+    return blob_store.url(*ref) if ref else None
+
+def deliver_image(job, image, variant):
+    """Inline data URL, or store the PNG by content and return its blob URL"""
+    if job.image_delivery != 'url':
+        return encode_data_url(image, job.qos.png_compress_level)
+    digest = blob_store.put(encode_png(image, job.qos.png_compress_level), 'png')
+    if job.upload_digest:
+        blob_store.set_ref(job.upload_digest, variant, digest, 'png')
+    return blob_store.url(digest, 'png')
+
+def annotation_variant(job, predictions):
+    """Ref name for an annotated rendering: display size plus a hash of what was drawn"""
+    drawn = json.dumps([[p['label'], [round(v, 2) for v in p['boxes']], round(p['score'], 4)] for p in predictions])
+    return f"annotated-{job.image.width}x{job.image.height}-{hashlib.sha256(drawn.encode()).hexdigest()[:16]}"
+
+def preprocess_job(job):
+    """Decode the upload (unless already decoded) and build the model input tensor"""
+    with memory_stats.stage('decode'):
+        if job.image is None:
+            job.upload_digest = digest_upload(job.image_data)
+            if job.pyramid:
+                job.image, job.pyramid_info = prepare_pyramid(job.image_data, job.upload_digest)
+            else:
+                job.image = open_image(job.image_data)
+            # Release the encoded upload as soon as it is decoded
+            if hasattr(job.image_data, 'close'):
+                job.image_data.close()
+            job.image_data = None
+        elif job.image.mode != 'RGB':
+            job.image = job.image.convert('RGB')
+
+    # Transform image for models
+    with memory_stats.stage('tensors'):
+        job.image_tensor = transform(job.image).unsqueeze(0) if torch_available else transform(job.image)
+    logger.debug("Image transformed to tensor")
+
+    # Cheap screening before the detectors; a short circuit skips the inference stage
+    if gating.enabled:
+        job.gate = gating.evaluate(job)
+        if job.gated:
+            logger.debug(f"Gate {job.gate.gate} short-circuited prediction: {job.gate.action}")
+            job.predictions = []
+    return job
+
+def detector_output(job, name, model):
+    """Raw output of one detector for the job's image: cached from an earlier request for the same upload, or a forward pass"""
+    raw = job.raw_outputs.get(name)
+    if raw is None and job.upload_digest:
+        raw = raw_output_cache.get(job.upload_digest, name)
+    if raw is None:
+        with torch_no_grad():
+            raw = model(job.image_tensor)
+        if job.upload_digest:
+            raw_output_cache.put(job.upload_digest, name, raw, job.image, job.pyramid_info)
+    return raw
+
+def detectors_for(job):
+    """Models a combined job runs: those owning its requested classes, at most one under a QoS profile that skips IT2"""
+    if job.model_type == 'it2':
+        return ('it2',)
+    models = route_models(job.classes)
+    if job.qos.skip_it2 and len(models) > 1:
+        models = ('it3',)
+    return models
+
+def infer_job(job):
+    """Run the requested model(s) on the prepared tensor"""
+    if job.gated:
+        return job
+    if job.model_type == 'it2':
+        # Use only IT2 model
+        logger.debug("Using only IT2 model for prediction as requested")
+        model_it2, _ = get_model()
+
+        if model_it2 is None:
+            raise PredictionError('IT2 model is not available', 500)
+
+        raw_predictions = detector_output(job, 'it2', model_it2)
+        filtered_predictions = apply_nms(raw_predictions, job.iou_threshold)
+        job.detectors = ('it2',)
+
+        # Format predictions from IT2 model
+        job.predictions = select_classes(it2_only_findings(filtered_predictions, job.effective_score_threshold),
+                                         job.classes)
+        job.emit('it2', job.predictions)
+    else:
+        # Use combined IT2+IT3 model (default), skipping a model none of the requested classes need
+        logger.debug("Using combined IT2+IT3 models for prediction")
+        job.detectors = detectors_for(job)
+        job.predictions = predict(job.image_tensor, checkpoint=lambda: job.ensure_active('it2'), on_findings=job.emit,
+                                  score_threshold=job.effective_score_threshold, iou_threshold=job.iou_threshold,
+                                  forward=lambda name, model: detector_output(job, name, model),
+                                  models=job.detectors, classes=job.classes)
+    return job
+
+def render_job(job):
+    """Draw the predictions and build the JSON response payload"""
+    _render_payload(job)
+    # Re-query the same image with other thresholds through /api/predict/requery
+    if job.upload_digest:
+        job.result["image_id"] = job.upload_digest
+    job.result["thresholds"] = {"score": job.effective_score_threshold, "iou": job.iou_threshold}
+    job.result["qos_profile"] = job.qos.name
+    job.result["detectors"] = list(job.detectors)
+    if job.classes is not None:
+        job.result["classes"] = sorted(job.classes)
+    if job.gate is not None:
+        job.result["gate"] = job.gate.to_dict()
+        if job.gated:
+            job.result["message"] = GATE_MESSAGES[job.gate.action]
+    return job
+
+def _render_payload(job):
+    predictions = job.predictions
+
+    if job.pyramid_info is not None:
+        # The viewer fetches tiles and draws overlays itself; no inline images to render
+        for prediction in predictions:
+            prediction['pyramid_box'] = to_pyramid_box(prediction['boxes'], job.pyramid_info)
+        job.result = {
+            "predictions": predictions,
+            "clean_image": None,
+            "annotated_image": None,
+            "image_size": {"width": 512, "height": 512},
+            "pyramid": job.pyramid_info,
+            "model_used": job.model_type
+        }
+        if len(predictions) == 0:
+            job.result["message"] = "No abnormalities detected with confidence above threshold"
+        return job
+
+    if job.image_delivery == 'none' or not job.qos.images:
+        # Findings only (machine clients, or shed under load): skip drawing and PNG encoding altogether
+        job.result = {
+            "predictions": predictions,
+            "clean_image": None,
+            "annotated_image": None,
+            "image_size": {"width": 512, "height": 512},
+            "model_used": job.model_type
+        }
+        if len(predictions) == 0:
+            job.result["message"] = "No abnormalities detected with confidence above threshold"
+        return job
+
+    preview_side = job.qos.preview_max_side
+    if preview_side and max(job.image.size) > preview_side:
+        # Reduced QoS profiles render a smaller preview
+        job.image.thumbnail((preview_side, preview_side), Image.BILINEAR)
+
+    # Also provide clean image for the UI (data URL, or a blob reused across repeat uploads)
+    with memory_stats.stage('encoding'):
+        clean_variant = f"clean-{job.image.width}x{job.image.height}"
+        clean_data_url = stored_image_url(job, clean_variant) or deliver_image(job, job.image, clean_variant)
+
+    # If no predictions were found after processing, log this clearly
+    if len(predictions) == 0:
+        if not job.gated:
+            logger.warning("No predictions met the confidence threshold!")
+        # Return empty predictions array but with a message in the response
+        job.result = {
+            "predictions": [],
+            "message": "No abnormalities detected with confidence above threshold",
+            "clean_image": clean_data_url,
+            "annotated_image": clean_data_url,  # Use clean image since there are no annotations
+            "image_size": {"width": 512, "height": 512},
+            "model_used": job.model_type
+        }
+        return job
+
+    annotated_variant = annotation_variant(job, predictions)
+    annotated_data_url = stored_image_url(job, annotated_variant)
+    if annotated_data_url is None:
+        # The clean image is already encoded, so draw in place instead of copying it
+        with memory_stats.stage('drawing'):
+            annotated_image = draw_predictions_on_image(job.image, predictions)
+        with memory_stats.stage('encoding'):
+            annotated_data_url = deliver_image(job, annotated_image, annotated_variant)
+
+    job.result = {
+        "predictions": predictions,
+        "clean_image": clean_data_url,
+        "annotated_image": annotated_data_url,
+        "image_size": {"width": 512, "height": 512},
+        "model_used": job.model_type
+    }
+    return job
+
+def as_prediction_error(error):
+    """Map an exception raised by any stage onto the PredictionError returned to the client"""
+    if isinstance(error, PredictionError):
+        return error
+    if isinstance(error, RequestCancelled):
+        logger.info(f"Abandoned prediction: {str(error)}")
+        return PredictionError(str(error), error.status_code, cancelled=error.reason)
+    if isinstance(error, IngestError):
+        logger.warning(f"Rejected upload: {str(error)}")
+        return PredictionError(str(error), error.status_code)
+    logger.error(f"Error processing image: {str(error)}", exc_info=error)
+    return PredictionError(f"Error processing image: {str(error)}", 500)
+
+def forward_job(job):
+    with memory_stats.stage('forward'):
+        return infer_job(job)
+
+def run_prediction_job(job):
+    """Run a job through every stage in order on the calling thread and return the response payload"""
+    try:
+        for stage, run_stage in (('preprocess', preprocess_job), ('inference', forward_job), ('postprocess', render_job)):
+            job.ensure_active(stage)
+            run_stage(job)
+    except Exception as e:
+        raise as_prediction_error(e)
+    return job.result
+
+def check_rate_limit(user):
+    """Raise a 429 PredictionError when the user's token bucket is empty"""
+    retry_after = rate_limiter.check(user)
+    if retry_after:
+        logger.warning(f"Rate limit exceeded for {user}")
+        raise PredictionError('Rate limit exceeded. Please slow down.', 429, retry_after=round(retry_after, 1))
+
+def _schedule_key(item):
+    """Scheduling class and fair-share user of a queued (job, future, queued_at) item"""
+    job = item[0]
+    return PRIORITY_RANK.get(job.priority, PRIORITY_RANK[DEFAULT_PRIORITY]), job.user
+
+# Stage pipeline shared by all requests: decoding and rendering of some requests
+# overlap with the forward pass of another, which keeps the inference stage busy.
+# The queues in front of the models serve urgent classes first and share each
+# class round-robin between users.
+prediction_pipeline = Pipeline([
+    Stage('preprocess', preprocess_job, workers=PIPELINE_PREPROCESS_WORKERS,
+          work_queue=FairShareQueue(PIPELINE_QUEUE_SIZE, _schedule_key)),
+    Stage('inference', forward_job, workers=PIPELINE_INFERENCE_WORKERS,
+          work_queue=FairShareQueue(PIPELINE_QUEUE_SIZE, _schedule_key), skip=lambda job: job.gated),
+    Stage('postprocess', render_job, workers=PIPELINE_POSTPROCESS_WORKERS),
+], on_error=as_prediction_error, before_stage=lambda job, stage: job.ensure_active(stage),
+   on_wait=qos.observe, name='prediction-pipeline')
+
+def submit_prediction_job(job):
+    """Queue a job on the stage pipeline; the returned future resolves to the job"""
+    # The profile is fixed at admission from the current queue waits
+    job.qos = qos.select(job)
+    try:
+        return prediction_pipeline.submit(job)
+    except PipelineFull:
+        logger.warning("Prediction pipeline is full, returning 503")
+        raise PredictionError('Server is busy. Please try again shortly.', 503)
+
+def execute_prediction_job(job):
+    """Run a job on the stage pipeline when enabled, otherwise inline, and return the response payload"""
+    if not PIPELINE_ENABLED:
+        return run_prediction_job(job)
+    return wait_for_job(job, submit_prediction_job(job)).result
+
+def start_prediction_job(job):
+    """Start a job without waiting for it: on the pipeline, or on its own thread when that is disabled"""
+    if PIPELINE_ENABLED:
+        return submit_prediction_job(job)
+    future = Future()
+    future.set_running_or_notify_cancel()
+
+    def run():
+        try:
+            run_prediction_job(job)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(job)
+    threading.Thread(target=run, name='prediction', daemon=True).start()
+    return future
+
+def wait_for_job(job, future):
+    """Wait for a pipeline job, polling its cancel token so abandoned requests stop early"""
+    token = job.cancel_token
+    while True:
+        try:
+            return future.result(timeout=DISCONNECT_POLL_SECONDS if token is not None else None)
+        except FutureTimeoutError:
+            try:
+                token.check('queued')
+            except RequestCancelled as e:
+                # Still queued: never started. Running: the next stage boundary drops it.
+                future.cancel()
+                raise as_prediction_error(e)
+
+def parse_thresholds(fields):
+    """Per-request (score_threshold, iou_threshold) from form or JSON fields; a missing score means the default"""
+    thresholds = []
+    for name, default in (('score_threshold', None), ('iou_threshold', DEFAULT_IOU_THRESHOLD)):
+        value = fields.get(name)
+        if value is None or value == '':
+            thresholds.append(default)
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise PredictionError(f"{name} must be a number", 400)
+        if not 0.0 <= value <= 1.0:
+            raise PredictionError(f"{name} must be between 0 and 1", 400)
+        thresholds.append(value)
+    return tuple(thresholds)
+
+def parse_classes(fields):
+    """Requested class names (a list, or comma-separated names) as a set, or None for every class"""
+    value = fields.get('classes')
+    if hasattr(fields, 'getlist') and len(fields.getlist('classes')) > 1:
+        value = fields.getlist('classes')
+    if value is None:
+        return None
+    names = value if isinstance(value, (list, tuple)) else str(value).split(',')
+    known = {name.lower(): name for name in classes_it2}
+    requested = set()
+    for name in names:
+        key = str(name).strip().lower()
+        if not key:
+            continue
+        if key not in known:
+            raise PredictionError(f"Unknown class '{str(name).strip()}'", 400, classes=list(classes_it2))
+        requested.add(known[key])
+    return requested or None
+
+def attach_reference(job, reference):
+    """Point a job at a server-local image; set its options first, they are part of the result cache key"""
+    try:
+        path, stat = resolve_image_path(str(reference))
+    except IngestError as e:
+        raise as_prediction_error(e)
+    job.source_path = path
+    job.source_key = file_identity(path, stat) + (job.model_type, job.pyramid, job.image_delivery,
+                                                  job.score_threshold, job.iou_threshold,
+                                                  tuple(sorted(job.classes)) if job.classes else None)
+
+def job_from_request():
+    """Rate-limit the caller and build a PredictionJob from the upload or a server-local image reference"""
+    ensure_models_ready()
+
+    # Refuse rate-limited users before the upload body is parsed
+    claims = g.get('user') or {}
+    user = claims.get('sub') or request.remote_addr or 'anonymous'
+    check_rate_limit(user)
+    # The deadline covers the whole request, including parsing the upload
+    cancel_token = CancelToken(
+        parse_timeout_ms(request.headers.get(REQUEST_TIMEOUT_HEADER)),
+        wsgi_disconnect_probe(request.environ),
+    )
+
+    # By-reference requests may be plain JSON; uploads are multipart forms
+    fields = (request.get_json(silent=True) or {}) if request.is_json else request.form
+
+    # Check if specific model type is requested
+    model_type = str(fields.get('model_type', 'combined')).lower()
+    logger.debug(f"Requested model type: {model_type}")
+    pyramid = str(fields.get('pyramid', 'false')).lower() == 'true'
+    priority = resolve_priority(claims, fields.get('priority'))
+    image_delivery = str(fields.get('image_delivery', IMAGE_DELIVERY)).lower()
+    if image_delivery not in IMAGE_DELIVERY_MODES:
+        image_delivery = IMAGE_DELIVERY
+    score_threshold, iou_threshold = parse_thresholds(fields)
+    classes = parse_classes(fields)
+
+    reference = fields.get('image_path') or fields.get('image_uri')
+    if reference:
+        # The file is only mapped on a cache miss
+        job = PredictionJob(None, model_type, pyramid=pyramid, priority=priority, user=user,
+                            image_delivery=image_delivery)
+        job.score_threshold, job.iou_threshold = score_threshold, iou_threshold
+        job.classes = classes
+        attach_reference(job, reference)
+        job.cancel_token = cancel_token
+        return job
+
+    # Get the uploaded image
+    if 'image' not in request.files:
+        logger.warning("No image file in request")
+        raise PredictionError('No image file provided', 400)
+
+    file = request.files['image']
+    if file.filename == '':
+        logger.warning("Empty filename in request")
+        raise PredictionError('No selected file', 400)
+
+    # Hand over the (already spooled) upload stream rather than reading it into memory
+    job = PredictionJob(file.stream, model_type, pyramid=pyramid, priority=priority, user=user,
+                        image_delivery=image_delivery)
+    job.score_threshold, job.iou_threshold = score_threshold, iou_threshold
+    job.classes = classes
+    job.cancel_token = cancel_token
+    return job
+
+def execute_request_job(job):
+    """Run a request's job, answering by-reference requests for unchanged files from the result cache"""
+    if job.source_key is None:
+        return execute_prediction_job(job), None
+    cached = cached_reference_result(job)
+    if cached is not None:
+        return cached, 'hit'
+    result = execute_prediction_job(job)
+    store_reference_result(job, result)
+    return result, 'miss'
+
+def refresh_blob_links(result):
+    """Copy of a cached response with its blob links signed again; None if a linked blob was evicted"""
+    refreshed = dict(result)
+    for key in ('clean_image', 'annotated_image'):
+        value = result.get(key)
+        if isinstance(value, str) and value.startswith('/api/blobs/'):
+            refreshed[key] = blob_store.relink(value)
+            if refreshed[key] is None:
+                return None
+    return refreshed
+
+def cached_reference_result(job):
+    """Cached response of a by-reference job for an unchanged file; on a miss the file is mapped for decoding"""
+    cached = reference_cache.get(job.source_key)
+    if cached is not None:
+        cached = refresh_blob_links(cached)
+    if cached is not None:
+        job.predictions = cached.get('predictions')
+        return cached
+    job.image_data = map_image(job.source_path)
+    return None
+
+def store_reference_result(job, result):
+    # Degraded answers are not kept; the next request for the file may get the full profile
+    if job.qos is FULL_QOS_PROFILE:
+        reference_cache.put(job.source_key, result)
+
+def prediction_error_response(error):
+    response = jsonify(error.to_dict())
+    if 'retry_after' in error.details:
+        response.headers['Retry-After'] = str(max(1, int(error.details['retry_after'] + 0.999)))
+    return response, error.status_code
+
 @model_bp.route('/predict', methods=['POST'])
 def predict_image():
     try:
-        logger.info("Received prediction request")
-        start_time = time.time()  # Define start_time for measuring performance
-        
         # Handle potential OPTIONS preflight request
         if request.method == 'OPTIONS':
             logger.info("Handling OPTIONS request for /predict")
             return jsonify({"message": "CORS preflight handled"}), 200
-            
-        # Check if PyTorch is available
-        if not torch_available:
-            logger.critical("PyTorch is not available - cannot process predictions!")
-            return jsonify({
-                'error': 'PyTorch is not installed on the server. Please install PyTorch by uncommenting it in requirements.txt.',
-                'fix': 'The server administrator needs to uncomment torch and torchvision in requirements.txt and run pip install -r requirements.txt'
-            }), 500
-            
-        # Ensure models are ready or loading
-        current_models = get_model()
-        if current_models[0] is None and model_loading:
-            logger.warning("Models are still loading, returning 503 Service Unavailable")
-            return jsonify({'error': 'Models are still loading. Please try again later.'}), 503
-        elif current_models[0] is None:
-            logger.error("Failed to load models")
-            return jsonify({
-                'error': 'Failed to load models. Check server logs for details.',
-                'details': 'The model files may be missing or corrupted. Ensure IT2_model_epoch_300.pth and IT3_model_epoch_260.pth exist in server/models.'
-            }), 500
-
-        # Get the uploaded image
-        if 'image' not in request.files:
-            logger.warning("No image file in request")
-            return jsonify({'error': 'No image file provided'}), 400
-            
-        file = request.files['image']
-        if file.filename == '':
-            logger.warning("Empty filename in request")
-            return jsonify({'error': 'No selected file'}), 400
-        
-        # Check if specific model type is requested
-        model_type = request.form.get('model_type', 'combined').lower()
-        logger.info(f"Requested model type: {model_type}")
-            
-        try:
-            # Read and process the image
-            image_data = file.read()
-            image = Image.open(io.BytesIO(image_data))
-            
-            # Convert to RGB if needed
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-                
-            # Create a clean copy for display
-            clean_display_image = image.copy()
-            
-            # Transform image for models
-            image_tensor = transform(image).unsqueeze(0) if torch_available else transform(image)
-            logger.info(f"Image transformed to tensor")
-            
-            # Get predictions using the specified model(s)
-            if model_type == 'it2':
-                # Use only IT2 model
-                logger.info("Using only IT2 model for prediction as requested")
-                model_it2, _ = get_model()
-                
-                if model_it2 is None:
-                    return jsonify({'error': 'IT2 model is not available'}), 500
-                
-                with torch_no_grad():
-                    raw_predictions = model_it2(image_tensor)
-                
-                filtered_predictions = apply_nms(raw_predictions, iou_threshold=0.5)
-                predictions = []
-                
-                # Format predictions from IT2 model
-                for i in range(len(filtered_predictions['boxes'])):
-                    box = filtered_predictions['boxes'][i].tolist()
-                    score = filtered_predictions['scores'][i].item()
-                    label_idx = filtered_predictions['labels'][i].item()
-                    
-                    # Skip low confidence predictions
-                    if score < 0.3:
-                        continue
-                        
-                    label = classes_it2[label_idx] if label_idx < len(classes_it2) else f"Unknown({label_idx})"
-                    
-                    predictions.append({
-                        'boxes': box,
-                        'score': score,
-                        'label': label
-                    })
-            else:
-                # Use combined IT2+IT3 model (default)
-                logger.info("Using combined IT2+IT3 models for prediction")
-            predictions = predict(image_tensor)
-            
-            logger.info(f"Processed predictions: {predictions}")
-            
-            # Draw predictions on the image
-            annotated_image = draw_predictions_on_image(clean_display_image.copy(), predictions)
-            
-            # Convert the annotated image to base64 and create data URL
-            buffered = io.BytesIO()
-            annotated_image.save(buffered, format="PNG")
-            annotated_img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
-            annotated_data_url = f"data:image/png;base64,{annotated_img_str}"
-            
-            # Also provide clean image for the UI as data URL
-            clean_buffered = io.BytesIO()
-            clean_display_image.save(clean_buffered, format="PNG")
-            clean_img_str = base64.b64encode(clean_buffered.getvalue()).decode('utf-8')
-            clean_data_url = f"data:image/png;base64,{clean_img_str}"
-            
-            elapsed = time.time() - start_time
-            logger.info(f"Total processing time: {elapsed:.2f} seconds")
-            
-            # If no predictions were found after processing, log this clearly
-            if len(predictions) == 0:
-                logger.warning("No predictions met the confidence threshold!")
-                # Return empty predictions array but with a message in the response
-                return jsonify({
-                    "predictions": [],
-                    "message": "No abnormalities detected with confidence above threshold",
-                    "clean_image": clean_data_url,
-                    "annotated_image": clean_data_url,  # Use clean image since there are no annotations
-                    "image_size": {"width": 512, "height": 512},
-                    "model_used": model_type
-                })
-            
-            response_data = {
-                "predictions": predictions,
-                "clean_image": clean_data_url,
-                "annotated_image": annotated_data_url,
-                "image_size": {"width": 512, "height": 512},
-                "model_used": model_type
-            }
-            return jsonify(response_data)
-            
-        except Exception as e:
-            logger.error(f"Error processing image: {str(e)}", exc_info=True)
-            return jsonify({'error': f"Error processing image: {str(e)}"}), 500
-        
+
+        job = job_from_request()
+        response_data, cache_status = execute_request_job(job)
+
+        # One compact summary per request, logged by the app's after_request hook
+        g.prediction_summary = job.summary()
+        with memory_stats.stage('json'):
+            response = jsonify(response_data)
+        if cache_status:
+            response.headers['X-Result-Cache'] = cache_status
+        memory_stats.record_request()
+        return response
+
+    except PredictionError as e:
+        return prediction_error_response(e)
+    except RequestEntityTooLarge:
+        logger.warning("Upload rejected: request body too large")
+        return jsonify({'error': f"Upload exceeds the {MAX_UPLOAD_MB:g} MB limit"}), 413
     except FileNotFoundError as e:
         logger.error(f"Model file not found: {str(e)}")
         return jsonify({'error': str(e), 'fix': 'Ensure the model files IT2_model_epoch_300.pth and IT3_model_epoch_260.pth exist in server/models'}), 503  # Service Unavailable
@@ -931,6 +1354,199 @@ def predict_image():
         logger.error(f"Prediction error: {str(e)}", exc_info=True)
         return jsonify({'error': f"Prediction error: {str(e)}"}), 500
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_job_events(job, future):
+    """Yield SSE events for a running job: findings per model as they finish, then images and the summary"""
+    token = job.cancel_token
+    last_sent = time.monotonic()
+    finished = False
+    try:
+        while True:
+            try:
+                event, findings = job.events.get(timeout=DISCONNECT_POLL_SECONDS)
+            except queue.Empty:
+                if future.done():
+                    break
+                if token is not None and token.poll() is not None:
+                    future.cancel()
+                if time.monotonic() - last_sent >= SSE_HEARTBEAT_SECONDS:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+                continue
+            last_sent = time.monotonic()
+            yield sse_event(event, {"findings": findings, "elapsed_ms": round((time.time() - job.start_time) * 1000, 2)})
+
+        # Everything the job emitted was queued before its future completed
+        while not job.events.empty():
+            event, findings = job.events.get_nowait()
+            yield sse_event(event, {"findings": findings, "elapsed_ms": round((time.time() - job.start_time) * 1000, 2)})
+
+        error = future.exception() if not future.cancelled() else RequestCancelled(token.reason or 'disconnected', 'queued')
+        if error is not None:
+            error = as_prediction_error(error)
+            yield sse_event('error', {"status": error.status_code, **error.to_dict()})
+        else:
+            result = dict(job.result)
+            yield sse_event('image', {"clean_image": result.pop("clean_image"),
+                                      "annotated_image": result.pop("annotated_image")})
+            yield sse_event('done', {**result, "processing_ms": job.summary()["processing_ms"]})
+            logger.info(f"Streamed prediction with {len(job.predictions or [])} findings", extra=job.summary())
+            memory_stats.record_request()
+        finished = True
+    finally:
+        if not finished:
+            # The client went away mid-stream; the job stops at its next stage boundary
+            if token is not None:
+                token.cancel('disconnected')
+            future.cancel()
+
+@model_bp.route('/predict/stream', methods=['POST'])
+def predict_image_stream():
+    """Server-Sent Events variant of /predict: it3, it2, image and done events as each part is ready"""
+    try:
+        job = job_from_request()
+        if job.source_path is not None:
+            job.image_data = map_image(job.source_path)
+        else:
+            # The request closes its uploads when this view returns, before the stream is written
+            upload = spooled_upload()
+            shutil.copyfileobj(job.image_data, upload)
+            upload.seek(0)
+            job.image_data = upload
+        job.events = queue.Queue()
+        future = start_prediction_job(job)
+    except PredictionError as e:
+        return prediction_error_response(e)
+    except RequestEntityTooLarge:
+        logger.warning("Upload rejected: request body too large")
+        return jsonify({'error': f"Upload exceeds the {MAX_UPLOAD_MB:g} MB limit"}), 413
+
+    return Response(stream_with_context(stream_job_events(job, future)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@model_bp.route('/predict/requery', methods=['POST'])
+def requery_prediction():
+    """Re-run postprocessing and rendering of an earlier prediction with other thresholds, reusing its detector outputs"""
+    try:
+        fields = request.get_json(silent=True) or {}
+        claims = g.get('user') or {}
+        user = claims.get('sub') or request.remote_addr or 'anonymous'
+        check_rate_limit(user)
+
+        image_id = str(fields.get('image_id', ''))
+        cached = raw_output_cache.entry(image_id) if image_id else None
+        if cached is None:
+            raise PredictionError('Unknown or expired image_id; submit the image to /api/predict again', 404)
+        image, pyramid_info, outputs = cached
+
+        model_type = str(fields.get('model_type', 'combined')).lower()
+        image_delivery = str(fields.get('image_delivery', IMAGE_DELIVERY)).lower()
+        if image_delivery not in IMAGE_DELIVERY_MODES:
+            image_delivery = IMAGE_DELIVERY
+        # Rendering draws on the image, so it gets its own copy of the cached one
+        job = PredictionJob(None, model_type, image=image.copy(), priority=resolve_priority(claims, fields.get('priority')),
+                            user=user, image_delivery=image_delivery)
+        job.upload_digest = image_id
+        job.pyramid_info = pyramid_info
+        job.raw_outputs = outputs
+        job.score_threshold, job.iou_threshold = parse_thresholds(fields)
+        job.classes = parse_classes(fields)
+
+        if all(name in outputs for name in detectors_for(job)):
+            # Postprocessing only: no decode, no forward pass and no queueing behind full predictions
+            try:
+                render_job(infer_job(job))
+            except Exception as e:
+                raise as_prediction_error(e)
+            response_data = job.result
+        else:
+            # A model this image has not been through yet (e.g. combined after an IT2-only request)
+            ensure_models_ready()
+            response_data = execute_prediction_job(job)
+
+        g.prediction_summary = job.summary()
+        memory_stats.record_request()
+        return jsonify(response_data)
+    except PredictionError as e:
+        return prediction_error_response(e)
+
+def _send_immutable(path, mimetype, etag):
+    """Serve a content-addressed file with a strong ETag and a long private cache lifetime"""
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=etag, max_age=TILE_CACHE_MAX_AGE)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+@model_bp.route('/tiles/<image_id>.dzi', methods=['GET'])
+def pyramid_descriptor(image_id):
+    """Deep Zoom descriptor for a pyramid built by /predict with pyramid=true"""
+    path = dzi_file(image_id)
+    if path is None:
+        return jsonify({'error': 'Unknown image'}), 404
+    return _send_immutable(path, 'application/xml', image_id)
+
+@model_bp.route('/tiles/<image_id>_files/<int:level>/<tile_name>', methods=['GET'])
+def pyramid_tile(image_id, level, tile_name):
+    """Serve one pyramid tile"""
+    path = tile_file(image_id, level, tile_name)
+    if path is None:
+        return jsonify({'error': 'Unknown tile'}), 404
+    mimetype = 'image/jpeg' if tile_name.endswith('.jpeg') else 'image/png'
+    return _send_immutable(path, mimetype, f"{image_id}-{level}-{tile_name}")
+
+@model_bp.route('/pipeline-stats', methods=['GET'])
+def pipeline_stats():
+    """Queue depth, busy workers and timings of each prediction stage"""
+    if not PIPELINE_ENABLED:
+        return jsonify({"enabled": False, "hint": "Set PIPELINE_ENABLED=true to run predictions as a stage pipeline"})
+    return jsonify({**prediction_pipeline.stats(), "rate_limit": rate_limiter.stats(),
+                    "reference_cache": reference_cache.stats(), "raw_output_cache": raw_output_cache.stats(),
+                    "qos": qos.stats()})
+
+@model_bp.route('/blobs/<digest>.<ext>', methods=['GET'])
+def blob(digest, ext):
+    """Serve a stored rendering; the signed URL replaces the bearer token so <img> tags can load it"""
+    path = blob_store.path(digest, ext)
+    if path is None or not blob_store.verify(digest, request.args.get('exp'), request.args.get('sig')):
+        return jsonify({'error': 'Image not found'}), 404
+    # send_file hands the open file to the server's file wrapper (sendfile under gunicorn)
+    return _send_immutable(path, MIMETYPES[ext], digest)
+
+@model_bp.route('/gate-stats', methods=['GET'])
+def gate_stats():
+    """How often the screening gates short-circuit the detectors"""
+    return jsonify(gating.stats())
+
+@model_bp.route('/gate-stats/reset', methods=['POST'])
+def gate_stats_reset():
+    gating.reset()
+    return jsonify({"reset": True})
+
+@model_bp.route('/memory-stats', methods=['GET'])
+def memory_stats_report():
+    """Per-stage peak allocations, RSS deltas and leak indicators (MEMORY_PROFILING=true)"""
+    top = request.args.get('top', default=0, type=int)
+    return jsonify(memory_stats.report(top=top))
+
+@model_bp.route('/memory-stats/reset', methods=['POST'])
+def memory_stats_reset():
+    """Clear the aggregates and retake the tracemalloc baseline on the next request"""
+    memory_stats.reset()
+    return jsonify({"reset": True})
+
+@model_bp.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe for load balancers: 200 once both models are loaded (or unloaded while idle), 503 otherwise"""
+    # Idle-unloaded models come back on the next prediction, so the node stays in rotation
+    is_ready = models_loaded() or model_memory.unloaded_reason is not None
+    response = {"ready": is_ready, "loading": model_loading, "pid": os.getpid()}
+    if PIPELINE_ENABLED:
+        response["queued"] = sum(stage.queue.qsize() for stage in prediction_pipeline.stages)
+    return jsonify(response), 200 if is_ready else 503
+
 @model_bp.route('/model-status', methods=['GET'])
 def model_status():
     """Return the status of model loading and deployment mode"""
@@ -955,9 +1571,17 @@ def model_status():
         mock_it2 = model_it2 is not None and hasattr(model_it2, 'is_mock')
         mock_it3 = model_it3 is not None and hasattr(model_it3, 'is_mock')
         
+        if models_loaded():
+            status = "ready"
+        elif model_memory.unloaded_reason is not None:
+            # Freed while idle; the next prediction reloads them
+            status = "unloaded"
+        else:
+            status = "loading"
+
         # Create descriptive response
         response = {
-            "status": "ready" if model_it2 is not None and model_it3 is not None else "loading",
+            "status": status,
             "loading": model_loading,
             "deployment_environment": deployment_environment,
             "using_mock_models": using_mock_models,
@@ -980,6 +1604,9 @@ def model_status():
             "notice": "Mock models provide realistic simulations but are not using the actual trained models" if using_mock_models
                      else ""
         }
+        if mock_it2 or mock_it3:
+            response["synthetic_cost"] = synthetic_cost.describe() if synthetic_cost else None
+        response["memory"] = {**model_memory.stats(), "weights": weight_sources()}
         
         return jsonify(response)
     except Exception as e:
@@ -0,0 +1,176 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Staged execution configuration
+PIPELINE_ENABLED = os.getenv('PIPELINE_ENABLED', 'true').lower() == 'true'
+PIPELINE_PREPROCESS_WORKERS = int(os.getenv('PIPELINE_PREPROCESS_WORKERS', '2'))
+PIPELINE_INFERENCE_WORKERS = int(os.getenv('PIPELINE_INFERENCE_WORKERS', '1'))
+PIPELINE_POSTPROCESS_WORKERS = int(os.getenv('PIPELINE_POSTPROCESS_WORKERS', '2'))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '8'))
+# How long a new request may wait for room in the first queue before it is refused
+PIPELINE_ADMIT_TIMEOUT = float(os.getenv('PIPELINE_ADMIT_TIMEOUT', '2'))
+
+
+class PipelineFull(Exception):
+    """The first stage's queue stayed full for longer than the admission timeout"""
+
+
+class Stage:
+    """One step of the pipeline: a bounded input queue drained by a fixed number of threads"""
+
+    def __init__(self, name, func, workers=1, queue_size=PIPELINE_QUEUE_SIZE, work_queue=None, skip=None):
+        self.name = name
+        self.func = func
+        self.skip = skip  # predicate: jobs it accepts bypass this stage
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue = work_queue if work_queue is not None else queue.Queue(maxsize=queue_size)
+        self.next = None
+        self._lock = threading.Lock()
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.service_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def put(self, item, timeout=None):
+        self.queue.put(item, timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            done = self.processed + self.failed
+            stats = {
+                "workers": self.workers,
+                "busy": self.busy,
+                "queue_depth": self.queue.qsize(),
+                "queue_capacity": self.queue_size,
+                "processed": self.processed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "skipped": self.skipped,
+                "mean_service_ms": round(self.service_seconds / done * 1000, 2) if done else 0.0,
+                "mean_queue_wait_ms": round(self.wait_seconds / done * 1000, 2) if done else 0.0,
+            }
+        if hasattr(self.queue, 'breakdown'):
+            stats["queued_by_class"] = self.queue.breakdown()
+        return stats
+
+
+class Pipeline:
+    """Run jobs through a chain of stages so that different requests overlap across stages.
+
+    Each stage's function takes the job and returns it. A stage blocks when the
+    next stage's queue is full, so a slow stage backs work up to admission,
+    where submit() refuses new jobs instead of letting queues grow unbounded.
+    `before_stage(job, stage_name)` may raise to drop a job before a stage runs.
+    `on_wait(stage_name, seconds)` is told how long each job waited for a stage.
+    """
+
+    def __init__(self, stages, on_error=None, before_stage=None, on_wait=None, name='pipeline'):
+        self.stages = stages
+        self.on_error = on_error
+        self.before_stage = before_stage
+        self.on_wait = on_wait
+        self.name = name
+        for current, following in zip(stages, stages[1:]):
+            current.next = following
+        self.rejected = 0
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            for stage in self.stages:
+                for i in range(stage.workers):
+                    threading.Thread(
+                        target=self._work, args=(stage,), name=f"{self.name}-{stage.name}-{i}", daemon=True
+                    ).start()
+            self._started = True
+            logger.info(f"Started {self.name}: " + ", ".join(f"{s.name} x{s.workers}" for s in self.stages))
+
+    def submit(self, job, timeout=PIPELINE_ADMIT_TIMEOUT):
+        """Queue a job on the first stage; the future resolves to the job once the last stage ran"""
+        self.start()
+        future = Future()
+        try:
+            self.stages[0].put((job, future, time.perf_counter()), timeout=timeout)
+        except queue.Full:
+            self.rejected += 1
+            raise PipelineFull(f"{self.stages[0].name} queue is full")
+        return future
+
+    def _work(self, stage):
+        first = stage is self.stages[0]
+        while True:
+            job, future, queued_at = stage.queue.get()
+            # Jobs whose caller already gave up are dropped before any work is done
+            if first and not future.set_running_or_notify_cancel():
+                stage.queue.task_done()
+                continue
+            if self.before_stage is not None:
+                try:
+                    self.before_stage(job, stage.name)
+                except Exception as e:
+                    with stage._lock:
+                        stage.dropped += 1
+                    stage.queue.task_done()
+                    future.set_exception(self.on_error(e) if self.on_error else e)
+                    continue
+
+            started = time.perf_counter()
+            with stage._lock:
+                stage.busy += 1
+                stage.wait_seconds += started - queued_at
+            if self.on_wait is not None:
+                self.on_wait(stage.name, started - queued_at)
+            error = None
+            try:
+                job = stage.func(job)
+            except Exception as e:
+                error = e
+            finally:
+                with stage._lock:
+                    stage.busy -= 1
+                    stage.service_seconds += time.perf_counter() - started
+                    if error is None:
+                        stage.processed += 1
+                    else:
+                        stage.failed += 1
+                stage.queue.task_done()
+
+            if error is not None:
+                future.set_exception(self.on_error(error) if self.on_error else error)
+                continue
+            following = self._next_stage(stage, job)
+            if following is None:
+                future.set_result(job)
+            else:
+                following.put((job, future, time.perf_counter()))
+
+    def _next_stage(self, stage, job):
+        """The next stage that does not skip this job, or None after the last"""
+        following = stage.next
+        while following is not None and following.skip is not None and following.skip(job):
+            with following._lock:
+                following.skipped += 1
+            following = following.next
+        return following
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "started": self._started,
+            "rejected": self.rejected,
+            "stages": {stage.name: stage.stats() for stage in self.stages},
+        }
+
@@ -0,0 +1,151 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Quality-of-service degradation: when jobs wait longer than the target in the prediction
+# pipeline's queues, new requests get cheaper profiles until the wait recovers.
+QOS_ENABLED = os.getenv('QOS_ENABLED', 'false').lower() == 'true'
+# Queue wait (summed over the pipeline stages) a request should not exceed
+QOS_TARGET_WAIT_MS = float(os.getenv('QOS_TARGET_WAIT_MS', '1000'))
+# Step back up once the smoothed wait is below this fraction of the target
+QOS_RECOVER_RATIO = float(os.getenv('QOS_RECOVER_RATIO', '0.5'))
+# Minimum seconds between two level changes, so a single burst does not swing the profile
+QOS_HOLD_SECONDS = float(os.getenv('QOS_HOLD_SECONDS', '5'))
+# Weight of each new queue-wait sample in the moving average
+QOS_SMOOTHING = float(os.getenv('QOS_SMOOTHING', '0.2'))
+# Longest side of rendered images under the reduced profiles
+QOS_PREVIEW_MAX_SIDE = int(os.getenv('QOS_PREVIEW_MAX_SIDE', '512'))
+# Deepest profile the controller may step down to
+QOS_FLOOR = os.getenv('QOS_FLOOR', 'predictions_only')
+# Priority classes always served at full quality
+QOS_EXEMPT_PRIORITIES = {p.strip() for p in os.getenv('QOS_EXEMPT_PRIORITIES', 'stat').split(',') if p.strip()}
+
+# Transitions kept for /api/pipeline-stats
+TRANSITION_HISTORY = 20
+
+
+class QosProfile:
+    """How much work a request gets: rendering size and effort, which detectors run, whether images are returned"""
+
+    def __init__(self, name, preview_max_side=None, png_compress_level=6, skip_it2=False, images=True):
+        self.name = name
+        self.preview_max_side = preview_max_side
+        self.png_compress_level = png_compress_level
+        self.skip_it2 = skip_it2  # combined requests report IT3 findings only
+        self.images = images
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "preview_max_side": self.preview_max_side,
+            "png_compress_level": self.png_compress_level,
+            "skip_it2": self.skip_it2,
+            "images": self.images,
+        }
+
+
+# Cheapest last; each level keeps the savings of the ones before it
+PROFILES = [
+    QosProfile('full'),
+    QosProfile('reduced_preview', preview_max_side=QOS_PREVIEW_MAX_SIDE, png_compress_level=1),
+    QosProfile('it3_only', preview_max_side=QOS_PREVIEW_MAX_SIDE, png_compress_level=1, skip_it2=True),
+    QosProfile('predictions_only', skip_it2=True, images=False),
+]
+FULL = PROFILES[0]
+
+
+class QosController:
+    """Picks the profile of new requests from a moving average of pipeline queue waits"""
+
+    def __init__(self, enabled=QOS_ENABLED, target_ms=QOS_TARGET_WAIT_MS, recover_ratio=QOS_RECOVER_RATIO,
+                 hold_seconds=QOS_HOLD_SECONDS, smoothing=QOS_SMOOTHING, floor=QOS_FLOOR):
+        self.enabled = enabled
+        self.target_ms = target_ms
+        self.recover_ratio = recover_ratio
+        self.hold_seconds = hold_seconds
+        self.smoothing = smoothing
+        names = [profile.name for profile in PROFILES]
+        self.max_level = names.index(floor) if floor in names else len(PROFILES) - 1
+        self.level = 0
+        self._stage_wait_ms = {}
+        self._changed_at = 0.0
+        self._sampled_at = 0.0
+        self._lock = threading.Lock()
+        self.served = {profile.name: 0 for profile in PROFILES}
+        self.transitions = deque(maxlen=TRANSITION_HISTORY)
+
+    @property
+    def wait_ms(self):
+        return sum(self._stage_wait_ms.values())
+
+    def observe(self, stage, wait_seconds):
+        """Record how long a job waited in front of a pipeline stage"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            previous = self._stage_wait_ms.get(stage)
+            sample = wait_seconds * 1000
+            self._stage_wait_ms[stage] = sample if previous is None else previous + self.smoothing * (sample - previous)
+            self._sampled_at = now
+            self._adjust(now)
+
+    def select(self, job):
+        """Profile for a newly admitted job"""
+        if not self.enabled or job.priority in QOS_EXEMPT_PRIORITIES:
+            profile = FULL
+        else:
+            now = time.monotonic()
+            with self._lock:
+                # No jobs went through lately, so nothing is queued: let the level recover
+                if self.level and now - self._sampled_at >= self.hold_seconds:
+                    self._stage_wait_ms.clear()
+                    self._adjust(now)
+                profile = PROFILES[self.level]
+        with self._lock:
+            self.served[profile.name] += 1
+        return profile
+
+    def _adjust(self, now):
+        if now - self._changed_at < self.hold_seconds:
+            return
+        wait_ms = self.wait_ms
+        if wait_ms > self.target_ms and self.level < self.max_level:
+            self._change(self.level + 1, wait_ms, now)
+        elif wait_ms < self.target_ms * self.recover_ratio and self.level > 0:
+            self._change(self.level - 1, wait_ms, now)
+
+    def _change(self, level, wait_ms, now):
+        previous, self.level = PROFILES[self.level], level
+        self._changed_at = now
+        self.transitions.append({
+            "at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "from": previous.name,
+            "to": PROFILES[level].name,
+            "wait_ms": round(wait_ms, 1),
+        })
+        log = logger.warning if level > PROFILES.index(previous) else logger.info
+        log(f"QoS profile {previous.name} -> {PROFILES[level].name} (queue wait {wait_ms:.0f} ms, target {self.target_ms:g} ms)")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "profile": PROFILES[self.level].name,
+                "level": self.level,
+                "floor": PROFILES[self.max_level].name,
+                "target_wait_ms": self.target_ms,
+                "wait_ms": round(self.wait_ms, 1),
+                "stage_wait_ms": {stage: round(ms, 1) for stage, ms in self._stage_wait_ms.items()},
+                "served": dict(self.served),
+                "transitions": list(self.transitions),
+                "profiles": [profile.to_dict() for profile in PROFILES],
+            }
+
+
+qos = QosController()
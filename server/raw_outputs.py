@@ -0,0 +1,106 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Memory for raw detector outputs and the decoded images they came from (0 disables the cache).
+# A 2048 px display image takes about 12 MB; the detector outputs themselves are a few KB.
+RAW_OUTPUT_CACHE_MB = float(os.getenv('RAW_OUTPUT_CACHE_MB', '256'))
+
+
+def _nbytes(value):
+    if hasattr(value, 'element_size'):
+        return value.element_size() * value.nelement()
+    return getattr(value, 'nbytes', 0)
+
+
+def detach_output(raw):
+    """Copy of a model's raw output (a list of box/score/label dicts) that holds no autograd state"""
+    return [{key: value.detach() if hasattr(value, 'detach') else value for key, value in output.items()}
+            for output in raw]
+
+
+class RawEntry:
+    """Decoded image of one upload plus the raw outputs of each detector run on it"""
+    __slots__ = ('image', 'pyramid_info', 'outputs', 'nbytes')
+
+    def __init__(self, image, pyramid_info):
+        self.image = image
+        self.pyramid_info = pyramid_info
+        self.outputs = {}
+        self.nbytes = image.width * image.height * len(image.getbands())
+
+
+class RawOutputCache:
+    """Byte-bounded LRU of raw detector outputs keyed by upload SHA-256, for re-running only postprocessing"""
+
+    def __init__(self, max_mb=RAW_OUTPUT_CACHE_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, digest, model):
+        """Raw output of `model` for an upload, or None"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            raw = entry.outputs.get(model) if entry is not None else None
+            if raw is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return raw
+
+    def entry(self, digest):
+        """Cached image, pyramid info and outputs of an upload (a snapshot), or None"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            self._entries.move_to_end(digest)
+            return entry.image, entry.pyramid_info, dict(entry.outputs)
+
+    def put(self, digest, model, raw, image, pyramid_info=None):
+        """Store a detector's raw output; the image is copied because rendering draws on it in place"""
+        if not self.enabled:
+            return
+        raw = detach_output(raw)
+        size = sum(_nbytes(value) for output in raw for value in output.values())
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                entry = self._entries[digest] = RawEntry(image.copy(), pyramid_info)
+                self._bytes += entry.nbytes
+            elif model in entry.outputs:
+                return
+            entry.outputs[model] = raw
+            entry.nbytes += size
+            self._bytes += size
+            self._entries.move_to_end(digest)
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+raw_output_cache = RawOutputCache()
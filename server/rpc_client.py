@@ -0,0 +1,142 @@
+"""
+Client for the CXRaide binary RPC interface (standard library only).
+
+Examples:
+    # Stream every file in a folder and print one JSON result per line
+    python rpc_client.py --token "$TOKEN" --port 50051 studies/*.dcm
+
+    # Throughput check: send the same image 200 times with 8 in flight
+    python rpc_client.py --token "$TOKEN" --repeat 200 film.png
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+
+try:
+    from rpc_protocol import (PROTOCOL_VERSION, DEFAULT_RPC_PORT, HELLO, PREDICT, RESULT, ERROR, END,
+                              ProtocolError, encode_frame, read_frame)
+except ImportError:
+    from server.rpc_protocol import (PROTOCOL_VERSION, DEFAULT_RPC_PORT, HELLO, PREDICT, RESULT, ERROR, END,
+                                     ProtocolError, encode_frame, read_frame)
+
+# Results are small JSON metadata; only requests carry image bodies
+MAX_RESPONSE_BODY_BYTES = 64 * 1024 * 1024
+
+
+class RpcError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class RpcClient:
+    """One authenticated connection; stream() pipelines requests over it"""
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_RPC_PORT, token=None, priority=None, timeout=120):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.sendall(encode_frame(HELLO, {"version": PROTOCOL_VERSION, "token": token, "priority": priority}))
+        frame_type, meta, _ = self._read()
+        if frame_type != HELLO:
+            raise RpcError(meta.get('error', 'Handshake failed'), meta.get('status'))
+        self.server_info = meta
+        self.max_inflight = meta.get('max_inflight', 1)
+
+    def _read(self):
+        frame = read_frame(self.sock, MAX_RESPONSE_BODY_BYTES)
+        if frame is None:
+            raise RpcError("Server closed the connection")
+        return frame
+
+    def stream(self, requests):
+        """Send (id, image_bytes, options) requests and yield result dicts as they complete.
+
+        Requests are written from a background thread, so the server sees a
+        continuous stream while results are read here; errors are yielded as
+        dicts with an `error` key rather than raised.
+        """
+        send_error = []
+
+        def sender():
+            try:
+                for request_id, image, options in requests:
+                    self.sock.sendall(encode_frame(PREDICT, {"id": request_id, **(options or {})}, image))
+                self.sock.sendall(encode_frame(END))
+            except Exception as e:
+                send_error.append(e)
+
+        thread = threading.Thread(target=sender, name='rpc-sender', daemon=True)
+        thread.start()
+        while True:
+            frame_type, meta, _ = self._read()
+            if frame_type == END:
+                break
+            if frame_type not in (RESULT, ERROR):
+                raise ProtocolError(f"Unexpected frame type {frame_type}")
+            yield meta
+        thread.join()
+        if send_error:
+            raise send_error[0]
+
+    def predict(self, image, **options):
+        """Single request convenience wrapper (closes the stream afterwards)"""
+        for result in self.stream([(0, image, options)]):
+            if 'error' in result:
+                raise RpcError(result['error'], result.get('status'))
+            return result
+
+    def close(self):
+        self.sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='+', help='Image files (PNG, JPEG or DICOM)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_RPC_PORT)
+    parser.add_argument('--token', default=os.getenv('CXRAIDE_TOKEN'), help='Bearer token (or CXRAIDE_TOKEN)')
+    parser.add_argument('--model-type', default='combined', choices=['combined', 'it2'])
+    parser.add_argument('--images-mode', default='none', choices=['none', 'url'],
+                        help="'url' also renders images into the HTTP API's blob store")
+    parser.add_argument('--classes', help='Comma-separated class names to report (default: all)')
+    parser.add_argument('--priority')
+    parser.add_argument('--timeout-ms', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='Send the image list this many times')
+    args = parser.parse_args(argv)
+
+    payloads = []
+    for path in args.images:
+        with open(path, 'rb') as f:
+            payloads.append((path, f.read()))
+    options = {"model_type": args.model_type, "images": args.images_mode, "timeout_ms": args.timeout_ms}
+    if args.classes:
+        options["classes"] = args.classes
+
+    def requests():
+        for round_index in range(args.repeat):
+            for index, (path, data) in enumerate(payloads):
+                yield f"{round_index}:{index}:{os.path.basename(path)}", data, options
+
+    client = RpcClient(args.host, args.port, token=args.token, priority=args.priority)
+    started = time.perf_counter()
+    completed = failed = 0
+    try:
+        for result in client.stream(requests()):
+            if 'error' in result:
+                failed += 1
+            else:
+                completed += 1
+            print(json.dumps(result))
+    finally:
+        client.close()
+    elapsed = time.perf_counter() - started
+    print(f"{completed} ok, {failed} failed in {elapsed:.2f}s ({completed / elapsed:.1f} images/s)", file=sys.stderr)
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
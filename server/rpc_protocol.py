@@ -0,0 +1,73 @@
+"""
+Framing for the CXRaide binary RPC interface (see rpc_server.py).
+
+Every message is one frame:
+
+    uint32 body length | uint8 type | uint32 meta length | meta | body
+
+All integers are big-endian. `meta` is a small UTF-8 JSON object and `body`
+carries raw bytes (the encoded image of a PREDICT frame), so images travel
+without base64. The client opens with HELLO, may then send any number of
+PREDICT frames without waiting, and receives one RESULT or ERROR per request
+id, in completion order. END from the client asks the server to finish the
+outstanding requests, answer with END and close.
+"""
+import json
+import struct
+
+PROTOCOL_VERSION = 1
+DEFAULT_RPC_PORT = 50051
+
+HELLO = 1
+PREDICT = 2
+RESULT = 3
+ERROR = 4
+END = 5
+
+FRAME_TYPES = {HELLO: 'HELLO', PREDICT: 'PREDICT', RESULT: 'RESULT', ERROR: 'ERROR', END: 'END'}
+
+HEADER = struct.Struct('>IBI')
+# Meta objects are small: request options or one response's findings
+MAX_META_BYTES = 1024 * 1024
+
+
+class ProtocolError(Exception):
+    """The peer sent something that is not a valid frame"""
+
+
+def encode_frame(frame_type, meta=None, body=b''):
+    meta_bytes = json.dumps(meta or {}, separators=(',', ':')).encode()
+    return HEADER.pack(len(body), frame_type, len(meta_bytes)) + meta_bytes + bytes(body)
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            return None
+        received += count
+    return bytes(buffer)
+
+
+def read_frame(sock, max_body_bytes):
+    """Read one frame as (type, meta, body); None on a clean close between frames"""
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    body_length, frame_type, meta_length = HEADER.unpack(header)
+    if frame_type not in FRAME_TYPES:
+        raise ProtocolError(f"Unknown frame type {frame_type}")
+    if meta_length > MAX_META_BYTES or body_length > max_body_bytes:
+        raise ProtocolError(f"Frame too large ({meta_length} meta, {body_length} body bytes)")
+    meta_bytes = _recv_exact(sock, meta_length) if meta_length else b''
+    body = _recv_exact(sock, body_length) if body_length else b''
+    if meta_bytes is None or body is None:
+        raise ProtocolError("Connection closed mid-frame")
+    try:
+        meta = json.loads(meta_bytes) if meta_bytes else {}
+    except ValueError as e:
+        raise ProtocolError(f"Invalid frame metadata: {str(e)}")
+    return frame_type, meta, body
@@ -0,0 +1,269 @@
+"""
+Binary streaming RPC interface for service-to-service inference (e.g. PACS).
+
+Clients open a TCP connection, authenticate once with the same bearer token
+as the HTTP API, and then stream raw image bytes (PNG, JPEG or DICOM) as
+PREDICT frames without waiting for earlier answers. Each request runs through
+the same prediction pipeline as /api/predict, and its findings come back as a
+RESULT frame as soon as it completes. There is no multipart, base64 or CORS
+on this path. See rpc_protocol.py for the framing and rpc_client.py for a
+client.
+
+Run with:
+    python rpc_server.py --port 50051                   # RPC only
+    python rpc_server.py --port 50051 --http-port 5000  # RPC and the Flask app on the same models
+"""
+import os
+import sys
+import time
+import queue
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from app import app as flask_app
+    from auth import verify_token, REQUIRE_API_AUTH
+    from model_service import (PredictionJob, PredictionError, ensure_models_ready, run_prediction_job,
+                               submit_prediction_job, check_rate_limit, as_prediction_error, parse_thresholds,
+                               parse_classes, PIPELINE_ENABLED)
+    from scheduler import resolve_priority
+    from cancellation import CancelToken, parse_timeout_ms
+    from image_ingest import MAX_UPLOAD_BYTES
+    from rpc_protocol import (PROTOCOL_VERSION, DEFAULT_RPC_PORT, HELLO, PREDICT, RESULT, ERROR, END,
+                              ProtocolError, encode_frame, read_frame)
+except ImportError:
+    from server.app import app as flask_app
+    from server.auth import verify_token, REQUIRE_API_AUTH
+    from server.model_service import (PredictionJob, PredictionError, ensure_models_ready, run_prediction_job,
+                                      submit_prediction_job, check_rate_limit, as_prediction_error,
+                                      parse_thresholds, parse_classes, PIPELINE_ENABLED)
+    from server.scheduler import resolve_priority
+    from server.cancellation import CancelToken, parse_timeout_ms
+    from server.image_ingest import MAX_UPLOAD_BYTES
+    from server.rpc_protocol import (PROTOCOL_VERSION, DEFAULT_RPC_PORT, HELLO, PREDICT, RESULT, ERROR, END,
+                                     ProtocolError, encode_frame, read_frame)
+
+logger = logging.getLogger(__name__)
+
+RPC_PORT = int(os.getenv('RPC_PORT', str(DEFAULT_RPC_PORT)))
+# Requests one connection may have outstanding; further frames are not read until one completes
+RPC_MAX_INFLIGHT = int(os.getenv('RPC_MAX_INFLIGHT', '8'))
+# Connections served at once (each holds a reader and a writer thread); further clients get a 503 ERROR
+RPC_MAX_CONNECTIONS = int(os.getenv('RPC_MAX_CONNECTIONS', '64'))
+# Time a new connection has to complete its HELLO before it is dropped
+RPC_HANDSHAKE_TIMEOUT_SECONDS = float(os.getenv('RPC_HANDSHAKE_TIMEOUT_SECONDS', '10'))
+# Threads that run predictions when the stage pipeline is disabled
+RPC_INFERENCE_WORKERS = int(os.getenv('RPC_INFERENCE_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Images are only rendered on request; 'url' stores them in the blob store for the HTTP API to serve
+RPC_IMAGE_MODES = ('none', 'url')
+
+_executor = None if PIPELINE_ENABLED else ThreadPoolExecutor(RPC_INFERENCE_WORKERS, thread_name_prefix='rpc-infer')
+
+
+class RpcConnection(socketserver.BaseRequestHandler):
+    """One client connection: a reader (this thread) and a writer thread sharing the socket"""
+
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.outbox = queue.Queue()
+        self.inflight = threading.BoundedSemaphore(RPC_MAX_INFLIGHT)
+        self.tokens = {}
+        self.tokens_lock = threading.Lock()
+        self.closed = False
+        self.claims = {}
+        self.user = self.client_address[0]
+        self.priority = None
+        self.requests = 0
+        self.writer = threading.Thread(target=self._write_loop, name='rpc-writer', daemon=True)
+        self.writer.start()
+
+    def _write_loop(self):
+        while True:
+            frame = self.outbox.get()
+            if frame is None:
+                return
+            try:
+                self.request.sendall(frame)
+            except OSError:
+                self._abandon()
+                return
+
+    def send(self, frame_type, meta=None, body=b''):
+        self.outbox.put(encode_frame(frame_type, meta, body))
+
+    def _abandon(self):
+        """The client is gone: outstanding jobs are dropped at their next stage boundary"""
+        self.closed = True
+        with self.tokens_lock:
+            for token in self.tokens.values():
+                token.cancel('disconnected')
+
+    def handle(self):
+        started = time.perf_counter()
+        try:
+            if not self._handshake():
+                return
+            while True:
+                frame = read_frame(self.request, MAX_UPLOAD_BYTES)
+                if frame is None:
+                    self._abandon()
+                    return
+                frame_type, meta, body = frame
+                if frame_type == END:
+                    # Wait for every outstanding request before confirming the end of the stream
+                    for _ in range(RPC_MAX_INFLIGHT):
+                        self.inflight.acquire()
+                    self.send(END, {"requests": self.requests})
+                    return
+                if frame_type != PREDICT:
+                    raise ProtocolError(f"Unexpected frame type {frame_type}")
+                self.inflight.acquire()
+                self._start(meta, body)
+        except ProtocolError as e:
+            logger.warning(f"RPC protocol error from {self.client_address[0]}: {str(e)}")
+            self.send(ERROR, {"error": str(e), "status": 400})
+        except OSError as e:
+            logger.info(f"RPC connection from {self.client_address[0]} lost: {str(e)}")
+            self._abandon()
+        finally:
+            self.outbox.put(None)
+            self.writer.join(timeout=30)
+            logger.info(f"RPC connection from {self.client_address[0]} closed after {self.requests} requests "
+                        f"in {time.perf_counter() - started:.1f}s")
+
+    def _handshake(self):
+        # Idle or trickling clients must not hold a connection slot before they authenticate
+        self.request.settimeout(RPC_HANDSHAKE_TIMEOUT_SECONDS or None)
+        try:
+            frame = read_frame(self.request, 0)
+        except socket.timeout:
+            logger.warning(f"RPC handshake from {self.client_address[0]} timed out")
+            return False
+        # Streams may then pause between requests for as long as they like
+        self.request.settimeout(None)
+        if frame is None:
+            return False
+        frame_type, meta, _ = frame
+        if frame_type != HELLO:
+            raise ProtocolError("Expected HELLO")
+        if meta.get('version', PROTOCOL_VERSION) != PROTOCOL_VERSION:
+            self.send(ERROR, {"error": f"Unsupported protocol version {meta.get('version')}", "status": 400})
+            return False
+        if REQUIRE_API_AUTH:
+            try:
+                self.claims = verify_token(meta.get('token'), flask_app.config['SECRET_KEY'])
+            except Exception as e:
+                logger.warning(f"RPC token validation error: {str(e)}")
+                self.send(ERROR, {"error": "Token is invalid!", "status": 401})
+                return False
+        self.user = self.claims.get('sub') or self.user
+        self.priority = meta.get('priority')
+        self.send(HELLO, {"version": PROTOCOL_VERSION, "max_inflight": RPC_MAX_INFLIGHT,
+                          "max_image_bytes": MAX_UPLOAD_BYTES, "image_modes": list(RPC_IMAGE_MODES)})
+        return True
+
+    def _start(self, meta, body):
+        request_id = meta.get('id', self.requests)
+        self.requests += 1
+        try:
+            ensure_models_ready()
+            check_rate_limit(self.user)
+            if not body:
+                raise PredictionError('No image data provided', 400)
+            images = str(meta.get('images', 'none')).lower()
+            job = PredictionJob(body, str(meta.get('model_type', 'combined')).lower(),
+                                priority=resolve_priority(self.claims, meta.get('priority') or self.priority),
+                                user=self.user, image_delivery=images if images in RPC_IMAGE_MODES else 'none')
+            job.score_threshold, job.iou_threshold = parse_thresholds(meta)
+            job.classes = parse_classes(meta)
+            job.cancel_token = CancelToken(parse_timeout_ms(meta.get('timeout_ms')), lambda: self.closed)
+            with self.tokens_lock:
+                self.tokens[request_id] = job.cancel_token
+            if PIPELINE_ENABLED:
+                future = submit_prediction_job(job)
+            else:
+                future = _executor.submit(run_prediction_job, job)
+        except Exception as e:
+            self._finish(request_id, None, as_prediction_error(e))
+            return
+        future.add_done_callback(lambda f: self._finish(request_id, job, f.exception()))
+
+    def _finish(self, request_id, job, error):
+        with self.tokens_lock:
+            self.tokens.pop(request_id, None)
+        try:
+            if error is not None:
+                error = as_prediction_error(error)
+                self.send(ERROR, {"id": request_id, "status": error.status_code, **error.to_dict()})
+            else:
+                self.send(RESULT, {"id": request_id, **job.result, "processing_ms": job.summary()["processing_ms"]})
+        finally:
+            self.inflight.release()
+
+
+class RpcServer(socketserver.ThreadingTCPServer):
+    """Thread per connection, up to max_connections at once"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, max_connections=RPC_MAX_CONNECTIONS):
+        self.connection_slots = threading.BoundedSemaphore(max_connections)
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        if not self.connection_slots.acquire(blocking=False):
+            logger.warning(f"Refusing RPC connection from {client_address[0]}: connection limit reached")
+            try:
+                request.sendall(encode_frame(ERROR, {"error": "Too many connections", "status": 503}))
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self.connection_slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.connection_slots.release()
+
+
+def serve(host='0.0.0.0', port=RPC_PORT, max_connections=RPC_MAX_CONNECTIONS):
+    server = RpcServer((host, port), RpcConnection, max_connections)
+    logger.info(f"RPC server listening on {host}:{server.server_address[1]} "
+                f"(pipeline: {PIPELINE_ENABLED}, max in-flight per connection: {RPC_MAX_INFLIGHT}, "
+                f"max connections: {max_connections})")
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=RPC_PORT)
+    parser.add_argument('--http-port', type=int, default=0, help='Also serve the Flask app from this process')
+    args = parser.parse_args(argv)
+
+    server = serve(args.host, args.port)
+    if args.http_port:
+        threading.Thread(target=server.serve_forever, name='rpc-server', daemon=True).start()
+        flask_app.run(host=args.host, port=args.http_port, threaded=True)
+    else:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
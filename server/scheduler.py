@@ -0,0 +1,195 @@
+import os
+import time
+import queue
+import threading
+from collections import OrderedDict, deque
+
+# Priority classes, most urgent first
+PRIORITY_CLASSES = ('stat', 'urgent', 'routine', 'bulk')
+PRIORITY_RANK = {name: rank for rank, name in enumerate(PRIORITY_CLASSES)}
+DEFAULT_PRIORITY = os.getenv('DEFAULT_PRIORITY', 'routine').lower()
+# Highest class a request may ask for when its token carries no `priority` claim
+PRIORITY_CAP_WITHOUT_CLAIM = os.getenv('PRIORITY_CAP_WITHOUT_CLAIM', 'routine').lower()
+# `priority` claims granted at login, as comma-separated user:class pairs (e.g. "dr.lee:stat,triage:urgent")
+USER_PRIORITIES = os.getenv('USER_PRIORITIES', '')
+# Stat items may overfill a full queue by this many before they wait like the rest
+STAT_QUEUE_HEADROOM = int(os.getenv('STAT_QUEUE_HEADROOM', '4'))
+
+# Per-user token bucket for /api/predict (0 disables rate limiting)
+RATE_LIMIT_PER_MINUTE = float(os.getenv('RATE_LIMIT_PER_MINUTE', '0'))
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', '10'))
+# Buckets idle this long are dropped so the table does not grow without bound
+RATE_LIMIT_IDLE_SECONDS = 600
+
+
+def parse_user_priorities(spec):
+    """user -> class map from USER_PRIORITIES; entries with an unknown class are ignored"""
+    priorities = {}
+    for entry in spec.split(','):
+        user, _, name = entry.strip().rpartition(':')
+        if user and name.strip().lower() in PRIORITY_RANK:
+            priorities[user.strip()] = name.strip().lower()
+    return priorities
+
+
+_user_priorities = parse_user_priorities(USER_PRIORITIES)
+
+
+def user_priority(username):
+    """Class to put in a user's `priority` claim, or None to leave it to PRIORITY_CAP_WITHOUT_CLAIM"""
+    return _user_priorities.get(username)
+
+
+def resolve_priority(claims, requested=None):
+    """Priority for a request: the requested class, capped by the token's `priority` claim.
+
+    Tokens without a claim are capped at PRIORITY_CAP_WITHOUT_CLAIM, and admin
+    tokens may use any class. Unknown names fall back to the claim or default.
+    """
+    claims = claims or {}
+    claimed = str(claims.get('priority', '')).lower()
+    if claimed in PRIORITY_RANK:
+        cap = claimed
+    elif claims.get('is_admin'):
+        cap = PRIORITY_CLASSES[0]
+    elif PRIORITY_CAP_WITHOUT_CLAIM in PRIORITY_RANK:
+        cap = PRIORITY_CAP_WITHOUT_CLAIM
+    else:
+        cap = DEFAULT_PRIORITY
+
+    requested = (requested or '').lower()
+    if requested not in PRIORITY_RANK:
+        requested = claimed if claimed in PRIORITY_RANK else DEFAULT_PRIORITY
+    # Requests may lower their own priority but never raise it above the cap
+    return requested if PRIORITY_RANK[requested] >= PRIORITY_RANK[cap] else cap
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second, burst):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """Consume one token; return 0 on success or the seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Per-user token buckets (per process: each gunicorn worker keeps its own)"""
+
+    def __init__(self, per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST):
+        self.rate = per_minute / 60.0
+        self.burst = max(burst, 1)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.allowed = 0
+        self.limited = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def check(self, user):
+        """Return 0 when the request may proceed, otherwise the seconds to wait before retrying"""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep > RATE_LIMIT_IDLE_SECONDS:
+                self._buckets = {u: b for u, b in self._buckets.items() if now - b.updated < RATE_LIMIT_IDLE_SECONDS}
+                self._last_sweep = now
+            bucket = self._buckets.get(user)
+            if bucket is None:
+                bucket = self._buckets[user] = TokenBucket(self.rate, self.burst)
+            wait = bucket.take(now)
+            if wait:
+                self.limited += 1
+            else:
+                self.allowed += 1
+            return wait
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "per_minute": self.rate * 60,
+                "burst": self.burst,
+                "tracked_users": len(self._buckets),
+                "allowed": self.allowed,
+                "limited": self.limited,
+            }
+
+
+class FairShareQueue:
+    """Bounded queue serving the most urgent priority class first, round-robin between users.
+
+    A drop-in for queue.Queue in a pipeline stage. `key(item)` returns the
+    item's (priority rank, user). Items of the top class may overfill a full
+    queue by `stat_headroom`, so a saturated node still takes urgent reads
+    without the top class growing the queue without bound.
+    """
+
+    def __init__(self, maxsize, key, stat_headroom=STAT_QUEUE_HEADROOM):
+        self.maxsize = maxsize
+        self.key = key
+        self.stat_headroom = stat_headroom
+        self._levels = [OrderedDict() for _ in PRIORITY_CLASSES]  # per class: user -> deque of items
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def put(self, item, timeout=None):
+        rank, user = self.key(item)
+        with self._cond:
+            if self.maxsize > 0:
+                limit = self.maxsize + (self.stat_headroom if rank == 0 else 0)
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self._size >= limit:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise queue.Full
+                    self._cond.wait(remaining)
+            self._levels[rank].setdefault(user, deque()).append(item)
+            self._size += 1
+            self._cond.notify_all()
+
+    def get(self):
+        with self._cond:
+            while self._size == 0:
+                self._cond.wait()
+            for users in self._levels:
+                if users:
+                    user, items = next(iter(users.items()))
+                    item = items.popleft()
+                    if items:
+                        # The next item of this class goes to the following user
+                        users.move_to_end(user)
+                    else:
+                        del users[user]
+                    self._size -= 1
+                    self._cond.notify_all()
+                    return item
+
+    def task_done(self):
+        pass
+
+    def qsize(self):
+        return self._size
+
+    def breakdown(self):
+        """Queued items per priority class, and how many users each class spans"""
+        with self._cond:
+            return {
+                name: {"queued": sum(len(items) for items in users.values()), "users": len(users)}
+                for name, users in zip(PRIORITY_CLASSES, self._levels)
+            }
+
+
+rate_limiter = RateLimiter()
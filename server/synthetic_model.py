@@ -0,0 +1,190 @@
+import os
+import time
+import hashlib
+import logging
+
+import numpy as np
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+logger = logging.getLogger(__name__)
+
+# Synthetic (mock) model cost profile: none | calibrate | custom
+#   none      - return detections immediately
+#   calibrate - time one forward pass of an untrained SSD300-VGG16 at startup and emulate that per image
+#   custom    - use SYNTHETIC_LATENCY_MS / SYNTHETIC_BATCH_OVERHEAD_MS as given
+SYNTHETIC_PROFILE = os.getenv('SYNTHETIC_PROFILE', 'none').lower()
+SYNTHETIC_LATENCY_MS = float(os.getenv('SYNTHETIC_LATENCY_MS', '0'))
+SYNTHETIC_BATCH_OVERHEAD_MS = float(os.getenv('SYNTHETIC_BATCH_OVERHEAD_MS', '0'))
+# Share of the emulated latency spent burning CPU (the rest sleeps, like waiting on an accelerator)
+SYNTHETIC_CPU_FRACTION = float(os.getenv('SYNTHETIC_CPU_FRACTION', '1.0'))
+# Relative per-call latency jitter, e.g. 0.1 for +/-10%
+SYNTHETIC_JITTER = float(os.getenv('SYNTHETIC_JITTER', '0.05'))
+
+MODEL_INPUT_SIZE = 512
+# Stride used to sample the input when fingerprinting an image
+FINGERPRINT_STRIDE = 8
+
+# Typical findings for CXR abnormalities: candidate boxes in 512x512 model space and a score range
+COMMON_FINDINGS = {
+    'Cardiomegaly': {'boxes': [[180, 150, 340, 300]], 'score_range': (0.75, 0.95)},
+    'Pleural thickening': {'boxes': [[100, 150, 170, 350], [350, 150, 420, 350]], 'score_range': (0.65, 0.85)},
+    'Pulmonary fibrosis': {'boxes': [[150, 100, 250, 200], [270, 100, 370, 200]], 'score_range': (0.70, 0.90)},
+    'Pleural effusion': {'boxes': [[80, 250, 150, 400], [370, 250, 440, 400]], 'score_range': (0.72, 0.92)},
+    'Nodule/Mass': {'boxes': [[150, 120, 190, 160], [300, 140, 340, 180], [220, 200, 260, 240]], 'score_range': (0.60, 0.80)},
+    'Infiltration': {'boxes': [[120, 120, 220, 220], [300, 120, 400, 220]], 'score_range': (0.68, 0.88)},
+    'Consolidation': {'boxes': [[120, 220, 220, 320], [300, 220, 400, 320]], 'score_range': (0.63, 0.83)},
+    'Atelectasis': {'boxes': [[100, 150, 200, 350], [320, 150, 420, 350]], 'score_range': (0.67, 0.87)},
+    'Pneumothorax': {'boxes': [[50, 100, 120, 300], [400, 100, 470, 300]], 'score_range': (0.73, 0.93)},
+}
+
+
+def _as_batch(inputs):
+    """Normalize model input to a float32 numpy array of shape (N, C, H, W)"""
+    if torch is not None and isinstance(inputs, torch.Tensor):
+        array = inputs.detach().cpu().numpy()
+    elif isinstance(inputs, (list, tuple)):
+        # torchvision detection models also accept a list of CHW tensors
+        return np.stack([_as_batch(item)[0] for item in inputs]) if inputs else np.zeros((0, 3, 1, 1), np.float32)
+    elif hasattr(inputs, 'convert'):
+        # PIL image
+        array = np.asarray(inputs.convert('RGB'), dtype=np.float32).transpose(2, 0, 1) / 255.0
+    else:
+        array = np.asarray(inputs, dtype=np.float32)
+    if array.ndim == 3:
+        array = array[None]
+    return array
+
+
+def image_fingerprint(image):
+    """Stable per-image seed and summary statistics of one CHW array, computed vectorized"""
+    sample = np.ascontiguousarray(image[:, ::FINGERPRINT_STRIDE, ::FINGERPRINT_STRIDE], dtype=np.float32)
+    seed = int.from_bytes(hashlib.blake2b(sample.tobytes(), digest_size=8).digest(), 'little')
+    return seed, float(sample.mean()), float(sample.std())
+
+
+def calibrate_latency_ms(runs=2):
+    """Mean per-image forward time of an untrained SSD300-VGG16 at the service's input size"""
+    if torch is None:
+        logger.warning("Cannot calibrate synthetic latency without PyTorch; using no emulated cost")
+        return 0.0
+    import torchvision.models as models
+    model = models.detection.ssd300_vgg16(weights=None, weights_backbone=None).eval()
+    sample = torch.zeros(1, 3, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE)
+    with torch.no_grad():
+        model(sample)  # warm-up
+        started = time.perf_counter()
+        for _ in range(runs):
+            model(sample)
+    latency = (time.perf_counter() - started) / runs * 1000
+    logger.info(f"Calibrated synthetic model latency: {latency:.1f} ms per image")
+    return latency
+
+
+class CostProfile:
+    """Latency and CPU usage emulated per forward call"""
+
+    def __init__(self, latency_ms=0.0, batch_overhead_ms=0.0, cpu_fraction=1.0, jitter=0.0):
+        self.latency_ms = latency_ms
+        self.batch_overhead_ms = batch_overhead_ms
+        self.cpu_fraction = min(max(cpu_fraction, 0.0), 1.0)
+        self.jitter = jitter
+        # Working set for the busy loop; BLAS releases the GIL like torch's kernels do
+        self._a = np.random.default_rng(0).random((256, 256), dtype=np.float32)
+
+    @classmethod
+    def from_env(cls):
+        if SYNTHETIC_PROFILE == 'calibrate':
+            latency = calibrate_latency_ms()
+        elif SYNTHETIC_PROFILE == 'custom':
+            latency = SYNTHETIC_LATENCY_MS
+        else:
+            return cls()
+        return cls(latency, SYNTHETIC_BATCH_OVERHEAD_MS, SYNTHETIC_CPU_FRACTION, SYNTHETIC_JITTER)
+
+    @property
+    def active(self):
+        return self.latency_ms > 0 or self.batch_overhead_ms > 0
+
+    def spend(self, batch_size, rng):
+        """Block for the emulated duration of a forward pass over batch_size images"""
+        if not self.active:
+            return
+        total = (self.batch_overhead_ms + self.latency_ms * batch_size) / 1000
+        if self.jitter:
+            total *= 1 + rng.uniform(-self.jitter, self.jitter)
+        busy_until = time.perf_counter() + total * self.cpu_fraction
+        while time.perf_counter() < busy_until:
+            self._a @ self._a
+        idle = total * (1 - self.cpu_fraction)
+        if idle > 0:
+            time.sleep(idle)
+
+    def describe(self):
+        return {
+            "profile": SYNTHETIC_PROFILE,
+            "latency_ms_per_image": round(self.latency_ms, 2),
+            "batch_overhead_ms": self.batch_overhead_ms,
+            "cpu_fraction": self.cpu_fraction,
+            "jitter": self.jitter,
+        }
+
+
+class SyntheticModel:
+    """Mock detector with the real models' input/output contract, for development and capacity tests.
+
+    Detections are derived from a hash of the image content, so the same image
+    always gets the same findings, without touching global random state. Each
+    call accepts a batch and emulates the configured cost profile.
+    """
+
+    def __init__(self, model_type, class_ids, cost=None):
+        self.model_type = model_type
+        self.class_ids = dict(class_ids)
+        self.available_classes = [name for name in COMMON_FINDINGS if name in self.class_ids]
+        self.cost = cost if cost is not None else CostProfile()
+        self.is_mock = True
+        logger.info(f"Initializing synthetic {model_type} model ({len(self.available_classes)} classes)")
+
+    def detect(self, image):
+        """Boxes, scores and labels for one CHW image as numpy arrays"""
+        seed, mean, std = image_fingerprint(image)
+        rng = np.random.default_rng(seed)
+
+        # Darker, lower-contrast films get more findings, as in the old heuristic
+        max_findings = min(4, len(self.available_classes))
+        bias = 1.0 - min(max(mean, 0.0), 1.0) * 0.5 - min(std, 1.0) * 0.25
+        count = int(np.clip(round(rng.uniform(1, max_findings) * bias + 0.5), 1, max_findings))
+        selected = rng.choice(len(self.available_classes), size=count, replace=False)
+
+        boxes = np.empty((count, 4), dtype=np.float32)
+        scores = np.empty(count, dtype=np.float32)
+        labels = np.empty(count, dtype=np.int64)
+        for i, class_index in enumerate(selected):
+            name = self.available_classes[class_index]
+            finding = COMMON_FINDINGS[name]
+            x1, y1, x2, y2 = finding['boxes'][rng.integers(len(finding['boxes']))]
+            # Up to 10% variation outward on each edge
+            shrink, grow = 1 - 0.1 * rng.random(2), 1 + 0.1 * rng.random(2)
+            boxes[i] = (x1 * shrink[0], y1 * shrink[1], min(x2 * grow[0], 512), min(y2 * grow[1], 512))
+            low, high = finding['score_range']
+            scores[i] = low + rng.random() * (high - low)
+            labels[i] = self.class_ids[name]
+        return boxes, scores, labels
+
+    def __call__(self, inputs):
+        batch = _as_batch(inputs)
+        results = [self.detect(image) for image in batch]
+        # Jitter needs no reproducibility; a call-local generator keeps it thread-safe
+        self.cost.spend(len(batch), np.random.default_rng())
+        if torch is not None:
+            return [{'boxes': torch.from_numpy(b), 'scores': torch.from_numpy(s), 'labels': torch.from_numpy(l)}
+                    for b, s, l in results]
+        return [{'boxes': b, 'scores': s, 'labels': l} for b, s, l in results]
+
+    def eval(self):
+        """Set model to evaluation mode"""
+        return self
@@ -0,0 +1,238 @@
+import os
+import re
+import math
+import json
+import time
+import shutil
+import logging
+import tempfile
+
+from PIL import Image
+
+try:
+    from image_ingest import open_image, DISPLAY_MAX_SIDE
+    from disk_cache import MB, PeriodicSweep, select_evictions
+except ImportError:
+    from server.image_ingest import open_image, DISPLAY_MAX_SIDE
+    from server.disk_cache import MB, PeriodicSweep, select_evictions
+
+logger = logging.getLogger(__name__)
+
+# Deep Zoom pyramid configuration
+PYRAMID_DIR = os.getenv('PYRAMID_DIR', os.path.join(os.path.dirname(__file__), '.pyramid_cache'))
+PYRAMID_TILE_SIZE = int(os.getenv('PYRAMID_TILE_SIZE', '256'))
+PYRAMID_TILE_OVERLAP = int(os.getenv('PYRAMID_TILE_OVERLAP', '1'))
+PYRAMID_TILE_FORMAT = os.getenv('PYRAMID_TILE_FORMAT', 'jpeg').lower()  # jpeg | png
+PYRAMID_TILE_QUALITY = int(os.getenv('PYRAMID_TILE_QUALITY', '90'))
+# Largest level-0 side kept in the pyramid (the full-resolution film, within the pixel limit)
+PYRAMID_MAX_SIDE = int(os.getenv('PYRAMID_MAX_SIDE', '8192'))
+# Size bound of the pyramid cache (0 disables); least recently used pyramids are removed past it
+PYRAMID_CACHE_MB = float(os.getenv('PYRAMID_CACHE_MB', '2048'))
+# Pyramids unused for this long are removed (0 keeps them until the size bound needs room)
+PYRAMID_MAX_AGE_HOURS = float(os.getenv('PYRAMID_MAX_AGE_HOURS', '168'))
+# Bounds are enforced by a background sweep started after each build, at most this often
+PYRAMID_SWEEP_SECONDS = 300
+
+# Coordinate space of the boxes returned by the detectors (see transform)
+MODEL_INPUT_SIZE = 512
+
+IMAGE_ID_RE = re.compile(r'^[0-9a-f]{64}$')
+TILE_NAME_RE = re.compile(r'^(\d+)_(\d+)\.(jpeg|png)$')
+
+DZI_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+    'Format="{format}" Overlap="{overlap}" TileSize="{tile_size}">'
+    '<Size Width="{width}" Height="{height}"/></Image>\n'
+)
+
+
+def pyramid_path(image_id):
+    return os.path.join(PYRAMID_DIR, image_id)
+
+
+def max_level(width, height):
+    """Deep Zoom levels run from 1x1 (level 0) up to full resolution"""
+    return int(math.ceil(math.log2(max(width, height, 1))))
+
+
+def _tile_boxes(width, height, tile_size, overlap):
+    """Yield (col, row, box) for one level, with Deep Zoom overlap on interior edges"""
+    cols = int(math.ceil(width / tile_size))
+    rows = int(math.ceil(height / tile_size))
+    for col in range(cols):
+        for row in range(rows):
+            x = col * tile_size - (overlap if col > 0 else 0)
+            y = row * tile_size - (overlap if row > 0 else 0)
+            x2 = min((col + 1) * tile_size + overlap, width)
+            y2 = min((row + 1) * tile_size + overlap, height)
+            yield col, row, (x, y, x2, y2)
+
+
+def describe(image_id, width, height):
+    return {
+        "image_id": image_id,
+        "width": width,
+        "height": height,
+        "tile_size": PYRAMID_TILE_SIZE,
+        "overlap": PYRAMID_TILE_OVERLAP,
+        "format": PYRAMID_TILE_FORMAT,
+        "max_level": max_level(width, height),
+        "dzi_url": f"/api/tiles/{image_id}.dzi",
+        "tiles_url": f"/api/tiles/{image_id}_files/",
+    }
+
+
+def touch_pyramid(image_id):
+    """Mark a pyramid as used: the sweep goes by the mtime of its info.json"""
+    try:
+        os.utime(os.path.join(pyramid_path(image_id), 'info.json'))
+    except OSError:
+        pass
+
+
+def load_descriptor(image_id):
+    """Return the descriptor of an already built pyramid, or None"""
+    try:
+        with open(os.path.join(pyramid_path(image_id), 'info.json')) as f:
+            descriptor = json.load(f)
+    except (OSError, ValueError):
+        return None
+    touch_pyramid(image_id)
+    return descriptor
+
+
+def _tree_size(path):
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return total
+
+
+# Pyramids never change once built, so each one's size is measured once per process
+_pyramid_sizes = {}
+
+
+def sweep_pyramids(max_mb=PYRAMID_CACHE_MB, max_age_hours=PYRAMID_MAX_AGE_HOURS, now=None):
+    """Remove pyramids unused for max_age_hours, then the least recently used past max_mb; returns the ids removed"""
+    now = time.time() if now is None else now
+    entries = []
+    try:
+        names = os.listdir(PYRAMID_DIR)
+    except OSError:
+        return []
+    for image_id in names:
+        if not IMAGE_ID_RE.match(image_id):
+            continue
+        try:
+            last_used = os.stat(os.path.join(pyramid_path(image_id), 'info.json')).st_mtime
+        except OSError:
+            continue
+        if image_id not in _pyramid_sizes:
+            _pyramid_sizes[image_id] = _tree_size(pyramid_path(image_id))
+        entries.append((image_id, last_used, _pyramid_sizes[image_id]))
+
+    removed = select_evictions(entries, int(max_mb * MB), max_age_hours * 3600, now)
+    for image_id in removed:
+        # Renamed away first, so readers see a whole pyramid or none
+        doomed = tempfile.mkdtemp(prefix='.evict-', dir=PYRAMID_DIR)
+        try:
+            os.rename(pyramid_path(image_id), os.path.join(doomed, image_id))
+        except OSError:
+            pass
+        shutil.rmtree(doomed, ignore_errors=True)
+        _pyramid_sizes.pop(image_id, None)
+    if removed:
+        logger.info(f"Pyramid sweep removed {len(removed)} of {len(entries)} pyramids from {PYRAMID_DIR}")
+    return removed
+
+
+_sweeper = PeriodicSweep(sweep_pyramids, PYRAMID_SWEEP_SECONDS, 'pyramid-sweep')
+
+
+def build_pyramid(image, image_id):
+    """Write every level's tiles plus the .dzi descriptor; built in a temp dir and renamed into place"""
+    width, height = image.size
+    descriptor = describe(image_id, width, height)
+    os.makedirs(PYRAMID_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{image_id[:12]}-", dir=PYRAMID_DIR)
+    save_kwargs = {'quality': PYRAMID_TILE_QUALITY} if PYRAMID_TILE_FORMAT == 'jpeg' else {'optimize': False}
+    pil_format = 'JPEG' if PYRAMID_TILE_FORMAT == 'jpeg' else 'PNG'
+
+    try:
+        level_image = image
+        for level in range(descriptor["max_level"], -1, -1):
+            level_dir = os.path.join(staging, f"{image_id}_files", str(level))
+            os.makedirs(level_dir)
+            lw, lh = level_image.size
+            for col, row, box in _tile_boxes(lw, lh, PYRAMID_TILE_SIZE, PYRAMID_TILE_OVERLAP):
+                level_image.crop(box).save(
+                    os.path.join(level_dir, f"{col}_{row}.{PYRAMID_TILE_FORMAT}"), pil_format, **save_kwargs
+                )
+            if level > 0:
+                # Each level is half the size of the next one up (rounded up)
+                level_image = level_image.resize((max(1, (lw + 1) // 2), max(1, (lh + 1) // 2)), Image.BILINEAR)
+
+        with open(os.path.join(staging, f"{image_id}.dzi"), 'w') as f:
+            f.write(DZI_TEMPLATE.format(**descriptor))
+        with open(os.path.join(staging, 'info.json'), 'w') as f:
+            json.dump(descriptor, f)
+
+        try:
+            os.rename(staging, pyramid_path(image_id))
+        except OSError:
+            # Another request finished the same pyramid first
+            shutil.rmtree(staging, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    logger.debug(f"Built {descriptor['max_level'] + 1}-level pyramid for {image_id} ({width}x{height})")
+    if PYRAMID_CACHE_MB or PYRAMID_MAX_AGE_HOURS:
+        _sweeper.request()
+    return descriptor
+
+
+def prepare_pyramid(source, image_id, display_max_side=DISPLAY_MAX_SIDE):
+    """Ensure a pyramid exists for an upload and return (display_image, descriptor)"""
+    descriptor = load_descriptor(image_id)
+    if descriptor is not None:
+        return open_image(source, max_side=display_max_side), descriptor
+
+    full_image = open_image(source, max_side=PYRAMID_MAX_SIDE)
+    descriptor = build_pyramid(full_image, image_id)
+    if display_max_side and max(full_image.size) > display_max_side:
+        full_image.thumbnail((display_max_side, display_max_side), Image.BICUBIC)
+    return full_image, descriptor
+
+
+def to_pyramid_box(box, descriptor):
+    """Scale a box from model input space (512x512) to full-resolution pyramid pixels"""
+    sx = descriptor["width"] / MODEL_INPUT_SIZE
+    sy = descriptor["height"] / MODEL_INPUT_SIZE
+    x1, y1, x2, y2 = box
+    return [x1 * sx, y1 * sy, x2 * sx, y2 * sy]
+
+
+def dzi_file(image_id):
+    """Path of a pyramid's .dzi descriptor, or None for unknown/invalid ids"""
+    if not IMAGE_ID_RE.match(image_id):
+        return None
+    path = os.path.join(pyramid_path(image_id), f"{image_id}.dzi")
+    if not os.path.exists(path):
+        return None
+    # Viewers fetch the descriptor when they open a film
+    touch_pyramid(image_id)
+    return path
+
+
+def tile_file(image_id, level, tile_name):
+    """Path of a single tile, or None for unknown/invalid requests"""
+    if not IMAGE_ID_RE.match(image_id) or not TILE_NAME_RE.match(tile_name):
+        return None
+    path = os.path.join(pyramid_path(image_id), f"{image_id}_files", str(level), tile_name)
+    return path if os.path.exists(path) else None
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+from jose import jwt
+
+from auth import TokenCache, verify_token
+
+
+def test_cached_claims_are_served_until_expiry():
+    cache = TokenCache(max_size=4)
+    cache.put('t', {'sub': 'a'}, time.time() + 0.05)
+    assert cache.get('t') == {'sub': 'a'}
+    time.sleep(0.06)
+    assert cache.get('t') is None
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_expired_tokens_are_not_stored():
+    cache = TokenCache(max_size=4)
+    cache.put('t', {'sub': 'a'}, time.time() - 1)
+    assert cache.get('t') is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TokenCache(max_size=2)
+    expires = time.time() + 60
+    cache.put('a', {'sub': 'a'}, expires)
+    cache.put('b', {'sub': 'b'}, expires)
+    cache.get('a')
+    cache.put('c', {'sub': 'c'}, expires)
+    assert cache.get('b') is None
+    assert cache.get('a') == {'sub': 'a'}
+    assert cache.get('c') == {'sub': 'c'}
+    assert cache.stats()['evictions'] == 1
+
+
+def test_returned_claims_are_copies():
+    cache = TokenCache(max_size=2)
+    cache.put('t', {'sub': 'a'}, time.time() + 60)
+    cache.get('t')['sub'] = 'mallory'
+    assert cache.get('t') == {'sub': 'a'}
+
+
+def test_verify_token_caches_per_secret():
+    cache = TokenCache(max_size=8)
+    token = jwt.encode({'sub': 'a', 'exp': int(time.time()) + 60}, 'secret', algorithm='HS256')
+    assert verify_token('Bearer ' + token, 'secret', cache=cache)['sub'] == 'a'
+    assert verify_token(token, 'secret', cache=cache)['sub'] == 'a'
+    assert cache.stats()['hits'] == 1
+    # A rotated secret misses the cache and fails verification
+    with pytest.raises(Exception):
+        verify_token(token, 'rotated', cache=cache)
@@ -0,0 +1,55 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_infer import find_images, load_completed, prefetch
+
+
+def record(path):
+    return (json.dumps({'path': path, 'predictions': []}) + '\n').encode()
+
+
+def test_missing_log_means_nothing_done(tmp_path):
+    assert load_completed(str(tmp_path / 'results.jsonl')) == set()
+
+
+def test_completed_paths_are_read_back(tmp_path):
+    log = tmp_path / 'results.jsonl'
+    log.write_bytes(record('a.png') + record('sub/b.png'))
+    assert load_completed(str(log)) == {'a.png', 'sub/b.png'}
+    assert log.read_bytes() == record('a.png') + record('sub/b.png')
+
+
+def test_torn_last_line_is_truncated(tmp_path):
+    log = tmp_path / 'results.jsonl'
+    log.write_bytes(record('a.png') + record('b.png')[:10])
+    assert load_completed(str(log)) == {'a.png'}
+    # The next append starts on a clean line
+    assert log.read_bytes() == record('a.png')
+
+
+def test_images_are_found_in_a_stable_order(tmp_path):
+    for name in ('b.PNG', 'a.jpg', 'notes.txt', 'z/c.dcm', 'm/d.png'):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x')
+    extensions = {'.png', '.jpg', '.dcm'}
+    assert find_images(str(tmp_path), extensions) == ['a.jpg', 'b.PNG', 'm/d.png', 'z/c.dcm']
+
+
+def test_prefetch_keeps_order_and_bounds_in_flight_work():
+    lock = threading.Lock()
+    submitted = []
+
+    def work(item):
+        with lock:
+            submitted.append(item)
+        return item * 2
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = []
+        for item, future in prefetch(work, iter(range(10)), executor, depth=3):
+            # No more than `depth` items have been handed to the pool ahead of the consumer
+            assert len(submitted) <= item + 3
+            results.append((item, future.result()))
+    assert results == [(i, i * 2) for i in range(10)]
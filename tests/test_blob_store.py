@@ -0,0 +1,115 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from blob_store import BlobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    # No bounds, so put() never starts a background sweep
+    return BlobStore(root=str(tmp_path / 'blobs'), signing_key=b'secret', max_mb=0, max_age_hours=0)
+
+
+def test_blobs_are_named_by_content(store):
+    digest = store.put(b'png bytes', 'png')
+    assert digest == hashlib.sha256(b'png bytes').hexdigest()
+    path = store.path(digest, 'png')
+    assert path.endswith(os.path.join(digest[:2], f"{digest}.png"))
+    with open(path, 'rb') as f:
+        assert f.read() == b'png bytes'
+    assert store.put(b'png bytes', 'png') == digest
+
+
+def test_unknown_or_invalid_names_have_no_path(store):
+    digest = store.put(b'png bytes', 'png')
+    assert store.path(digest, 'jpeg') is None
+    assert store.path(digest, 'exe') is None
+    assert store.path('../' + digest[3:], 'png') is None
+    assert store.path('0' * 64, 'png') is None
+
+
+def test_refs_point_at_stored_variants(store):
+    upload = hashlib.sha256(b'upload').hexdigest()
+    digest = store.put(b'overlay', 'png')
+    store.set_ref(upload, 'overlay_it3', digest, 'png')
+    assert store.get_ref(upload, 'overlay_it3') == (digest, 'png')
+    assert store.get_ref(upload, 'other') is None
+    store.set_ref(upload, '../escape', digest, 'png')
+    assert store.get_ref(upload, '../escape') is None
+
+
+def test_ref_to_a_removed_blob_is_a_miss(store):
+    upload = hashlib.sha256(b'upload').hexdigest()
+    digest = store.put(b'overlay', 'png')
+    store.set_ref(upload, 'overlay_it3', digest, 'png')
+    os.unlink(store.path(digest, 'png'))
+    assert store.get_ref(upload, 'overlay_it3') is None
+
+
+def test_signatures_depend_on_digest_expiry_and_key(store, tmp_path):
+    digest = store.put(b'png bytes', 'png')
+    signature = store.sign(digest, 2000)
+    assert store.verify(digest, '2000', signature, now=1000)
+    assert not store.verify(digest, '2000', None, now=1000)
+    assert not store.verify(digest, '2000', signature[:-1] + ('0' if signature[-1] != '0' else '1'), now=1000)
+    assert not store.verify(digest, '2001', signature, now=1000)
+    assert not store.verify(digest, 'soon', signature, now=1000)
+    assert not store.verify(hashlib.sha256(b'other').hexdigest(), '2000', signature, now=1000)
+    assert not BlobStore(root=str(tmp_path), signing_key=b'other').verify(digest, '2000', signature, now=1000)
+
+
+def test_links_expire(store):
+    digest = store.put(b'png bytes', 'png')
+    url = store.url(digest, 'png', now=1000)
+    query = dict(part.split('=') for part in url.split('?')[1].split('&'))
+    assert url.startswith(f"/api/blobs/{digest}.png?")
+    # A day of lifetime, rounded up to the hour so repeat links are identical
+    assert int(query['exp']) == 90000
+    assert store.url(digest, 'png', now=1500) == url
+    assert store.verify(digest, query['exp'], query['sig'], now=90000)
+    assert not store.verify(digest, query['exp'], query['sig'], now=90001)
+
+
+def test_relink_signs_again_until_the_blob_is_gone(store):
+    digest = store.put(b'png bytes', 'png')
+    url = store.url(digest, 'png', now=1000)
+    assert store.relink(url) == store.url(digest, 'png')
+    os.unlink(store.path(digest, 'png'))
+    assert store.relink(url) is None
+    assert store.relink('data:image/png;base64,AAAA') is None
+
+
+def age(store, digest, seconds_ago, now):
+    path = store.path(digest, 'png')
+    os.utime(path, (now - seconds_ago, now - seconds_ago))
+
+
+def test_sweep_removes_old_blobs_and_their_refs(tmp_path):
+    store = BlobStore(root=str(tmp_path / 'blobs'), max_mb=0, max_age_hours=0)
+    upload = hashlib.sha256(b'upload').hexdigest()
+    old, new = store.put(b'old', 'png'), store.put(b'new', 'png')
+    store.set_ref(upload, 'clean', old, 'png')
+    now = time.time()
+    age(store, old, 7200, now)
+    # Bounds are set after the puts so no background sweep races the test
+    store.max_age_hours = 1
+    assert store.sweep(now=now) == 1
+    assert store.path(old, 'png') is None
+    assert store.path(new, 'png') is not None
+    assert not os.path.exists(os.path.join(store.root, 'refs', upload[:2]))
+
+
+def test_sweep_keeps_the_most_recently_used_within_the_size_bound(tmp_path):
+    store = BlobStore(root=str(tmp_path / 'blobs'), max_mb=0, max_age_hours=0)
+    digests = [store.put(bytes([i]) * 1024, 'png') for i in range(4)]
+    now = time.time()
+    for i, digest in enumerate(digests):
+        age(store, digest, 100 - i, now)
+    # Reading a blob makes it the most recently used
+    store.path(digests[0], 'png')
+    store.max_mb = 2 / 1024
+    assert store.sweep(now=now) == 2
+    assert [store.path(digest, 'png') is not None for digest in digests] == [True, False, False, True]
@@ -0,0 +1,71 @@
+import time
+import socket
+
+import pytest
+
+import cancellation
+from cancellation import (CancelToken, RequestCancelled, STATUS_DEADLINE, STATUS_DISCONNECTED, parse_timeout_ms,
+                          socket_disconnect_probe)
+
+
+def test_token_without_deadline_never_expires():
+    token = CancelToken()
+    assert token.remaining() is None
+    assert token.poll() is None
+    token.check('forward')
+
+
+def test_deadline_cancels_after_it_passes():
+    token = CancelToken(timeout_ms=20)
+    assert 0 < token.remaining() <= 0.02
+    assert token.poll() is None
+    time.sleep(0.03)
+    assert token.remaining() == 0.0
+    with pytest.raises(RequestCancelled) as raised:
+        token.check('forward')
+    assert raised.value.reason == 'deadline'
+    assert raised.value.stage == 'forward'
+    assert raised.value.status_code == STATUS_DEADLINE
+
+
+def test_disconnect_probe_cancels():
+    gone = []
+    token = CancelToken(disconnected=lambda: bool(gone))
+    assert token.poll() is None
+    gone.append(True)
+    assert token.poll() == 'disconnected'
+    with pytest.raises(RequestCancelled) as raised:
+        token.check()
+    assert raised.value.status_code == STATUS_DISCONNECTED
+
+
+def test_first_reason_wins():
+    token = CancelToken(timeout_ms=1)
+    token.cancel('disconnected')
+    time.sleep(0.01)
+    assert token.poll() == 'disconnected'
+
+
+def test_parse_timeout_ms(monkeypatch):
+    monkeypatch.setattr(cancellation, 'MAX_REQUEST_TIMEOUT_MS', 1000)
+    assert parse_timeout_ms('250') == 250
+    assert parse_timeout_ms('250.7') == 250
+    assert parse_timeout_ms('5000') == 1000
+    assert parse_timeout_ms('-1') == 0
+    assert parse_timeout_ms('soon', default=300) == 300
+    assert parse_timeout_ms(None, default=0) == 0
+
+
+@pytest.mark.skipif(not hasattr(socket, 'MSG_DONTWAIT'), reason='needs MSG_DONTWAIT')
+def test_socket_probe_sees_peer_close_without_consuming_data():
+    server, client = socket.socketpair()
+    try:
+        probe = socket_disconnect_probe(server)
+        assert probe() is False
+        client.sendall(b'x')
+        assert probe() is False
+        assert server.recv(1) == b'x'
+        client.close()
+        assert probe() is True
+    finally:
+        server.close()
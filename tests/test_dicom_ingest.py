@@ -0,0 +1,105 @@
+import io
+
+import numpy as np
+import pytest
+
+pydicom = pytest.importorskip('pydicom')
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, SecondaryCaptureImageStorage, generate_uid
+
+import dicom_ingest
+from dicom_ingest import DicomError, is_dicom, read_dicom
+
+
+def dicom_bytes(pixels, photometric='MONOCHROME2', window=None, with_pixels=True):
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = SecondaryCaptureImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = SecondaryCaptureImageStorage
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = 'DX'
+    ds.Rows, ds.Columns = pixels.shape
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = photometric
+    ds.BitsAllocated = 16
+    ds.BitsStored = 12
+    ds.HighBit = 11
+    ds.PixelRepresentation = 0
+    if window is not None:
+        ds.WindowCenter, ds.WindowWidth = window
+    if with_pixels:
+        ds.PixelData = pixels.astype(np.uint16).tobytes()
+    buffer = io.BytesIO()
+    ds.save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+def ramp(rows=64, columns=64):
+    return np.tile(np.linspace(0, 4095, columns), (rows, 1)).astype(np.uint16)
+
+
+def test_detects_the_part_10_preamble():
+    data = dicom_bytes(ramp())
+    assert is_dicom(data[:132])
+    assert not is_dicom(b'\x89PNG\r\n\x1a\n' + b'\0' * 200)
+    assert not is_dicom(data[:100])
+
+
+def test_reads_a_grayscale_film_into_eight_bits():
+    image = read_dicom(io.BytesIO(dicom_bytes(ramp())))
+    pixels = np.asarray(image)
+    assert image.mode == 'L'
+    assert image.size == (64, 64)
+    assert pixels[:, 0].max() == 0
+    assert pixels[:, -1].min() == 255
+
+
+def test_monochrome1_is_inverted():
+    image = read_dicom(io.BytesIO(dicom_bytes(ramp(), photometric='MONOCHROME1')))
+    pixels = np.asarray(image)
+    assert pixels[:, 0].min() == 255
+    assert pixels[:, -1].max() == 0
+
+
+def test_window_settings_are_applied():
+    image = read_dicom(io.BytesIO(dicom_bytes(ramp(), window=(1024, 512))))
+    pixels = np.asarray(image)
+    # Everything above the window saturates
+    assert (pixels[:, 32:] == 255).all()
+
+
+def test_large_films_are_subsampled_for_display():
+    image = read_dicom(io.BytesIO(dicom_bytes(ramp(256, 256))), max_side=64)
+    assert image.size == (64, 64)
+
+
+def test_size_check_runs_before_decoding():
+    seen = []
+
+    def check_size(size):
+        seen.append(size)
+        raise DicomError('too big', 413)
+
+    with pytest.raises(DicomError) as raised:
+        read_dicom(io.BytesIO(dicom_bytes(ramp(32, 48))), check_size=check_size)
+    assert raised.value.status_code == 413
+    assert seen == [(48, 32)]
+
+
+def test_missing_pixel_data_and_garbage_are_bad_requests():
+    with pytest.raises(DicomError) as raised:
+        read_dicom(io.BytesIO(dicom_bytes(ramp(), with_pixels=False)))
+    assert raised.value.status_code == 400
+    with pytest.raises(DicomError) as raised:
+        read_dicom(io.BytesIO(b'\0' * 128 + b'NOPE'))
+    assert raised.value.status_code == 400
+
+
+def test_without_pydicom_uploads_are_unsupported(monkeypatch):
+    monkeypatch.setattr(dicom_ingest, 'pydicom_available', False)
+    with pytest.raises(DicomError) as raised:
+        read_dicom(io.BytesIO(dicom_bytes(ramp())))
+    assert raised.value.status_code == 415
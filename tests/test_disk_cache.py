@@ -0,0 +1,43 @@
+import threading
+
+from disk_cache import PeriodicSweep, select_evictions
+
+
+def test_unbounded_keeps_everything():
+    entries = [('a', 0, 10), ('b', 50, 10)]
+    assert select_evictions(entries, 0, 0, now=100) == []
+
+
+def test_old_entries_go_first():
+    entries = [('old', 0, 10), ('new', 90, 10)]
+    assert select_evictions(entries, 0, 60, now=100) == ['old']
+
+
+def test_least_recently_used_go_past_the_size_bound():
+    entries = [('a', 10, 40), ('b', 30, 40), ('c', 20, 40), ('d', 40, 40)]
+    assert sorted(select_evictions(entries, 100, 0, now=100)) == ['a', 'c']
+
+
+def test_older_entries_go_once_one_does_not_fit():
+    # 'small' would still fit, but it is older than an entry that did not
+    entries = [('big', 50, 80), ('new', 90, 30), ('small', 10, 5)]
+    assert sorted(select_evictions(entries, 100, 0, now=100)) == ['big', 'small']
+
+
+def test_sweeps_do_not_overlap_or_repeat_within_the_interval():
+    release = threading.Event()
+    done = threading.Event()
+    calls = []
+
+    def sweep():
+        calls.append(1)
+        release.wait(5)
+        done.set()
+
+    sweeper = PeriodicSweep(sweep, 60, 'test-sweep')
+    assert sweeper.request()
+    assert not sweeper.request()
+    release.set()
+    done.wait(5)
+    assert not sweeper.request()
+    assert calls == [1]
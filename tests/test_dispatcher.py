@@ -0,0 +1,72 @@
+from dispatcher import HashRing, retry_statuses
+
+NODES = [f"http://10.0.0.{i}:5000" for i in range(1, 5)]
+KEYS = [f"sha-{i}" for i in range(2000)]
+
+
+def owners(ring):
+    return {key: ring.preference(key)[0] for key in KEYS}
+
+
+def test_empty_ring_has_no_preference():
+    assert HashRing().preference('anything') == []
+    assert HashRing().shares() == {}
+
+
+def test_preference_lists_every_node_once_owner_first():
+    ring = HashRing(NODES, vnodes=32)
+    order = ring.preference('sha-1')
+    assert sorted(order) == sorted(NODES)
+    assert order[0] == owners(ring)['sha-1']
+
+
+def test_keys_spread_across_nodes():
+    ring = HashRing(NODES, vnodes=64)
+    shares = ring.shares()
+    assert abs(sum(shares.values()) - 1.0) < 0.01
+    assert all(0.1 < share < 0.4 for share in shares.values())
+
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(NODES, vnodes=64)
+    before = owners(ring)
+    ring.remove(NODES[0])
+    after = owners(ring)
+    for key in KEYS:
+        if before[key] != NODES[0]:
+            assert after[key] == before[key]
+        else:
+            # The key moves to the node that was next in its preference list
+            assert after[key] != NODES[0]
+
+
+def test_failover_target_becomes_the_owner():
+    ring = HashRing(NODES, vnodes=64)
+    expected = {key: ring.preference(key)[1] for key in KEYS if ring.preference(key)[0] == NODES[0]}
+    ring.remove(NODES[0])
+    assert all(ring.preference(key)[0] == successor for key, successor in expected.items())
+
+
+def test_adding_a_node_only_takes_keys_for_itself():
+    ring = HashRing(NODES[:3], vnodes=64)
+    before = owners(ring)
+    ring.add(NODES[3])
+    after = owners(ring)
+    moved = [key for key in KEYS if after[key] != before[key]]
+    assert moved
+    assert all(after[key] == NODES[3] for key in moved)
+
+
+def test_add_and_remove_are_idempotent():
+    ring = HashRing(NODES[:2], vnodes=8)
+    ring.add(NODES[0])
+    ring.remove(NODES[3])
+    assert ring.nodes == NODES[:2]
+    assert len(ring.preference('k')) == 2
+
+
+def test_requests_that_walk_the_ring_on_404():
+    assert retry_statuses('api/blobs/abc.png') == (503, 404)
+    assert retry_statuses('api/tiles/abc.dzi') == (503, 404)
+    assert retry_statuses('api/predict/requery') == (503, 404)
+    assert retry_statuses('api/predict') == (503,)
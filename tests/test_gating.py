@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from gating import NOT_CXR, PASS, Gating, StatsGate, load_gate
+
+
+def chest_film(width=400, height=400):
+    # Two dark lung fields either side of a bright mediastinum, in grayscale
+    x = np.linspace(-1.0, 1.0, width)
+    profile = 0.3 + 0.5 * np.exp(-(x / 0.15) ** 2) + 0.4 * np.abs(x) ** 3
+    pixels = np.tile(profile, (height, 1)) * np.linspace(0.8, 1.0, height)[:, None]
+    return Image.fromarray((np.clip(pixels, 0, 1) * 255).astype(np.uint8)).convert('RGB')
+
+
+def colour_photo(side=400):
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, (side, side, 3), dtype=np.uint8))
+
+
+class Job:
+    def __init__(self, image):
+        self.image = image
+
+
+class Always:
+    def __init__(self, action):
+        self.name = f"always_{action}"
+        self.action = action
+        self.calls = 0
+
+    def __call__(self, job):
+        self.calls += 1
+        return self.action, 1.0
+
+
+def make_gate():
+    return Always(PASS)
+
+
+def test_stats_gate_passes_a_chest_film():
+    action, score = StatsGate(threshold=0.5)(Job(chest_film()))
+    assert action == PASS
+    assert score >= 0.5
+
+
+def test_stats_gate_rejects_colour_blank_and_panoramic_images():
+    gate = StatsGate(threshold=0.5)
+    assert gate(Job(colour_photo()))[0] == NOT_CXR
+    assert gate(Job(Image.new('RGB', (400, 400), (128, 128, 128))))[0] == NOT_CXR
+    assert gate.score(chest_film(width=1200, height=300)) == 0.0
+
+
+def test_off_mode_has_no_gates():
+    gating = Gating('off')
+    assert not gating.enabled
+    assert gating.evaluate(Job(chest_film())) is None
+    assert gating.stats()['passed'] == 1
+
+
+def test_first_short_circuit_stops_the_chain():
+    gating = Gating('off')
+    reject, never = Always(NOT_CXR), Always(PASS)
+    gating.gates = [reject, never]
+    decision = gating.evaluate(Job(chest_film()))
+    assert decision.short_circuit
+    assert decision.gate == 'always_not_cxr'
+    assert never.calls == 0
+    stats = gating.stats()
+    assert stats['fired'] == {'always_not_cxr:not_cxr': 1}
+    assert stats['skip_rate'] == 1.0
+    gating.reset()
+    assert gating.stats()['evaluated'] == 0
+
+
+def test_custom_gates_load_by_module_path():
+    gate = load_gate('test_gating:make_gate')
+    assert gate.name == 'always_pass'
+    with pytest.raises(ValueError):
+        load_gate('no_such_gate')
+
+
+def test_broken_gates_are_disabled_not_fatal():
+    gating = Gating('stats,no_such_gate')
+    assert [gate.name for gate in gating.gates] == ['stats']
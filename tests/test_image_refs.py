@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from image_ingest import IngestError
+from image_refs import ReferenceCache, file_identity, map_image, resolve_image_path, result_nbytes
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def roots(tmp_path):
+    root = tmp_path / 'films'
+    (root / 'sub').mkdir(parents=True)
+    (root / 'sub' / 'a.png').write_bytes(b'\x89PNG fake')
+    (root / 'empty.png').write_bytes(b'')
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    (outside / 'b.png').write_bytes(b'\x89PNG fake')
+    os.symlink(outside, root / 'escape')
+    return [os.path.realpath(root)], tmp_path
+
+
+def status_of(reference, roots):
+    with pytest.raises(IngestError) as raised:
+        resolve_image_path(reference, roots)
+    return raised.value.status_code
+
+
+def test_relative_and_absolute_paths_inside_a_root(roots):
+    allowed, tmp_path = roots
+    path, stat = resolve_image_path('sub/a.png', allowed)
+    assert path == os.path.join(allowed[0], 'sub', 'a.png')
+    assert resolve_image_path(path, allowed)[0] == path
+    assert stat.st_size == len(b'\x89PNG fake')
+
+
+def test_file_uris(roots):
+    allowed, _ = roots
+    path = os.path.join(allowed[0], 'sub', 'a.png')
+    assert resolve_image_path('file://' + path, allowed)[0] == path
+    assert resolve_image_path('file://localhost' + path, allowed)[0] == path
+    assert status_of('file://elsewhere' + path, allowed) == 400
+    assert status_of('http://example.com/a.png', allowed) == 400
+
+
+def test_paths_outside_the_roots_are_refused(roots):
+    allowed, tmp_path = roots
+    assert status_of('../outside/b.png', allowed) == 403
+    assert status_of(str(tmp_path / 'outside' / 'b.png'), allowed) == 403
+    assert status_of('/etc/passwd', allowed) == 403
+
+
+def test_symlinks_may_not_leave_the_roots(roots):
+    allowed, _ = roots
+    assert status_of('escape/b.png', allowed) == 403
+
+
+def test_missing_empty_and_directory_references(roots):
+    allowed, _ = roots
+    assert status_of('sub/missing.png', allowed) == 404
+    assert status_of('empty.png', allowed) == 400
+    assert status_of('sub', allowed) == 400
+
+
+def test_disabled_without_roots():
+    assert status_of('a.png', []) == 400
+
+
+def test_rewritten_file_changes_identity(roots):
+    allowed, _ = roots
+    path, stat = resolve_image_path('sub/a.png', allowed)
+    before = file_identity(path, stat)
+    with open(path, 'ab') as f:
+        f.write(b'more')
+    path, stat = resolve_image_path('sub/a.png', allowed)
+    assert file_identity(path, stat) != before
+
+
+def test_map_image_reads_the_file(roots):
+    allowed, _ = roots
+    path, _ = resolve_image_path('sub/a.png', allowed)
+    mapped = map_image(path)
+    try:
+        assert mapped.read(4) == b'\x89PNG'
+    finally:
+        mapped.close()
+
+
+def response(image_bytes):
+    return {'predictions': [{'label': 'Nodule/Mass', 'score': 0.5, 'boxes': [0, 0, 1, 1]}],
+            'clean_image': 'x' * image_bytes}
+
+
+def test_reference_cache_bounded_by_entries():
+    cache = ReferenceCache(max_entries=2, max_mb=8)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, response(10))
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+    assert cache.stats()['entries'] == 2
+
+
+def test_reference_cache_bounded_by_bytes():
+    cache = ReferenceCache(max_entries=100, max_mb=1)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, response(400 * 1024))
+    assert cache.get('a') is None
+    assert cache.get('b') is not None and cache.get('c') is not None
+    assert cache.stats()['bytes'] <= MB
+
+
+def test_reference_cache_skips_responses_over_the_budget():
+    cache = ReferenceCache(max_entries=100, max_mb=1)
+    cache.put('small', response(10))
+    cache.put('huge', response(2 * MB))
+    assert cache.get('huge') is None
+    assert cache.get('small') is not None
+
+
+def test_reference_cache_replacing_a_key_keeps_the_byte_count():
+    cache = ReferenceCache(max_entries=10, max_mb=8)
+    cache.put('a', response(1000))
+    cache.put('a', response(1000))
+    assert cache.stats()['bytes'] == result_nbytes(response(1000))
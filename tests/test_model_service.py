@@ -0,0 +1,44 @@
+import os
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+# Importing model_service loads the detectors; synthetic ones are enough here
+os.environ.setdefault('USE_MOCK_MODELS', 'true')
+
+from model_service import PredictionError, parse_classes, route_models, select_classes
+
+
+def test_all_classes_run_both_detectors_it3_first():
+    assert route_models(None) == ('it3', 'it2')
+
+
+def test_classes_route_to_the_detector_that_reports_them():
+    assert route_models({'Cardiomegaly', 'Nodule/Mass'}) == ('it3',)
+    assert route_models({'Pneumothorax'}) == ('it2',)
+    assert route_models({'Atelectasis', 'Infiltration'}) == ('it3', 'it2')
+
+
+def test_parse_classes_accepts_comma_separated_names():
+    assert parse_classes({}) is None
+    assert parse_classes({'classes': ''}) is None
+    assert parse_classes({'classes': 'cardiomegaly, Nodule/Mass'}) == {'Cardiomegaly', 'Nodule/Mass'}
+
+
+def test_parse_classes_accepts_lists_and_repeated_fields():
+    assert parse_classes({'classes': ['Pneumothorax', 'atelectasis']}) == {'Pneumothorax', 'Atelectasis'}
+    fields = MultiDict([('classes', 'Pneumothorax'), ('classes', 'Consolidation')])
+    assert parse_classes(fields) == {'Pneumothorax', 'Consolidation'}
+
+
+def test_unknown_classes_are_refused():
+    with pytest.raises(PredictionError) as raised:
+        parse_classes({'classes': 'Cardiomegaly,Fracture'})
+    assert raised.value.status_code == 400
+    assert 'Cardiomegaly' in raised.value.details['classes']
+
+
+def test_select_classes_filters_findings():
+    findings = [{'label': 'Cardiomegaly'}, {'label': 'Pneumothorax'}]
+    assert select_classes(findings, None) == findings
+    assert select_classes(findings, {'Pneumothorax'}) == [{'label': 'Pneumothorax'}]
@@ -0,0 +1,141 @@
+import time
+import queue
+import threading
+
+import pytest
+
+from pipeline import Pipeline, PipelineFull, Stage
+
+
+class Job:
+    def __init__(self, skip_middle=False):
+        self.trace = []
+        self.skip_middle = skip_middle
+
+
+def step(name):
+    def run(job):
+        job.trace.append(name)
+        return job
+    return run
+
+
+def three_stages():
+    return [
+        Stage('first', step('first')),
+        Stage('middle', step('middle'), skip=lambda job: job.skip_middle),
+        Stage('last', step('last')),
+    ]
+
+
+def wait_until_busy(stage, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not stage.busy and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stage.busy
+
+
+def test_job_runs_every_stage_in_order():
+    pipeline = Pipeline(three_stages(), name='test')
+    job = pipeline.submit(Job()).result(timeout=5)
+    assert job.trace == ['first', 'middle', 'last']
+    stats = pipeline.stats()['stages']
+    assert [stats[name]['processed'] for name in ('first', 'middle', 'last')] == [1, 1, 1]
+
+
+def test_skipped_stage_is_bypassed_and_counted():
+    pipeline = Pipeline(three_stages(), name='test')
+    job = pipeline.submit(Job(skip_middle=True)).result(timeout=5)
+    assert job.trace == ['first', 'last']
+    stats = pipeline.stats()['stages']
+    assert stats['middle']['skipped'] == 1
+    assert stats['middle']['processed'] == 0
+
+
+def test_stage_error_fails_the_future_through_on_error():
+    def boom(job):
+        raise ValueError('broken')
+
+    stages = [Stage('first', boom), Stage('last', step('last'))]
+    pipeline = Pipeline(stages, on_error=lambda e: RuntimeError(f"wrapped: {e}"), name='test')
+    job = Job()
+    with pytest.raises(RuntimeError, match='wrapped: broken'):
+        pipeline.submit(job).result(timeout=5)
+    assert job.trace == []
+    stats = pipeline.stats()['stages']
+    assert stats['first']['failed'] == 1
+    assert stats['last']['processed'] == 0
+
+
+def test_before_stage_can_drop_a_job():
+    def before_stage(job, stage_name):
+        if stage_name == 'middle':
+            raise LookupError('cancelled')
+
+    pipeline = Pipeline(three_stages(), before_stage=before_stage, name='test')
+    job = Job()
+    with pytest.raises(LookupError):
+        pipeline.submit(job).result(timeout=5)
+    assert job.trace == ['first']
+    assert pipeline.stats()['stages']['middle']['dropped'] == 1
+
+
+def test_on_wait_reports_each_stage():
+    waits = []
+    pipeline = Pipeline(three_stages(), on_wait=lambda name, seconds: waits.append(name), name='test')
+    pipeline.submit(Job()).result(timeout=5)
+    assert waits == ['first', 'middle', 'last']
+
+
+def test_submit_refuses_when_first_queue_stays_full():
+    release = threading.Event()
+
+    def blocked(job):
+        release.wait(5)
+        return job
+
+    stage = Stage('only', blocked, workers=1, queue_size=1)
+    pipeline = Pipeline([stage], name='test')
+    try:
+        running = pipeline.submit(Job())
+        # The worker takes the first job, leaving the queue empty again
+        wait_until_busy(stage)
+        queued = pipeline.submit(Job())
+        with pytest.raises(PipelineFull):
+            pipeline.submit(Job(), timeout=0.05)
+        assert pipeline.rejected == 1
+    finally:
+        release.set()
+    running.result(timeout=5)
+    queued.result(timeout=5)
+
+
+def test_cancelled_job_is_dropped_before_the_first_stage():
+    release = threading.Event()
+    ran = []
+
+    def blocked(job):
+        ran.append(job)
+        release.wait(5)
+        return job
+
+    stage = Stage('only', blocked, workers=1, queue_size=4)
+    pipeline = Pipeline([stage], name='test')
+    first = pipeline.submit(Job())
+    wait_until_busy(stage)
+    second = pipeline.submit(Job())
+    assert second.cancel()
+    release.set()
+    first.result(timeout=5)
+    third = pipeline.submit(Job())
+    third.result(timeout=5)
+    assert len(ran) == 2
+    assert stage.queue.qsize() == 0
+
+
+def test_stage_accepts_a_custom_queue():
+    work_queue = queue.Queue(maxsize=3)
+    stage = Stage('only', step('only'), work_queue=work_queue)
+    assert stage.queue is work_queue
+    job = Pipeline([stage], name='test').submit(Job()).result(timeout=5)
+    assert job.trace == ['only']
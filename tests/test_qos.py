@@ -0,0 +1,116 @@
+import pytest
+
+import qos as qos_module
+from qos import PROFILES, QosController
+
+
+class Clock:
+    """Stand-in for the time module: monotonic() only moves when the test advances it"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(qos_module, 'time', clock)
+    return clock
+
+
+class Job:
+    def __init__(self, priority='routine'):
+        self.priority = priority
+
+
+def controller(**kwargs):
+    options = dict(enabled=True, target_ms=100, recover_ratio=0.5, hold_seconds=5, smoothing=1.0,
+                   floor='predictions_only')
+    options.update(kwargs)
+    return QosController(**options)
+
+
+def test_disabled_controller_always_serves_full(clock):
+    qos = controller(enabled=False)
+    qos.observe('preprocess', 10)
+    assert qos.select(Job()).name == 'full'
+    assert qos.level == 0
+
+
+def test_steps_down_one_level_per_hold_period(clock):
+    qos = controller()
+    names = []
+    for _ in range(len(PROFILES)):
+        clock.advance(5)
+        qos.observe('preprocess', 0.5)
+        names.append(qos.select(Job()).name)
+    assert names == ['reduced_preview', 'it3_only', 'predictions_only', 'predictions_only']
+
+
+def test_waits_are_summed_across_stages(clock):
+    qos = controller()
+    clock.advance(5)
+    qos.observe('preprocess', 0.06)
+    assert qos.level == 0
+    qos.observe('inference', 0.06)
+    assert qos.level == 1
+
+
+def test_steps_back_up_once_waits_recover(clock):
+    qos = controller()
+    levels = []
+    # Between the recover threshold (50 ms) and the target the level holds
+    for wait in (0.5, 0.5, 0.07, 0.01, 0.01):
+        clock.advance(5)
+        qos.observe('preprocess', wait)
+        levels.append(qos.level)
+    assert levels == [1, 2, 2, 1, 0]
+    transitions = [t['to'] for t in qos.stats()['transitions']]
+    assert transitions == ['reduced_preview', 'it3_only', 'reduced_preview', 'full']
+
+
+def test_floor_limits_the_deepest_profile(clock):
+    qos = controller(floor='reduced_preview')
+    for _ in range(5):
+        clock.advance(5)
+        qos.observe('preprocess', 1.0)
+    assert qos.select(Job()).name == 'reduced_preview'
+
+
+def test_hold_time_rate_limits_changes(clock):
+    qos = controller()
+    clock.advance(5)
+    qos.observe('preprocess', 1.0)
+    clock.advance(4)
+    qos.observe('preprocess', 1.0)
+    assert qos.level == 1
+    clock.advance(1)
+    qos.observe('preprocess', 1.0)
+    assert qos.level == 2
+
+
+def test_exempt_priorities_get_full_quality(clock):
+    qos = controller()
+    clock.advance(5)
+    qos.observe('preprocess', 1.0)
+    assert qos.select(Job('stat')).name == 'full'
+    assert qos.select(Job('routine')).name == 'reduced_preview'
+    assert qos.stats()['served'] == {'full': 1, 'reduced_preview': 1, 'it3_only': 0, 'predictions_only': 0}
+
+
+def test_idle_pipeline_lets_the_level_recover(clock):
+    qos = controller()
+    clock.advance(5)
+    qos.observe('preprocess', 1.0)
+    assert qos.level == 1
+    assert qos.select(Job()).name == 'reduced_preview'
+    # No samples for a hold period: nothing is queued, so admission steps back up
+    clock.advance(5)
+    assert qos.select(Job()).name == 'full'
+
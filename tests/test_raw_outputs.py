@@ -0,0 +1,56 @@
+import numpy as np
+from PIL import Image
+
+from raw_outputs import RawOutputCache
+
+MB = 1024 * 1024
+
+
+def raw_output(boxes=4):
+    return [{'boxes': np.zeros((boxes, 4), dtype=np.float32), 'scores': np.zeros(boxes, dtype=np.float32)}]
+
+
+def film(side=512):
+    # 512x512 RGB: 768 KB per cached image
+    return Image.new('RGB', (side, side))
+
+
+def test_raw_outputs_are_kept_per_model():
+    cache = RawOutputCache(max_mb=8)
+    cache.put('sha', 'it3', raw_output(), film())
+    cache.put('sha', 'it2', raw_output(), film())
+    assert cache.get('sha', 'it3') is not None
+    assert cache.get('sha', 'it2') is not None
+    assert cache.get('sha', 'other') is None
+    image, _, outputs = cache.entry('sha')
+    assert set(outputs) == {'it3', 'it2'}
+    assert image.size == (512, 512)
+    assert cache.stats()['entries'] == 1
+
+
+def test_raw_output_cache_copies_the_image():
+    cache = RawOutputCache(max_mb=8)
+    image = film()
+    cache.put('sha', 'it3', raw_output(), image)
+    image.paste((255, 0, 0), (0, 0, 512, 512))
+    cached, _, _ = cache.entry('sha')
+    assert cached.getpixel((0, 0)) == (0, 0, 0)
+
+
+def test_raw_output_cache_evicts_least_recent_by_bytes():
+    cache = RawOutputCache(max_mb=2)
+    cache.put('a', 'it3', raw_output(), film())
+    cache.put('b', 'it3', raw_output(), film())
+    cache.entry('a')
+    cache.put('c', 'it3', raw_output(), film())
+    assert cache.entry('b') is None
+    assert cache.entry('a') is not None
+    assert cache.entry('c') is not None
+    assert cache.stats()['bytes'] <= 2 * MB
+
+
+def test_disabled_raw_output_cache_stores_nothing():
+    cache = RawOutputCache(max_mb=0)
+    cache.put('a', 'it3', raw_output(), film())
+    assert cache.entry('a') is None
+    assert not cache.enabled
@@ -0,0 +1,90 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+from rpc_protocol import (END, HEADER, MAX_META_BYTES, PREDICT, RESULT, ProtocolError, encode_frame, read_frame)
+
+
+@pytest.fixture
+def pair():
+    server, client = socket.socketpair()
+    yield server, client
+    server.close()
+    client.close()
+
+
+def test_round_trip(pair):
+    server, client = pair
+    client.sendall(encode_frame(PREDICT, {'id': 7, 'model_type': 'it3'}, b'\x89PNG' * 1000))
+    frame_type, meta, body = read_frame(server, max_body_bytes=1 << 20)
+    assert frame_type == PREDICT
+    assert meta == {'id': 7, 'model_type': 'it3'}
+    assert body == b'\x89PNG' * 1000
+
+
+def test_frames_without_meta_or_body(pair):
+    server, client = pair
+    client.sendall(encode_frame(END) + encode_frame(RESULT, {'id': 1}))
+    assert read_frame(server, 1024) == (END, {}, b'')
+    assert read_frame(server, 1024) == (RESULT, {'id': 1}, b'')
+
+
+def test_header_layout_is_big_endian():
+    frame = encode_frame(PREDICT, {}, b'abc')
+    assert frame[:HEADER.size] == struct.pack('>IBI', 3, PREDICT, 2)
+    assert frame.endswith(b'{}abc')
+
+
+def test_frames_split_across_reads(pair):
+    server, client = pair
+    frame = encode_frame(PREDICT, {'id': 1}, b'x' * 5000)
+
+    def send_in_pieces():
+        for start in range(0, len(frame), 7):
+            client.sendall(frame[start:start + 7])
+
+    # Tiny sends can fill the socket buffer, so the reader has to run meanwhile
+    sender = threading.Thread(target=send_in_pieces)
+    sender.start()
+    assert read_frame(server, 1 << 20)[2] == b'x' * 5000
+    sender.join(timeout=5)
+
+
+def test_clean_close_between_frames(pair):
+    server, client = pair
+    client.close()
+    assert read_frame(server, 1024) is None
+
+
+def test_close_mid_frame(pair):
+    server, client = pair
+    client.sendall(encode_frame(PREDICT, {'id': 1}, b'x' * 100)[:-10])
+    client.close()
+    with pytest.raises(ProtocolError, match='mid-frame'):
+        read_frame(server, 1024)
+
+
+def test_unknown_frame_type(pair):
+    server, client = pair
+    client.sendall(HEADER.pack(0, 99, 0))
+    with pytest.raises(ProtocolError, match='Unknown frame type'):
+        read_frame(server, 1024)
+
+
+def test_oversized_frames_are_refused_before_reading(pair):
+    server, client = pair
+    client.sendall(HEADER.pack(2048, PREDICT, 0))
+    with pytest.raises(ProtocolError, match='too large'):
+        read_frame(server, 1024)
+    client.sendall(HEADER.pack(0, PREDICT, MAX_META_BYTES + 1))
+    with pytest.raises(ProtocolError, match='too large'):
+        read_frame(server, 1024)
+
+
+def test_invalid_meta(pair):
+    server, client = pair
+    client.sendall(HEADER.pack(0, PREDICT, 3) + b'{x}')
+    with pytest.raises(ProtocolError, match='metadata'):
+        read_frame(server, 1024)
@@ -0,0 +1,61 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault('USE_MOCK_MODELS', 'true')
+
+import rpc_server
+from rpc_protocol import ERROR, HELLO, PROTOCOL_VERSION, encode_frame, read_frame
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(**kwargs):
+        server = rpc_server.serve('127.0.0.1', 0, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.server_address
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def connect(address):
+    return socket.create_connection(address, timeout=5)
+
+
+def test_silent_clients_are_dropped_after_the_handshake_timeout(start_server, monkeypatch):
+    monkeypatch.setattr(rpc_server, 'RPC_HANDSHAKE_TIMEOUT_SECONDS', 0.2)
+    client = connect(start_server())
+    # The server closes the connection without waiting for a HELLO
+    assert client.recv(1) == b''
+    client.close()
+
+
+def test_connections_over_the_limit_are_refused(start_server):
+    address = start_server(max_connections=1)
+    first = connect(address)
+    second = connect(address)
+    frame_type, meta, _ = read_frame(second, 1024)
+    assert frame_type == ERROR
+    assert meta['status'] == 503
+    second.close()
+
+    # The slot frees up once the first connection ends
+    first.close()
+    for _ in range(50):
+        third = connect(address)
+        third.sendall(encode_frame(HELLO, {"version": PROTOCOL_VERSION}))
+        frame_type, meta, _ = read_frame(third, 1024)
+        third.close()
+        if meta.get('status') != 503:
+            break
+        time.sleep(0.05)
+    assert frame_type == HELLO or meta['status'] == 401
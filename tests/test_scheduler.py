@@ -0,0 +1,106 @@
+import queue
+import threading
+
+import pytest
+
+from scheduler import FairShareQueue, PRIORITY_RANK, RateLimiter, parse_user_priorities, resolve_priority
+
+
+def make_queue(maxsize=0, stat_headroom=4):
+    # Items are (priority, user, label) tuples
+    return FairShareQueue(maxsize, key=lambda item: (PRIORITY_RANK[item[0]], item[1]), stat_headroom=stat_headroom)
+
+
+def drain(q):
+    return [q.get()[2] for _ in range(q.qsize())]
+
+
+def test_most_urgent_class_first():
+    q = make_queue()
+    q.put(('bulk', 'a', 'bulk'))
+    q.put(('routine', 'a', 'routine'))
+    q.put(('stat', 'a', 'stat'))
+    q.put(('urgent', 'a', 'urgent'))
+    assert drain(q) == ['stat', 'urgent', 'routine', 'bulk']
+
+
+def test_round_robin_between_users_within_a_class():
+    q = make_queue()
+    for i in range(3):
+        q.put(('routine', 'alice', f'a{i}'))
+    q.put(('routine', 'bob', 'b0'))
+    q.put(('routine', 'carol', 'c0'))
+    assert drain(q) == ['a0', 'b0', 'c0', 'a1', 'a2']
+
+
+def test_fifo_per_user():
+    q = make_queue()
+    for i in range(4):
+        q.put(('bulk', 'alice', i))
+    assert drain(q) == [0, 1, 2, 3]
+
+
+def test_full_queue_times_out_for_non_stat_items():
+    q = make_queue(maxsize=2)
+    q.put(('routine', 'a', 1))
+    q.put(('routine', 'a', 2))
+    with pytest.raises(queue.Full):
+        q.put(('urgent', 'a', 3), timeout=0.05)
+    assert q.qsize() == 2
+
+
+def test_stat_items_may_overfill_by_the_headroom_only():
+    q = make_queue(maxsize=1, stat_headroom=2)
+    q.put(('routine', 'a', 'routine'))
+    q.put(('stat', 'b', 'stat1'), timeout=0)
+    q.put(('stat', 'b', 'stat2'), timeout=0)
+    with pytest.raises(queue.Full):
+        q.put(('stat', 'c', 'stat3'), timeout=0.05)
+    assert q.qsize() == 3
+    assert drain(q) == ['stat1', 'stat2', 'routine']
+
+
+def test_blocked_put_resumes_when_room_frees():
+    q = make_queue(maxsize=1)
+    q.put(('routine', 'a', 1))
+    thread = threading.Thread(target=q.put, args=(('routine', 'b', 2),), kwargs={'timeout': 5})
+    thread.start()
+    assert q.get()[2] == 1
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert q.get()[2] == 2
+
+
+def test_breakdown_counts_items_and_users():
+    q = make_queue()
+    q.put(('routine', 'a', 1))
+    q.put(('routine', 'a', 2))
+    q.put(('routine', 'b', 3))
+    q.put(('bulk', 'c', 4))
+    breakdown = q.breakdown()
+    assert breakdown['routine'] == {'queued': 3, 'users': 2}
+    assert breakdown['bulk'] == {'queued': 1, 'users': 1}
+    assert breakdown['stat'] == {'queued': 0, 'users': 0}
+
+
+def test_resolve_priority_caps_at_claim():
+    assert resolve_priority({'priority': 'urgent'}, 'stat') == 'urgent'
+    assert resolve_priority({'priority': 'urgent'}, 'bulk') == 'bulk'
+    assert resolve_priority({'is_admin': True}, 'stat') == 'stat'
+    assert resolve_priority({}, 'nonsense') == 'routine'
+
+
+def test_user_priorities_come_from_configuration():
+    assert parse_user_priorities('dr.lee:stat, triage : Urgent,bad:vip,:stat,') == {'dr.lee': 'stat', 'triage': 'urgent'}
+    assert parse_user_priorities('') == {}
+
+
+def test_rate_limiter_burst_then_wait():
+    limiter = RateLimiter(per_minute=60, burst=2)
+    assert limiter.check('a') == 0
+    assert limiter.check('a') == 0
+    wait = limiter.check('a')
+    assert 0 < wait <= 1
+    # Buckets are per user
+    assert limiter.check('b') == 0
+    assert limiter.stats()['limited'] == 1
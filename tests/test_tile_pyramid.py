@@ -0,0 +1,62 @@
+import hashlib
+import os
+import time
+
+import pytest
+from PIL import Image
+
+import tile_pyramid
+from tile_pyramid import build_pyramid, dzi_file, load_descriptor, sweep_pyramids, tile_file
+
+
+@pytest.fixture
+def pyramid_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tile_pyramid, 'PYRAMID_DIR', str(tmp_path))
+    # Without bounds, builds never start a background sweep
+    monkeypatch.setattr(tile_pyramid, 'PYRAMID_CACHE_MB', 0)
+    monkeypatch.setattr(tile_pyramid, 'PYRAMID_MAX_AGE_HOURS', 0)
+    return tmp_path
+
+
+def build(name, side=600):
+    image_id = hashlib.sha256(name.encode()).hexdigest()
+    build_pyramid(Image.new('RGB', (side, side // 2), (90, 90, 90)), image_id)
+    return image_id
+
+
+def last_used(image_id, seconds_ago, now):
+    info = os.path.join(tile_pyramid.pyramid_path(image_id), 'info.json')
+    os.utime(info, (now - seconds_ago, now - seconds_ago))
+
+
+def test_build_writes_every_level(pyramid_dir):
+    image_id = build('film')
+    descriptor = load_descriptor(image_id)
+    assert (descriptor['width'], descriptor['height']) == (600, 300)
+    assert dzi_file(image_id).endswith(f"{image_id}.dzi")
+    assert tile_file(image_id, descriptor['max_level'], '2_1.jpeg') is not None
+    assert tile_file(image_id, 0, '0_0.jpeg') is not None
+    assert tile_file(image_id, 0, '../info.json') is None
+
+
+def test_sweep_removes_unused_pyramids(pyramid_dir):
+    old, recent = build('old'), build('recent')
+    now = time.time()
+    last_used(old, 3 * 3600, now)
+    assert sweep_pyramids(max_mb=0, max_age_hours=1, now=now) == [old]
+    assert load_descriptor(old) is None
+    assert load_descriptor(recent) is not None
+    assert os.listdir(pyramid_dir) == [recent]
+
+
+def test_sweep_keeps_recently_viewed_pyramids_within_the_size_bound(pyramid_dir):
+    ids = [build(f"film-{i}") for i in range(3)]
+    now = time.time()
+    for i, image_id in enumerate(ids):
+        last_used(image_id, 100 - i, now)
+    # Opening the oldest film in a viewer marks it as used
+    dzi_file(ids[0])
+    size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(pyramid_dir) for f in files)
+    removed = sweep_pyramids(max_mb=size * 0.7 / (1024 * 1024), max_age_hours=0, now=now)
+    assert removed == [ids[1]]
+    assert sorted(os.listdir(pyramid_dir)) == sorted([ids[0], ids[2]])
@@ -0,0 +1,27 @@
+import io
+import os
+import tempfile
+
+os.environ.setdefault('USE_MOCK_MODELS', 'true')
+
+import image_ingest
+from app import app
+from flask import request
+
+
+def upload_stream(size):
+    data = {'image': (io.BytesIO(b'x' * size), 'film.png', 'image/png')}
+    with app.test_request_context('/api/predict', method='POST', data=data, content_type='multipart/form-data'):
+        stream = request.files['image'].stream
+        return stream, stream._rolled, stream.read()
+
+
+def test_flask_uploads_spool_at_the_configured_size():
+    # Werkzeug alone would move anything over 500 KB to a temporary file
+    stream, rolled, body = upload_stream(1024 * 1024)
+    assert isinstance(stream, tempfile.SpooledTemporaryFile)
+    assert not rolled
+    assert body == b'x' * 1024 * 1024
+    _, rolled, body = upload_stream(image_ingest.UPLOAD_SPOOL_BYTES + 1)
+    assert rolled
+    assert len(body) == image_ingest.UPLOAD_SPOOL_BYTES + 1